@@ -1,19 +1,75 @@
 # reference: https://python.docs.hex-rays.com/annotated.html
 
-import idaapi
-import ida_funcs
-import idautils
-import ida_bytes
-import ida_loader
-import ida_kernwin
-import ida_ua
-import ida_idp
-import ida_lines
-
+# The decoder core doesn't need IDA: outside of it the script can run the decode daemon
+# and the batch tools from the command line (see main()).
+try:
+    import idaapi
+    import ida_funcs
+    import idautils
+    import ida_bytes
+    import ida_loader
+    import ida_kernwin
+    import ida_ua
+    import ida_idp
+    import ida_lines
+    import ida_segment
+    import ida_ida
+    import ida_xref
+    import ida_name
+    import ida_nalt
+    import ida_gdl
+    import ida_typeinf
+    import ida_hexrays
+    import ida_auto
+
+    from idaapi import get_dword, BADADDR
+    from ida_ua import o_void, o_reg, o_imm, o_displ, dt_byte
+
+    HAVE_IDA = True
+except ImportError:
+    HAVE_IDA = False
+
+import argparse
+import bisect
+import collections
+import concurrent.futures
+import csv
+import fnmatch
+import gzip
+import hashlib
+import io
+import json
+import operator
+import os
+import queue
+import re
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from array import array
 from enum import IntEnum
-from idaapi import get_dword
 
-# Operand identifiers (they map into g_altivecOperands array)
+# Optional, only the batch tools need it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Plugin information
+PLUGIN_NAME = "PowerPC Altivec"
+PLUGIN_HELP = "support for VMX128, Xbox360(Xenon), PS3(CellBE) and GC/WII(Gekko) "
+PLUGIN_COMMENT = "Altivec Plugin for IDA Pro"
+PLUGIN_HOTKEY = "Ctrl+H"
+
+
+# Operand identifiers (they map into altivec_operands array)
 
 class AltivecOperandID(IntEnum):
     NO_OPERAND = 0
@@ -149,6 +205,15 @@ g_cbeaSprgs = [
     CbeaSprg(1, "XER", "Fixed-Point Exception Register"),
 ]
 
+# Gekko/Broadway registers; SPR 921 and 922 keep their CBEA names when disassembling, the assembler takes both
+g_gekkoSprgs = [
+    *(CbeaSprg(912 + n, f"GQR{n}", f"Graphics Quantization Register {n}") for n in range(8)),
+    CbeaSprg(920, "HID2", "Hardware Implementation Register 2"),
+    CbeaSprg(921, "WPAR", "Write Pipe Address Register"),
+    CbeaSprg(922, "DMA_U", "Locked Cache DMA Register Upper"),
+    CbeaSprg(923, "DMA_L", "Locked Cache DMA Register Lower"),
+]
+
 class AltivecOperand:
     def __init__(self, bits: int, shift: int):
         self.bits = bits
@@ -194,7 +259,7 @@ altivec_operands = [ # // {Length, Start bit}
     (5, 6),    # FC
     (5, 21),   # FD/FS
     (3, 23),   # crfD
-    (1, 16),   # WB
+    (1, 15),   # WB
     (3, 12),   # IB
     (1, 10),   # WC
     (3, 7),    # IC
@@ -982,7 +1047,7 @@ altivec_opcode(altivec_insn_type_t.vmx128_stvrx, "stvrx", X(31, 679), X_MASK, [A
 altivec_opcode(altivec_insn_type_t.vmx128_stvrxl, "stvrxl", X(31, 935), X_MASK, [AltivecOperandID.VS, AltivecOperandID.RA0, AltivecOperandID.RB], "" ),
 
 altivec_opcode(altivec_insn_type_t.std_attn, "attn", X(0, 256), X_MASK, [0], "" ),
-altivec_opcode(altivec_insn_type_t.std_dbcz128, "dbcz128", XRT(31, 1014, 1), XRT_MASK, [AltivecOperandID.RA, AltivecOperandID.RB], "Data Cache Block set to Zero (1)" ),
+altivec_opcode(altivec_insn_type_t.std_dbcz128, "dcbz128", XRT(31, 1014, 1), XRT_MASK, [AltivecOperandID.RA, AltivecOperandID.RB], "Data Cache Block set to Zero (1)" ),
 
 # the normal PPC processor module handles normal syscalls,
 # so this just need to handle level 1 syscalls (hypercalls)
@@ -1097,433 +1162,5864 @@ altivec_opcode(altivec_insn_type_t.gekko_ps_dcbz_l, "dcbz_l", OPL(4, 1014), OPL_
 
 ]
 
-#	FUNCTION		PluginAnalyse
+# Pre-built register names, so operand output never has to format strings
+
+g_vr_names = tuple(f"%vr{i}" for i in range(128))
+g_fr_names = tuple(f"%fr{i}" for i in range(32))
+g_cr_names = tuple(f"cr{i}" for i in range(8))
+
+# CRM is a field mask with one bit set for mfocrf/mtocrf (bit 0 is cr7); any other mask prints as
+# its number, so the assembler gets the same mask back
+g_crm_names = tuple(g_cr_names[7 - (mask.bit_length() - 1)] if mask and not mask & (mask - 1) else str(mask) for mask in range(256))
+
+# Unnamed SPRs print as their decimal number, the form the assembler reads back. A name given to
+# a read and a write alias (CTRL 136/152, TBU 269/285, SPRG3 259/275) names the lower number in
+# mfspr and the higher one in mtspr, the other one prints as its number there.
+def build_spr_tables():
+    names = [str(spr) for spr in range(1024)]
+    comments = [None] * 1024
+
+    # The first entry wins where the tables list the same number twice, CBEA names before Gekko ones
+    for sprg in reversed(g_cbeaSprgs + g_gekkoSprgs):
+        names[sprg.sprg] = sprg.short_name
+        comments[sprg.sprg] = sprg.comment
+
+    aliases = {}
+    for spr, name in enumerate(names):
+        aliases.setdefault(name, []).append(spr)
+    read_names, write_names = list(names), list(names)
+    for numbers in aliases.values():
+        for spr in numbers[1:]:
+            read_names[spr] = str(spr)
+        for spr in numbers[:-1]:
+            write_names[spr] = str(spr)
+
+    return tuple(read_names), tuple(write_names), tuple(comments)
+
+g_spr_names, g_mtspr_names, g_spr_comments = build_spr_tables()
+
+# Symbolic immediates of the VMX128 shuffles, one table entry per possible value:
+#   vpermwi128	the 8 bit VPERM128 picks a source word for each result word: .wzyx
+#   vrlimi128	the 4 bit mask of result words replaced by the rotated source: .xz
+#   vpkd3d128	the 3 bit VD3D0 pack format, vupkd3d128 the unpack format in UIMM bits 2-4
+
+g_swizzle_names = tuple("." + "".join("xyzw"[(imm >> shift) & 3] for shift in (6, 4, 2, 0)) for imm in range(256))
+g_insert_mask_names = tuple("." + "".join(lane for bit, lane in zip((8, 4, 2, 1), "xyzw") if mask & bit) if mask else ".none" for mask in range(16))
+g_d3d_format_names = ("D3DCOLOR", "NORMSHORT2", "NORMPACKED32", "FLOAT16_2", "NORMSHORT4", "FLOAT16_4", "D3D6", "D3D7")
+g_d3d_unpack_names = tuple(g_d3d_format_names[imm >> 2] + (f"+{imm & 3}" if imm & 3 else "") for imm in range(32))
+
+g_operand_symbol_names = {
+    AltivecOperandID.VPERM128: g_swizzle_names,
+    AltivecOperandID.VD3D0: g_d3d_format_names,
+}
+
+# Where the operand is a plain UIMM, by mnemonic
+g_uimm_symbol_names = {
+    "vrlimi128": g_insert_mask_names,
+    "vupkd3d128": g_d3d_unpack_names,
+}
+
+# How symbolic immediates are shown
+IMMEDIATE_SYMBOLIC, IMMEDIATE_RAW, IMMEDIATE_BOTH = 1, 2, 3
+g_immediate_display = IMMEDIATE_SYMBOLIC
+
+def format_symbolic_immediate(symbols: tuple, value: int) -> str:
+    if g_immediate_display == IMMEDIATE_RAW or value >= len(symbols):
+        return str(value)
+    if g_immediate_display == IMMEDIATE_BOTH:
+        return f"{value}:{symbols[value]}"
+    return symbols[value]
+
+
+# Output plan for each opcode table entry: the mnemonic, the number of operands and the
+# register name table for every operand position (None lets IDA print the operand), plus
+# the symbol table of the immediates we can show symbolically.
+
+class altivec_output_plan:
+    def __init__(self, opcode: altivec_opcode):
+        self.mnemonic = opcode.name
+        self.description = opcode.description
+        self.operand_count = 0
+        self.register_names = [None] * MAX_OPERANDS
+        self.symbol_names = [None] * MAX_OPERANDS
+        self.has_spr = False
+
+        for operand in opcode.operands:
+            if operand == AltivecOperandID.NO_OPERAND:
+                break
+
+            if operand == AltivecOperandID.SPR:
+                self.register_names[self.operand_count] = g_mtspr_names if opcode.name == "mtspr" else g_spr_names
+            else:
+                self.register_names[self.operand_count] = g_operand_register_names.get(operand)
+            if operand == AltivecOperandID.UIMM:
+                self.symbol_names[self.operand_count] = g_uimm_symbol_names.get(opcode.name)
+            else:
+                self.symbol_names[self.operand_count] = g_operand_symbol_names.get(operand)
+            self.has_spr |= operand == AltivecOperandID.SPR
+            self.operand_count += 1
+
+        self.register_names = tuple(self.register_names)
+        self.symbol_names = tuple(self.symbol_names)
+
+g_operand_register_names = {
+    AltivecOperandID.VA: g_vr_names,
+    AltivecOperandID.VB: g_vr_names,
+    AltivecOperandID.VC: g_vr_names,
+    AltivecOperandID.VD: g_vr_names,
+    AltivecOperandID.VD128: g_vr_names,
+    AltivecOperandID.VA128: g_vr_names,
+    AltivecOperandID.VB128: g_vr_names,
+    AltivecOperandID.VC128: g_vr_names,
+    AltivecOperandID.CRM: g_crm_names,
+    AltivecOperandID.FA: g_fr_names,
+    AltivecOperandID.FB: g_fr_names,
+    AltivecOperandID.FC: g_fr_names,
+    AltivecOperandID.FD: g_fr_names,
+}
+
+g_output_plans = tuple(altivec_output_plan(opcode) for opcode in g_altivec_opcodes)
+
+
+#	FUNCTION		altivec_decode
+
+#	DESCRIPTION		IDA independent decoder core. Returns the index of the g_altivec_opcodes
+#					entry matching an instruction word, or -1 if the word isn't one of ours.
+#					Entries are indexed by primary opcode, then by mask (a handful per primary
+#					opcode) with a dict from the masked bits to the entry. The lowest matching
+#					index wins, exactly like a full scan of the table in order.
+
+def build_opcode_buckets():
+    buckets = [{} for _ in range(64)]
+    for index, opcode in enumerate(g_altivec_opcodes):
+        entries = buckets[(opcode.opcode & OP_MASK) >> 26].setdefault(opcode.mask, {})
+        entries.setdefault(opcode.opcode, index)
+    return tuple(tuple(bucket.items()) for bucket in buckets)
+
+g_opcode_buckets = build_opcode_buckets()
+
+# Decoding is a pure function of the word, so remember the answers (bounded, cleared when full)
+DECODE_CACHE_SIZE = 1 << 20
+g_decode_cache = {}
+
+def altivec_decode(code_bytes: int) -> int:
+    index = g_decode_cache.get(code_bytes)
+    if index is not None:
+        return index
+
+    index = -1
+    for mask, entries in g_opcode_buckets[code_bytes >> 26]:
+        entry = entries.get(code_bytes & mask)
+        if entry is not None and (index < 0 or entry < index):
+            index = entry
+
+    if len(g_decode_cache) >= DECODE_CACHE_SIZE:
+        g_decode_cache.clear()
+    g_decode_cache[code_bytes] = index
+    return index
+
+
+#	FUNCTION		altivec_decode_operands
+
+#	DESCRIPTION		Extracts the value of every operand of a decoded instruction, in operand
+#					order. Registers are returned as their number (including the scattered
+#					VMX128 register bits), immediates sign extended where the operand is
+#					signed, SPRs with their halves swapped back, and DRA as the base register
+#					(see gekko_displacement() for the offset).
+
+def operand_field(operand_id):
+    bits, shift = altivec_operands[operand_id]
+    mask = (1 << bits) - 1
+    return lambda code_bytes: (code_bytes >> shift) & mask
+
+def operand_signed_field(operand_id):
+    bits, shift = altivec_operands[operand_id]
+    mask = (1 << bits) - 1
+    sign = 1 << (bits - 1)
+    return lambda code_bytes: (((code_bytes >> shift) & mask) ^ sign) - sign
+
+g_operand_extractors = {operand_id: operand_field(operand_id) for operand_id in AltivecOperandID}
+g_operand_extractors.update({
+    AltivecOperandID.SIMM: operand_signed_field(AltivecOperandID.SIMM),
+    AltivecOperandID.VD128: lambda code_bytes: ((code_bytes >> 21) & 0x1F) | ((code_bytes & 0x0C) << 3),
+    AltivecOperandID.VA128: lambda code_bytes: ((code_bytes >> 16) & 0x1F) | (code_bytes & 0x20) | ((code_bytes >> 4) & 0x40),
+    AltivecOperandID.VB128: lambda code_bytes: ((code_bytes << 5) & 0x60) | ((code_bytes >> 11) & 0x1F),
+    AltivecOperandID.VPERM128: lambda code_bytes: ((code_bytes >> 1) & 0xE0) | ((code_bytes >> 16) & 0x1F),
+    AltivecOperandID.SPR: lambda code_bytes: ((code_bytes >> 16) & 0x1F) | ((code_bytes >> 6) & 0x3E0),
+})
+
+def gekko_displacement(code_bytes: int) -> int:
+    # psq_l/psq_st carry a 12 bit signed displacement
+    return ((code_bytes & 0xFFF) ^ 0x800) - 0x800
+
+def build_operand_decoders():
+    decoders = []
+    for opcode in g_altivec_opcodes:
+        operand_ids = []
+        for operand in opcode.operands:
+            if operand == AltivecOperandID.NO_OPERAND:
+                break
+            operand_ids.append(AltivecOperandID(operand))
+        decoders.append(tuple((operand_id, g_operand_extractors[operand_id]) for operand_id in operand_ids))
+    return tuple(decoders)
+
+g_operand_decoders = build_operand_decoders()
+
+def altivec_decode_operands(index: int, code_bytes: int) -> tuple:
+    return tuple(extract(code_bytes) for _, extract in g_operand_decoders[index])
+
+
+#	FUNCTION		render_operands
+
+#	DESCRIPTION		IDA independent text of an instruction's operands, using the same register
+#					names as the output plan (%vr, %fr, cr, SPR names). General purpose
+#					registers print as rN, immediates in decimal or symbolically as the
+#					plan says.
+
+g_gpr_names = tuple(f"r{i}" for i in range(32))
+
+def render_operands(index: int, code_bytes: int) -> str:
+    names = g_output_plans[index].register_names
+    symbols = g_output_plans[index].symbol_names
+    text = []
+
+    for position, (operand_id, extract) in enumerate(g_operand_decoders[index]):
+        value = extract(code_bytes)
+
+        if names[position] is not None:
+            text.append(names[position][value])
+        elif symbols[position] is not None:
+            text.append(format_symbolic_immediate(symbols[position], value))
+        elif operand_id in (AltivecOperandID.RA, AltivecOperandID.RB, AltivecOperandID.RS) or \
+             (operand_id == AltivecOperandID.RA0 and value != 0):
+            text.append(g_gpr_names[value])
+        elif operand_id == AltivecOperandID.DRA:
+            text.append(f"{gekko_displacement(code_bytes)}({g_gpr_names[value]})")
+        else:
+            text.append(str(value))
+
+    return ", ".join(text)
+
+
+#	FUNCTION		altivec_assemble
+
+#	DESCRIPTION		Assembler driven by the same opcode table and field layout as the decoder.
+#					Mnemonics are found through a name -> table index hash and every operand
+#					has an insertion function, the inverse of its extractor, so the scattered
+#					VMX128 register bits (VD128/VA128/VB128 above v31, VPERM128) are put
+#					back where the decoder takes them from.
+#
+#					Operands are given as the decoder returns them, or as text in the form
+#					render_operands prints: %vr3/vr3/v3, %fr1/f1, r4, cr6, SPR names, symbolic
+#					immediates (.wzyx) and d(rA) for the Gekko displacement, where the value
+#					is a (displacement, rA) pair. With 'check' the word is decoded again and
+#					must give back the same entry and operands; this catches repeated fields
+#					given different values (the second VD128 of vmaddfp128) and encodings an
+#					earlier table entry decodes first.
+
+def operand_inserter(operand_id):
+    bits, shift = altivec_operands[operand_id]
+    mask = (1 << bits) - 1
+    return lambda value: (value & mask) << shift
+
+g_operand_inserters = {operand_id: operand_inserter(operand_id) for operand_id in AltivecOperandID}
+g_operand_inserters.update({
+    AltivecOperandID.VD128: lambda value: ((value & 0x1F) << 21) | ((value >> 3) & 0x0C),
+    AltivecOperandID.VA128: lambda value: ((value & 0x1F) << 16) | (value & 0x20) | ((value & 0x40) << 4),
+    AltivecOperandID.VB128: lambda value: ((value & 0x1F) << 11) | ((value >> 5) & 0x03),
+    AltivecOperandID.VPERM128: lambda value: ((value & 0x1F) << 16) | ((value & 0xE0) << 1),
+    AltivecOperandID.SPR: lambda value: ((value & 0x1F) << 16) | ((value & 0x3E0) << 6),
+})
+
+def operand_limits(operand_id) -> tuple:
+    match operand_id:
+        case AltivecOperandID.SIMM:
+            return -16, 15
+        case AltivecOperandID.VD128 | AltivecOperandID.VA128 | AltivecOperandID.VB128:
+            return 0, 127
+        case AltivecOperandID.VPERM128:
+            return 0, 255
+        case AltivecOperandID.SPR:
+            return 0, 1023
+    return 0, (1 << altivec_operands[operand_id][0]) - 1
+
+g_operand_encoders = tuple(tuple((operand_id, g_operand_inserters[operand_id], *operand_limits(operand_id)) for operand_id, _ in decoders)
+                           for decoders in g_operand_decoders)
+
+g_altivec_mnemonics = {opcode.name: index for index, opcode in enumerate(g_altivec_opcodes)}
+
+def altivec_encode(index: int, operands, check: bool = True) -> int:
+    opcode = g_altivec_opcodes[index]
+    encoders = g_operand_encoders[index]
+    if len(operands) != len(encoders):
+        raise ValueError(f"{opcode.name} takes {len(encoders)} operands, not {len(operands)}")
+
+    code_bytes = opcode.opcode & opcode.mask
+    for position, (value, (operand_id, insert, low, high)) in enumerate(zip(operands, encoders)):
+        if operand_id == AltivecOperandID.DRA:
+            displacement, value = value if isinstance(value, tuple) else (0, value)
+            if not -0x800 <= displacement < 0x800:
+                raise ValueError(f"{opcode.name}: displacement {displacement} doesn't fit 12 bits")
+            code_bytes |= displacement & 0xFFF
+        if not low <= value <= high:
+            raise ValueError(f"{opcode.name}: operand {position + 1} ({operand_id.name}) is {value}, not {low}..{high}")
+        code_bytes |= insert(value)
+
+    if check:
+        decoded = altivec_decode(code_bytes)
+        if decoded != index:
+            raise ValueError(f"{opcode.name} encodes as {code_bytes:08X}, which decodes as "
+                             f"{g_altivec_opcodes[decoded].name if decoded >= 0 else 'nothing'}")
+        expected = tuple(value[1] if isinstance(value, tuple) else value for value in operands)
+        if altivec_decode_operands(index, code_bytes) != expected:
+            raise ValueError(f"{opcode.name}: operands {expected} don't survive encoding (repeated field?)")
+    return code_bytes
+
+g_vr_names_operands = [operand_id for operand_id, names in g_operand_register_names.items() if names is g_vr_names]
+g_assembler_register_prefixes = {
+    **{operand_id: "vr|v" for operand_id in g_vr_names_operands},
+    **{operand_id: "fr|fp|f" for operand_id in (AltivecOperandID.FA, AltivecOperandID.FB, AltivecOperandID.FC, AltivecOperandID.FD)},
+    **{operand_id: "r" for operand_id in (AltivecOperandID.RA, AltivecOperandID.RB, AltivecOperandID.RS, AltivecOperandID.RA0)},
+    AltivecOperandID.crfD: "cr",
+}
+g_assembler_register_patterns = {operand_id: re.compile(rf"%?(?:{prefixes})(\d+)$", re.IGNORECASE)
+                                 for operand_id, prefixes in g_assembler_register_prefixes.items()}
+g_assembler_displacement = re.compile(r"(-?(?:0x)?[0-9a-f]*)\(\s*%?r(\d+)\s*\)$", re.IGNORECASE)
+# SPR names by the name table of the operand, as mfspr and mtspr print them, then the Gekko names
+# the disassembly doesn't show (WPAR, DMA_U)
+def build_assembler_spr_numbers(names: tuple) -> dict:
+    numbers = {name.lower(): spr for spr, name in enumerate(names) if not name.isdigit()}
+    for sprg in g_gekkoSprgs:
+        numbers.setdefault(sprg.short_name.lower(), sprg.sprg)
+    return numbers
+
+g_assembler_spr_numbers = {id(names): build_assembler_spr_numbers(names) for names in (g_spr_names, g_mtspr_names)}
+g_assembler_symbol_values = {}
+
+def parse_operand(operand_id, symbols, text: str, names: tuple = None):
+    pattern = g_assembler_register_patterns.get(operand_id)
+    if pattern is not None:
+        match = pattern.match(text)
+        if match:
+            return int(match.group(1))
+
+    if operand_id == AltivecOperandID.DRA:
+        match = g_assembler_displacement.match(text)
+        if match is None:
+            raise ValueError(f"expected d(rA), not {text!r}")
+        return int(match.group(1) or "0", 0), int(match.group(2))
+    if operand_id == AltivecOperandID.SPR:
+        spr = g_assembler_spr_numbers[id(g_spr_names if names is None else names)].get(text.lower())
+        if spr is not None:
+            return spr
+    if operand_id == AltivecOperandID.CRM and text.lower().startswith("cr") and text[2:].isdigit():
+        return 0x80 >> int(text[2:])
+
+    if symbols is not None:
+        values = g_assembler_symbol_values.get(id(symbols))
+        if values is None:
+            values = g_assembler_symbol_values[id(symbols)] = {name: value for value, name in reversed(list(enumerate(symbols)))}
+        text = text.partition(":")[0] if ":" in text else text
+        if text in values:
+            return values[text]
+    try:
+        return int(text, 0)
+    except ValueError:
+        raise ValueError(f"can't read {text!r} as {operand_id.name}") from None
+
+def altivec_assemble(line: str, check: bool = True) -> int:
+    mnemonic, _, rest = line.strip().partition(" ")
+    index = g_altivec_mnemonics.get(mnemonic.lower())
+    if index is None:
+        raise ValueError(f"unknown mnemonic {mnemonic!r}")
+
+    tokens = [token.strip() for token in rest.split(",")] if rest.strip() else []
+    encoders = g_operand_encoders[index]
+    if len(tokens) != len(encoders):
+        raise ValueError(f"{mnemonic} takes {len(encoders)} operands, not {len(tokens)}")
+    symbols = g_output_plans[index].symbol_names
+    names = g_output_plans[index].register_names
+    operands = [parse_operand(operand_id, symbols[position], token, names[position])
+                for position, (token, (operand_id, *_)) in enumerate(zip(tokens, encoders))]
+    return altivec_encode(index, operands, check)
+
+# Assembles many lines, skipping blank ones and comments (# or ;). Returns the words of the lines
+# that assembled and the (line number, message) of those that didn't
+def altivec_assemble_many(lines, check: bool = True):
+    words = array('I')
+    errors = []
+    for number, line in enumerate(lines, 1):
+        line = re.split(r"[#;]", line, maxsplit=1)[0].strip()
+        if not line:
+            continue
+        try:
+            words.append(altivec_assemble(line, check))
+        except ValueError as error:
+            errors.append((number, str(error)))
+    return words, errors
+
+
+# Vector loads and stores: itype -> (is_store, alignment mask applied to the effective address)
+
+T = altivec_insn_type_t
+
+g_vector_memory_access = {
+    T.altivec_lvebx: (False, ~0x0), T.altivec_lvehx: (False, ~0x1), T.altivec_lvewx: (False, ~0x3),
+    T.altivec_lvx: (False, ~0xF), T.altivec_lvxl: (False, ~0xF),
+    T.altivec_stvebx: (True, ~0x0), T.altivec_stvehx: (True, ~0x1), T.altivec_stvewx: (True, ~0x3),
+    T.altivec_stvx: (True, ~0xF), T.altivec_stvxl: (True, ~0xF),
+    T.vmx128_lvewx128: (False, ~0x3), T.vmx128_lvx128: (False, ~0xF), T.vmx128_lvxl128: (False, ~0xF),
+    T.vmx128_stvewx128: (True, ~0x3), T.vmx128_stvx128: (True, ~0xF), T.vmx128_stvxl128: (True, ~0xF),
+    T.vmx128_lvlx128: (False, ~0x0), T.vmx128_lvrx128: (False, ~0x0),
+    T.vmx128_lvlxl128: (False, ~0x0), T.vmx128_lvrxl128: (False, ~0x0),
+    T.vmx128_stvlx128: (True, ~0x0), T.vmx128_stvrx128: (True, ~0x0),
+    T.vmx128_stvlxl128: (True, ~0x0), T.vmx128_stvrxl128: (True, ~0x0),
+    T.vmx128_lvlx: (False, ~0x0), T.vmx128_lvlxl: (False, ~0x0), T.vmx128_lvrx: (False, ~0x0), T.vmx128_lvrxl: (False, ~0x0),
+    T.vmx128_stvlx: (True, ~0x0), T.vmx128_stvlxl: (True, ~0x0), T.vmx128_stvrx: (True, ~0x0), T.vmx128_stvrxl: (True, ~0x0),
+}
+
+del T
+
+# Our own instructions that write a general purpose register (through their RS/RT operand)
+g_gpr_writing_itypes = {
+    altivec_insn_type_t.std_mfspr,
+    altivec_insn_type_t.std_mfocrf,
+    altivec_insn_type_t.std_ldbrx,
+}
+
+
+#	FUNCTION		track_gpr_constants
+
+#	DESCRIPTION		Follows the constants built in general purpose registers by li/lis/addi/
+#					addis/ori/oris over a run of instruction words. The state is reset at
+#					branches (a new block starts) and any register we can't follow is
+#					forgotten, so every value left in the state is known to be exact.
+
+def track_gpr_constants(state: dict, code_bytes: int):
+    primary = code_bytes >> 26
+    rd = (code_bytes >> 21) & 0x1F
+    ra = (code_bytes >> 16) & 0x1F
+    simm = ((code_bytes & 0xFFFF) ^ 0x8000) - 0x8000
+    uimm = code_bytes & 0xFFFF
+
+    match primary:
+        case 14 | 15:  # addi / addis (li / lis when rA is 0)
+            if primary == 15:
+                simm <<= 16
+            if ra == 0:
+                state[rd] = simm & 0xFFFFFFFF
+            elif ra in state:
+                state[rd] = (state[ra] + simm) & 0xFFFFFFFF
+            else:
+                state.pop(rd, None)
+
+        case 24 | 25:  # ori / oris, rS is in the rD position and rA is the destination
+            if primary == 25:
+                uimm <<= 16
+            if rd in state:
+                state[ra] = state[rd] | uimm
+            else:
+                state.pop(ra, None)
+
+        case 16 | 18 | 19:  # branches end the block
+            state.clear()
+
+        case 32 | 34 | 40 | 42:  # lwz, lbz, lhz, lha
+            state.pop(rd, None)
+
+        case 33 | 35 | 41 | 43:  # the same with update
+            state.pop(rd, None)
+            state.pop(ra, None)
+
+        case 36 | 38 | 44 | 47 | 48 | 50 | 52 | 54:  # stores and FPU loads leave the GPRs alone
+            pass
+
+        case 37 | 39 | 45 | 49 | 51 | 53 | 55:  # ... except for their update forms
+            state.pop(ra, None)
+
+        case 46:  # lmw
+            for reg in range(rd, 32):
+                state.pop(reg, None)
+
+        case _:
+            index = altivec_decode(code_bytes)
+            if index >= 0:
+                if g_altivec_opcodes[index].insn in g_gpr_writing_itypes:
+                    state.pop(rd, None)
+            else:
+                # Unknown to us, assume it may write either register field
+                state.pop(rd, None)
+                state.pop(ra, None)
+
+
+#	FUNCTION		resolve_vector_address
+
+#	DESCRIPTION		Computes the address touched by a vector load/store when both RA and RB
+#					hold constants built within the same block (RA = 0 meaning zero), or
+#					returns None. 'state' is the track_gpr_constants() state before the
+#					instruction.
+
+def resolve_vector_address(state: dict, index: int, code_bytes: int):
+    access = g_vector_memory_access.get(g_altivec_opcodes[index].insn)
+    if access is None:
+        return None
+
+    ra = (code_bytes >> 16) & 0x1F
+    rb = (code_bytes >> 11) & 0x1F
+
+    base = 0 if ra == 0 else state.get(ra)
+    offset = state.get(rb)
+    if base is None or offset is None:
+        return None
+
+    return ((base + offset) & 0xFFFFFFFF) & access[1]
+
+
+#	FUNCTION		track_stack_registers
+
+#	DESCRIPTION		Companion of track_gpr_constants for stack addresses: 'stack' maps the
+#					registers known to hold r1 + offset to that offset (r1 itself is always 0).
+#					Follows addi and mr from such registers; anything else writing a register
+#					drops it. Returns True when r1 itself moved (stwu/stdu/addi r1), as
+#					offsets from before and after don't name the same slot.
+
+def track_stack_registers(stack: dict, code_bytes: int) -> bool:
+    primary = code_bytes >> 26
+    rd = (code_bytes >> 21) & 0x1F
+    ra = (code_bytes >> 16) & 0x1F
+    rb = (code_bytes >> 11) & 0x1F
+
+    match primary:
+        case 14:  # addi
+            if rd == 1:
+                return True
+            if ra != 0 and ra in stack:
+                stack[rd] = stack[ra] + (((code_bytes & 0xFFFF) ^ 0x8000) - 0x8000)
+            else:
+                stack.pop(rd, None)
+            return False
+
+        case 37 | 62:  # stw / std, the update forms (stwu r1, -frame(r1)) write rA
+            if primary == 37 or code_bytes & 3 == 1:
+                if ra == 1:
+                    return True
+                stack.pop(ra, None)
+            return False
+
+        case 31 if (code_bytes >> 1) & 0x3FF == 444 and rd == rb:  # mr rA, rS
+            if ra == 1:
+                return True
+            if rd in stack:
+                stack[ra] = stack[rd]
+            else:
+                stack.pop(ra, None)
+            return False
+
+        case 16 | 18 | 19:  # branches end the block
+            stack.clear()
+            stack[1] = 0
+            return False
+
+        case 36 | 38 | 44 | 48 | 50 | 52 | 54:  # stores and FPU loads leave the GPRs alone
+            return False
+
+    index = altivec_decode(code_bytes) if primary in (4, 31) else -1
+    if index >= 0 and g_altivec_opcodes[index].insn not in g_gpr_writing_itypes:
+        return False
+
+    # Unknown to us, assume it may write either register field
+    if rd != 1:
+        stack.pop(rd, None)
+    if ra != 1:
+        stack.pop(ra, None)
+    return False
+
+
+#	FUNCTION		find_stack_vector_accesses
+
+#	DESCRIPTION		The whole vector loads and stores (lvx/stvx and their 128 and LRU forms) of
+#					a run of instruction words (a basic block) that address a constant offset
+#					from the stack pointer. Returns a list of (position, is_store, vector
+#					register, offset, frame), where 'frame' counts the r1 updates seen so far,
+#					and the final count, which the caller carries from block to block.
+
+def find_stack_vector_accesses(words, frame: int = 0):
+    constants = {}
+    stack = {1: 0}
+    accesses = []
+
+    for position, code_bytes in enumerate(words):
+        index = altivec_decode(code_bytes)
+        access = g_vector_memory_access.get(g_altivec_opcodes[index].insn) if index >= 0 else None
+        if access is not None and access[1] == ~0xF:
+            ra = (code_bytes >> 16) & 0x1F
+            rb = (code_bytes >> 11) & 0x1F
+            # The constants are kept as 32 bit values, offsets from r1 are signed
+            if ra != 0 and ra in stack and rb in constants:
+                offset = stack[ra] + ((constants[rb] ^ 0x80000000) - 0x80000000)
+            elif rb in stack and (ra == 0 or ra in constants):
+                offset = stack[rb] + (((constants[ra] ^ 0x80000000) - 0x80000000) if ra else 0)
+            else:
+                offset = None
+
+            if offset is not None:
+                register = g_operand_decoders[index][0][1](code_bytes)
+                accesses.append((position, access[0], register, offset & ~15, frame))
+
+        if track_stack_registers(stack, code_bytes):
+            frame += 1
+        track_gpr_constants(constants, code_bytes)
+
+    return accesses, frame
+
+
+#	CLASS			AltivecDecodeServer
+
+#	DESCRIPTION		Optional local decode daemon, shared by every IDA instance on the machine.
+#					It hosts the decoder core with its opcode index and a bounded LRU cache
+#					of word -> opcode table index, and answers batched requests over a Unix
+#					domain socket:
+#
+#						python ppc_altivec.py serve [--socket PATH]
+#
+#					A frame is a header (table digest, word count) followed by the words,
+#					all in network byte order. The answer has the same header followed by
+#					the opcode table index of every word as a 16 bit integer (-1 if the word
+#					isn't ours); operands are cheap to extract locally once the index is
+#					known. A daemon built from a different opcode table or protocol answers
+#					with DAEMON_MISMATCH and is not used.
+#
+#					The socket is per user: in $XDG_RUNTIME_DIR, or else in a 0700 directory
+#					named after the uid in the temporary directory. Clients only connect to a
+#					socket owned by their own user, so nobody else can answer in its place.
+
+def default_daemon_socket() -> str:
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "ppc_altivec.sock")
+    return os.path.join(tempfile.gettempdir(), f"ppc_altivec-{os.getuid() if hasattr(os, 'getuid') else 0}", "ppc_altivec.sock")
+
+DAEMON_SOCKET = os.environ.get("PPC_ALTIVEC_DAEMON") or default_daemon_socket()
+DAEMON_MAX_WORDS = 0x10000
+DAEMON_MISMATCH = 0xFFFFFFFF
+DAEMON_PROTOCOL = 2
+DAEMON_CACHE_SIZE = 1 << 20
+
+g_daemon_header = struct.Struct("!4sI")
+
+def opcode_table_digest() -> bytes:
+    digest = hashlib.sha1(f"protocol {DAEMON_PROTOCOL};".encode())
+    for opcode in g_altivec_opcodes:
+        digest.update(f"{opcode.name}:{opcode.opcode:08x}:{opcode.mask:08x}:{list(map(int, opcode.operands))};".encode())
+    return digest.digest()[:4]
+
+g_opcode_table_digest = opcode_table_digest()
+
+def words_to_network(words) -> bytes:
+    data = array('I', words)
+    if sys.byteorder == "little":
+        data.byteswap()
+    return data.tobytes()
+
+def words_from_network(data: bytes):
+    words = array('I', data)
+    if sys.byteorder == "little":
+        words.byteswap()
+    return words
+
+def indices_to_network(indices) -> bytes:
+    data = array('h', indices)
+    if sys.byteorder == "little":
+        data.byteswap()
+    return data.tobytes()
+
+def indices_from_network(data: bytes):
+    indices = array('h', data)
+    if sys.byteorder == "little":
+        indices.byteswap()
+    return indices
+
+def owned_by_user(path: str) -> bool:
+    return not hasattr(os, "getuid") or os.lstat(path).st_uid == os.getuid()
+
+# The default directory is created private to the user; one left by somebody else is refused
+def prepare_daemon_directory(path: str):
+    directory = os.path.dirname(path)
+    if path != default_daemon_socket() or os.environ.get("XDG_RUNTIME_DIR"):
+        return
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or not owned_by_user(directory) or info.st_mode & 0o077:
+        raise OSError(f"{directory} is not a private directory of this user")
+
+def recv_exact(sock, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return bytes(data)
+
+
+# Least recently used word -> index cache of the daemon, shared by its connection threads
+class DecodeLRUCache:
+    def __init__(self, size: int = DAEMON_CACHE_SIZE):
+        self.size = size
+        self.indices = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def decode(self, words) -> list:
+        with self.lock:
+            indices = self.indices
+            for code_bytes in set(words).difference(indices):
+                indices[code_bytes] = altivec_decode(code_bytes)
+            # Every word becomes the most recently used, then the oldest ones go
+            collections.deque(map(indices.move_to_end, words), 0)
+            result = list(map(indices.__getitem__, words))
+            while len(indices) > self.size:
+                indices.popitem(last=False)
+            return result
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+
+class AltivecDecodeRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                digest, count = g_daemon_header.unpack(recv_exact(self.request, g_daemon_header.size))
+            except ConnectionError:
+                return
+
+            if digest != g_opcode_table_digest or count > DAEMON_MAX_WORDS:
+                self.request.sendall(g_daemon_header.pack(g_opcode_table_digest, DAEMON_MISMATCH))
+                return
+
+            indices = self.server.cache.decode(words_from_network(recv_exact(self.request, count * 4)))
+            self.request.sendall(g_daemon_header.pack(digest, count) + indices_to_network(indices))
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class AltivecDecodeServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self, path: str):
+            prepare_daemon_directory(path)
+
+            # A socket left behind by a previous daemon would make bind() fail, but one
+            # another daemon still listens on is not ours to take over
+            if os.path.exists(path):
+                probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    probe.connect(path)
+                except OSError:
+                    os.unlink(path)
+                else:
+                    raise OSError(f"a decode daemon is already listening on {path}")
+                finally:
+                    probe.close()
+
+            socketserver.ThreadingUnixStreamServer.__init__(self, path, AltivecDecodeRequestHandler)
+            os.chmod(path, 0o600)
+            self.cache = DecodeLRUCache()
+
+
+#	CLASS			AltivecDecodeClient
+
+#	DESCRIPTION		Client side of the decode daemon. It is only used when PPC_ALTIVEC_DAEMON
+#					names the socket: decoding in process measured faster than a round trip
+#					to the daemon (0.07 s against 0.11 s for 58K new words), so it is off
+#					by default. Connections are kept in a small pool and reused, requests
+#					are sent in batches of up to DAEMON_MAX_WORDS words.
+#					Whenever the daemon is absent or fails, or its answer has the wrong
+#					length or indices outside of the opcode table, decode() returns None and
+#					the caller decodes in process; the daemon is then retried after a while.
+
+DAEMON_RETRY_DELAY = 30.0
+
+class AltivecDecodeClient:
+    def __init__(self, path: str = DAEMON_SOCKET, timeout: float = 5.0, enabled: bool = True):
+        self.path = path
+        self.timeout = timeout
+        self.enabled = enabled and hasattr(socket, "AF_UNIX")
+        self.pool = queue.LifoQueue()
+        self.retry_time = 0.0
+
+    # A missing socket shows up as a failed connect, which holds the daemon off for DAEMON_RETRY_DELAY
+    def available(self) -> bool:
+        return self.enabled and time.monotonic() >= self.retry_time
+
+    def connect(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            info = os.lstat(self.path)
+            if not stat.S_ISSOCK(info.st_mode) or not owned_by_user(self.path):
+                raise ConnectionError(f"{self.path} is not a socket of this user")
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            return sock
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    # Returns the opcode table index of every word, or None
+    def decode(self, words):
+        if not self.available():
+            return None
+
+        sock = None
+        results = []
+        try:
+            sock = self.connect()
+            for start in range(0, len(words), DAEMON_MAX_WORDS):
+                batch = words[start:start + DAEMON_MAX_WORDS]
+                sock.sendall(g_daemon_header.pack(g_opcode_table_digest, len(batch)) + words_to_network(batch))
+
+                digest, count = g_daemon_header.unpack(recv_exact(sock, g_daemon_header.size))
+                if count == DAEMON_MISMATCH or digest != g_opcode_table_digest:
+                    raise ConnectionError("the daemon runs a different opcode table")
+                if count != len(batch):
+                    raise ConnectionError(f"the daemon answered {count} words for {len(batch)}")
+                indices = indices_from_network(recv_exact(sock, count * 2))
+                if count and (min(indices) < -1 or max(indices) >= len(g_altivec_opcodes)):
+                    raise ConnectionError("the daemon answered an index outside of the opcode table")
+                results.extend(indices)
+
+        except (OSError, ConnectionError, struct.error):
+            if sock is not None:
+                sock.close()
+            self.retry_time = time.monotonic() + DAEMON_RETRY_DELAY
+            return None
+
+        self.pool.put(sock)
+        return results
+
+g_decode_client = AltivecDecodeClient(enabled=bool(os.environ.get("PPC_ALTIVEC_DAEMON")))
+
+
+#	FUNCTION		altivec_decode_many
+
+#	DESCRIPTION		Decodes a batch of words. Words already in the local decode cache are
+#					answered from it; the others are sent once each to the daemon when it
+#					is enabled and running, and decoded in process otherwise. Returns the opcode table
+#					index of every word (-1 for words that aren't ours).
+
+def altivec_decode_many(words) -> list:
+    cache = g_decode_cache
+    try:
+        return list(map(cache.__getitem__, words))
+    except KeyError:
+        pass
+    if not g_decode_client.available():
+        return [altivec_decode(code_bytes) for code_bytes in words]
+
+    missing = list(set(words).difference(cache))
+    indices = g_decode_client.decode(missing)
+    if indices is None or len(indices) != len(missing) or len(cache) + len(missing) >= DECODE_CACHE_SIZE:
+        return [altivec_decode(code_bytes) for code_bytes in words]
+
+    cache.update(zip(missing, indices))
+    return list(map(cache.__getitem__, words))
+
+
+#	FUNCTION		load_binary
+
+#	DESCRIPTION		Minimal loaders for the headless tools. Returns the executable sections of
+#					a PS3/PPC ELF, Xbox 360 XEX (unencrypted, uncompressed or basic
+#					compression) or PE basefile, or a GameCube/Wii DOL, as a list of
+#					(start address, words in host order), plus the function start addresses
+#					the file tells us about (symbols, .pdata), possibly none.
+
+class UnsupportedBinary(Exception):
+    # The file it is about, filled in by load_binary()
+    path = None
+
+def section_words(data: bytes, big_endian: bool):
+    words = array('I', data[:len(data) & ~3])
+    if big_endian != (sys.byteorder == "big"):
+        words.byteswap()
+    return words
+
+# The loaders check their headers and raise UnsupportedBinary for anything truncated,
+# inconsistent or not PowerPC, so one bad file never stops a batch
+ELF_MACHINES = (20, 21)             # EM_PPC, EM_PPC64
+PE_MACHINES = (0x1F0, 0x1F1, 0x1F2)  # IMAGE_FILE_MACHINE_POWERPC, POWERPCFP, POWERPCBE (Xbox 360)
+
+def check_table(data: bytes, offset: int, count: int, size: int, what: str):
+    if offset < 0 or count < 0 or offset + count * size > len(data):
+        raise UnsupportedBinary(f"truncated or inconsistent {what}")
+
+def elf_sections(data: bytes):
+    if len(data) < 0x34 or data[4] not in (1, 2) or data[5] not in (1, 2):
+        raise UnsupportedBinary("truncated or bad ELF header")
+    is_64 = data[4] == 2
+    endian = ">" if data[5] == 2 else "<"
+
+    machine, = struct.unpack_from(endian + "H", data, 0x12)
+    if machine not in ELF_MACHINES:
+        raise UnsupportedBinary(f"not a PowerPC ELF (e_machine {machine})")
+
+    if is_64:
+        check_table(data, 0, 1, 0x40, "ELF header")
+        shoff, = struct.unpack_from(endian + "Q", data, 0x28)
+        shentsize, shnum, shstrndx = struct.unpack_from(endian + "3H", data, 0x3A)
+        section = struct.Struct(endian + "IIQQQQIIQQ")
+    else:
+        shoff, = struct.unpack_from(endian + "I", data, 0x20)
+        shentsize, shnum, shstrndx = struct.unpack_from(endian + "3H", data, 0x2E)
+        section = struct.Struct(endian + "IIIIIIIIII")
+
+    if shnum and shentsize < section.size:
+        raise UnsupportedBinary("bad ELF section header size")
+    check_table(data, shoff, shnum, shentsize, "ELF section table")
+    return is_64, endian, [section.unpack_from(data, shoff + n * shentsize) for n in range(shnum)]
+
+# Yields (address, name) of every STT_FUNC symbol
+def elf_function_symbols(data: bytes):
+    is_64, endian, sections = elf_sections(data)
+    symbol = struct.Struct(endian + ("IBBHQQ" if is_64 else "IIIBBH"))
+
+    for _, sh_type, _, _, sh_offset, sh_size, sh_link, *_ in sections:
+        if sh_type != 2:  # SHT_SYMTAB
+            continue
+        strings = sections[sh_link][4] if sh_link < len(sections) else 0
+        for offset in range(sh_offset, min(sh_offset + sh_size, len(data) - symbol.size + 1), symbol.size):
+            fields = symbol.unpack_from(data, offset)
+            info, value = (fields[1], fields[4]) if is_64 else (fields[3], fields[1])
+            if info & 0xF == 2:  # STT_FUNC
+                name_offset = strings + fields[0]
+                yield value, data[name_offset:data.find(b"\0", name_offset)].decode("utf-8", "replace")
+
+def load_elf(data: bytes):
+    _, endian, sections = elf_sections(data)
+
+    code = []
+    for _, sh_type, sh_flags, sh_addr, sh_offset, sh_size, *_ in sections:
+        if sh_flags & 0x4 and sh_type != 8:  # SHF_EXECINSTR, not SHT_NOBITS
+            code.append((sh_addr, section_words(data[sh_offset:sh_offset + sh_size], endian == ">")))
+
+    return code, [value for value, _ in elf_function_symbols(data)]
+
+def load_dol(data: bytes):
+    check_table(data, 0, 1, 0x100, "DOL header")
+    offsets = struct.unpack_from(">7I", data, 0x00)
+    addresses = struct.unpack_from(">7I", data, 0x48)
+    sizes = struct.unpack_from(">7I", data, 0x90)
+    for offset, size in zip(offsets, sizes):
+        check_table(data, offset, 1, size, "DOL text section")
+
+    code = [(address, section_words(data[offset:offset + size], True))
+            for offset, address, size in zip(offsets, addresses, sizes) if size]
+    return code, []
+
+def load_pe(data: bytes, image_base=None, mapped=False):
+    check_table(data, 0, 1, 0x40, "MZ header")
+    pe_offset, = struct.unpack_from("<I", data, 0x3C)
+    if data[pe_offset:pe_offset + 4] != b"PE\0\0":
+        raise UnsupportedBinary("bad PE header")
+
+    check_table(data, pe_offset, 1, 24 + 32, "PE header")
+    machine, section_count = struct.unpack_from("<HH", data, pe_offset + 4)
+    if machine not in PE_MACHINES:
+        raise UnsupportedBinary(f"not a PowerPC PE (machine {machine:#x})")
+    optional_size, = struct.unpack_from("<H", data, pe_offset + 20)
+    check_table(data, pe_offset + 24 + optional_size, section_count, 40, "PE section table")
+    if image_base is None:
+        image_base, = struct.unpack_from("<I", data, pe_offset + 24 + 28)
+
+    big_endian = machine == 0x1F2  # IMAGE_FILE_MACHINE_POWERPCBE (Xbox 360)
+
+    code, starts = [], []
+    for n in range(section_count):
+        name, virtual_size, virtual_address, raw_size, raw_offset = struct.unpack_from("<8sIIII", data, pe_offset + 24 + optional_size + n * 40)
+        characteristics, = struct.unpack_from("<I", data, pe_offset + 24 + optional_size + n * 40 + 36)
+
+        offset = virtual_address if mapped else raw_offset
+        size = virtual_size if mapped else min(raw_size, virtual_size or raw_size)
+        contents = data[offset:offset + size]
+
+        if characteristics & 0x20000020:  # IMAGE_SCN_CNT_CODE | IMAGE_SCN_MEM_EXECUTE
+            code.append((image_base + virtual_address, section_words(contents, big_endian)))
+
+        # Xbox 360 .pdata: (begin address, prolog/length bits) pairs, one per function
+        elif name.rstrip(b"\0") == b".pdata" and big_endian:
+            for begin, _ in struct.iter_unpack(">II", contents[:len(contents) & ~7]):
+                if begin:
+                    starts.append(begin)
+
+    return code, starts
+
+def load_xex(data: bytes):
+    check_table(data, 0, 1, 0x18, "XEX header")
+    pe_offset, = struct.unpack_from(">I", data, 0x08)
+    header_count, = struct.unpack_from(">I", data, 0x14)
+    check_table(data, 0x18, header_count, 8, "XEX optional headers")
+    if pe_offset > len(data):
+        raise UnsupportedBinary("truncated XEX")
+    headers = dict(struct.unpack_from(">II", data, 0x18 + n * 8) for n in range(header_count))
+
+    image_base = headers.get(0x00010201)
+    format_offset = headers.get(0x000003FF)
+    if format_offset is None:
+        raise UnsupportedBinary("no file format information")
+
+    info_size, encryption, compression = struct.unpack_from(">IHH", data, format_offset)
+    if encryption != 0 or compression not in (0, 1):
+        raise UnsupportedBinary("encrypted or LZX compressed XEX, extract the basefile first (e.g. xextool -b)")
+
+    if compression == 0:
+        basefile = data[pe_offset:]
+    else:
+        # Basic compression: runs of stored data, each followed by zeros
+        parts = []
+        position = pe_offset
+        for data_size, zero_size in struct.iter_unpack(">II", data[format_offset + 8:format_offset + info_size]):
+            parts.append(data[position:position + data_size])
+            parts.append(bytes(zero_size))
+            position += data_size
+        basefile = b"".join(parts)
+
+    return load_pe(basefile, image_base, mapped=True)
+
+def load_binary(path: str):
+    with open(path, "rb") as binary:
+        data = binary.read()
+
+    try:
+        if data[:4] == b"\x7fELF":
+            return load_elf(data)
+        if data[:4] == b"XEX2":
+            return load_xex(data)
+        if data[:2] == b"MZ":
+            return load_pe(data)
+        if path.lower().endswith(".dol"):
+            return load_dol(data)
+        raise UnsupportedBinary("unknown file format")
+    except (struct.error, IndexError) as error:
+        unsupported = UnsupportedBinary(f"truncated file ({error})")
+    except UnsupportedBinary as error:
+        unsupported = error
+
+    unsupported.path = path
+    raise unsupported
+
+
+#	FUNCTION		iter_functions
+
+#	DESCRIPTION		Splits the code sections into functions: at the known function starts, or
+#					when the file doesn't give us any, after every blr.
+
+BLR = 0x4E800020
+
+def iter_functions(code, starts):
+    starts = sorted(set(starts))
+
+    for section_ea, words in code:
+        section_end = section_ea + len(words) * 4
+        first = bisect.bisect_left(starts, section_ea)
+        last = bisect.bisect_left(starts, section_end)
+        bounds = starts[first:last]
+
+        if bounds:
+            bounds = ([section_ea] if bounds[0] != section_ea else []) + bounds + [section_end]
+            for start_ea, end_ea in zip(bounds, bounds[1:]):
+                yield start_ea, words[(start_ea - section_ea) >> 2:(end_ea - section_ea) >> 2]
+        else:
+            begin = 0
+            for position, code_bytes in enumerate(words):
+                if code_bytes == BLR:
+                    yield section_ea + begin * 4, words[begin:position + 1]
+                    begin = position + 1
+            if begin < len(words):
+                yield section_ea + begin * 4, words[begin:]
+
+
+#	FUNCTION		analyse_binary
+
+#	DESCRIPTION		Per function statistics for the batch driver: the opcode table index
+#					histogram (stored sparse), how many distinct vector registers are used
+#					(with the 128 bit usage mask) and how much of the function is ours.
+
+g_vector_register_operands = frozenset({
+    AltivecOperandID.VA, AltivecOperandID.VB, AltivecOperandID.VC, AltivecOperandID.VD,
+    AltivecOperandID.VD128, AltivecOperandID.VA128, AltivecOperandID.VB128, AltivecOperandID.VC128,
+})
+
+# For every table entry, the operand positions holding a vector register
+g_vector_register_positions = tuple(
+    tuple(position for position, (operand_id, _) in enumerate(decoders) if operand_id in g_vector_register_operands)
+    for decoders in g_operand_decoders)
+
+def vector_register_mask(index: int, code_bytes: int) -> int:
+    mask = 0
+    decoders = g_operand_decoders[index]
+    for position in g_vector_register_positions[index]:
+        mask |= 1 << decoders[position][1](code_bytes)
+    return mask
+
+# Vector register roles per operand position. The first VD/VD128 operand is written, except by the
+# stores and mtvscr where it is the source (VS); every other vector register operand is read.
+# vrlimi128 also reads its destination (the VS128 alias of vmaddfp128 is a second VD128 operand).
+g_vector_source_first = frozenset({"mtvscr"})
+g_vector_read_modify_write = frozenset({"vrlimi128"})
+
+def build_vector_register_roles():
+    roles = []
+    for opcode, positions in zip(g_altivec_opcodes, g_vector_register_positions):
+        writes, reads = [], []
+        for position in positions:
+            operand_id = opcode.operands[position]
+            if position == 0 and operand_id in (AltivecOperandID.VD, AltivecOperandID.VD128) \
+                    and not opcode.name.startswith("stv") and opcode.name not in g_vector_source_first:
+                writes.append(position)
+                if opcode.name in g_vector_read_modify_write:
+                    reads.append(position)
+            else:
+                reads.append(position)
+        roles.append((tuple(writes), tuple(reads)))
+    return tuple(roles)
+
+g_vector_register_roles = build_vector_register_roles()
+
+# Returns the (defined, used) vector register bitsets of an instruction
+def vector_defs_uses(index: int, code_bytes: int):
+    decoders = g_operand_decoders[index]
+    writes, reads = g_vector_register_roles[index]
+    defined = used = 0
+    for position in writes:
+        defined |= 1 << decoders[position][1](code_bytes)
+    for position in reads:
+        used |= 1 << decoders[position][1](code_bytes)
+    return defined, used
+
+# v14-v31 and v64-v127 survive calls on Xenon, which covers the v20-v31 of the Altivec ABI
+g_nonvolatile_vector_registers = frozenset(list(range(14, 32)) + list(range(64, 128)))
+
+def analyse_binary(path: str) -> dict:
+    code, starts = load_binary(path)
+
+    function_start, function_words, function_altivec, function_registers = [], [], [], []
+    mask_low, mask_high = [], []
+    histogram_function, histogram_index, histogram_count = [], [], []
+
+    for start_ea, words in iter_functions(code, starts):
+        counts = {}
+        mask = 0
+
+        for code_bytes, index in zip(words, altivec_decode_many(words)):
+            if index >= 0:
+                counts[index] = counts.get(index, 0) + 1
+                if g_vector_register_positions[index]:
+                    mask |= vector_register_mask(index, code_bytes)
+
+        row = len(function_start)
+        function_start.append(start_ea)
+        function_words.append(len(words))
+        function_altivec.append(sum(counts.values()))
+        function_registers.append(bin(mask).count("1"))
+        mask_low.append(mask & 0xFFFFFFFFFFFFFFFF)
+        mask_high.append(mask >> 64)
+
+        for index, count in sorted(counts.items()):
+            histogram_function.append(row)
+            histogram_index.append(index)
+            histogram_count.append(count)
+
+    words = np.array(function_words, dtype=np.uint32)
+    altivec = np.array(function_altivec, dtype=np.uint32)
+
+    return {
+        "function_start": np.array(function_start, dtype=np.uint64),
+        "function_words": words,
+        "function_altivec": altivec,
+        "function_coverage": np.divide(altivec, words, out=np.zeros(len(words), dtype=np.float32), where=words > 0),
+        "function_vector_registers": np.array(function_registers, dtype=np.uint8),
+        "function_vector_mask_low": np.array(mask_low, dtype=np.uint64),
+        "function_vector_mask_high": np.array(mask_high, dtype=np.uint64),
+        "histogram_function": np.array(histogram_function, dtype=np.uint32),
+        "histogram_index": np.array(histogram_index, dtype=np.uint16),
+        "histogram_count": np.array(histogram_count, dtype=np.uint32),
+        "coverage": np.float32(altivec.sum() / words.sum() if words.sum() else 0.0),
+    }
+
+
+#	FUNCTION		command_batch
+
+#	DESCRIPTION		Nightly triage driver: analyses every binary below a directory with a pool
+#					of processes. Each binary gets its own compressed .npz shard of columnar
+#					arrays in the output directory (the opcode names are in itypes.npz) and a
+#					line in manifest.jsonl once its shard is complete. Files already listed
+#					with the same size and modification time are skipped, so an interrupted
+#					run can simply be started again and new results are only ever appended.
+
+BATCH_EXTENSIONS = (".elf", ".self", ".prx", ".sprx", ".xex", ".exe", ".dll", ".dol", ".bin")
+
+def batch_job(path: str):
+    try:
+        return path, analyse_binary(path), None
+    except (OSError, UnsupportedBinary) as error:
+        return path, None, str(error)
+    except Exception as error:
+        return path, None, f"{type(error).__name__}: {error}"
+
+def command_batch(args) -> int:
+    if np is None:
+        print("the batch driver needs NumPy", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest_path = os.path.join(args.out, "manifest.jsonl")
+
+    # The last entry of a binary counts. A line cut short by a killed run is skipped, and binaries
+    # that failed are only tried again with --retry-failed (or once they change)
+    done = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8", errors="replace") as manifest:
+            for line in manifest:
+                try:
+                    entry = json.loads(line)
+                    path, key = entry["path"], (entry["size"], entry["mtime_ns"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if entry.get("shard") or not args.retry_failed:
+                    done[path] = key
+                else:
+                    done.pop(path, None)
+
+    np.savez(os.path.join(args.out, "itypes.npz"), names=np.array([opcode.name for opcode in g_altivec_opcodes]),
+             itypes=np.array([int(opcode.insn) for opcode in g_altivec_opcodes], dtype=np.uint32))
+
+    pending = []
+    for root, _, files in os.walk(args.directory):
+        for name in sorted(files):
+            if not name.lower().endswith(BATCH_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, args.directory)
+            info = os.stat(path)
+            if done.get(relative) != (info.st_size, info.st_mtime_ns):
+                pending.append((path, relative, info))
+
+    print(f"{len(pending)} binaries to analyse, {len(done)} already done")
+
+    relatives = {path: (relative, info) for path, relative, info in pending}
+
+    # Start on a line of our own after a partial one
+    if os.path.exists(manifest_path) and os.path.getsize(manifest_path):
+        with open(manifest_path, "rb+") as manifest:
+            manifest.seek(-1, os.SEEK_END)
+            if manifest.read(1) != b"\n":
+                manifest.write(b"\n")
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool, \
+         open(manifest_path, "a", encoding="utf-8") as manifest:
+
+        jobs = {pool.submit(batch_job, path): path for path, _, _ in pending}
+        for job in concurrent.futures.as_completed(jobs):
+            # A worker dying takes its job down with it, the other binaries go on
+            try:
+                path, result, error = job.result()
+            except Exception as failure:
+                path, result, error = jobs[job], None, f"{type(failure).__name__}: {failure}"
+            relative, info = relatives[path]
+            entry = {"path": relative, "size": info.st_size, "mtime_ns": info.st_mtime_ns}
+
+            if result is None:
+                entry["error"] = error
+                print(f"{relative}: {error}")
+            else:
+                shard = hashlib.sha1(relative.encode()).hexdigest()[:16] + ".npz"
+                temporary = os.path.join(args.out, shard + ".tmp")
+                with open(temporary, "wb") as output:
+                    np.savez_compressed(output, **result)
+                os.replace(temporary, os.path.join(args.out, shard))
+
+                entry["shard"] = shard
+                entry["functions"] = len(result["function_start"])
+                entry["coverage"] = float(result["coverage"])
+                print(f"{relative}: {entry['functions']} functions, {entry['coverage'] * 100:.2f}% Altivec")
+
+            manifest.write(json.dumps(entry) + "\n")
+            manifest.flush()
 
-#	DESCRIPTION		This is the main analysis function..
+    return 0
 
-def plugin_analyse(insn: ida_ua.insn_t):
 
-    code_bytes = get_dword(insn.ea)
+#	FUNCTION		iter_decoded_instructions
+
+#	DESCRIPTION		Generator over the instructions of ours found in the code sections of a
+#					binary, yielding (ea, word, mnemonic, operand text) one at a time so
+#					nothing proportional to the number of instructions is ever kept.
+
+EXPORT_RENDER_CACHE_SIZE = 0x10000
+
+def iter_decoded_instructions(code):
+    # Code repeats a lot, so the rendered operands are remembered too (bounded)
+    rendered = {}
+
+    for section_ea, words in code:
+        for start in range(0, len(words), DAEMON_MAX_WORDS):
+            chunk = words[start:start + DAEMON_MAX_WORDS]
+            ea = section_ea + start * 4
+            for code_bytes, index in zip(chunk, altivec_decode_many(chunk)):
+                if index >= 0:
+                    operands = rendered.get(code_bytes)
+                    if operands is None:
+                        if len(rendered) >= EXPORT_RENDER_CACHE_SIZE:
+                            rendered.clear()
+                        operands = rendered[code_bytes] = render_operands(index, code_bytes)
+                    yield ea, code_bytes, g_altivec_opcodes[index].name, operands
+                ea += 4
+
+
+#	FUNCTION		command_export
+
+#	DESCRIPTION		Streams the decoded instructions of a binary to JSON lines or CSV, through
+#					a large write buffer and optionally gzip ('.gz' output names imply it),
+#					and reports the decoding throughput.
+
+EXPORT_BUFFER_SIZE = 1 << 20
+
+def command_export(args) -> int:
+    started = time.perf_counter()
+    code, _ = load_binary(args.binary)
+    code_size = sum(len(words) * 4 for _, words in code)
+
+    compress = args.gzip or args.out.endswith(".gz")
+    if args.out == "-":
+        output = sys.stdout
+    elif compress:
+        output = io.TextIOWrapper(io.BufferedWriter(gzip.open(args.out, "wb", compresslevel=6), EXPORT_BUFFER_SIZE), encoding="utf-8", newline="")
+    else:
+        output = open(args.out, "w", encoding="utf-8", newline="", buffering=EXPORT_BUFFER_SIZE)
+
+    count = 0
+    try:
+        if args.format == "csv":
+            writer = csv.writer(output)
+            writer.writerow(("ea", "word", "mnemonic", "operands"))
+            for record in iter_decoded_instructions(code):
+                writer.writerow(record)
+                count += 1
+        else:
+            # The text fields go through json.dumps() once per distinct word (bounded)
+            encoded = {}
+            for ea, code_bytes, mnemonic, operands in iter_decoded_instructions(code):
+                fields = encoded.get(code_bytes)
+                if fields is None:
+                    if len(encoded) >= EXPORT_RENDER_CACHE_SIZE:
+                        encoded.clear()
+                    fields = encoded[code_bytes] = json.dumps({"mnemonic": mnemonic, "operands": operands}, separators=(",", ":"))[1:-1]
+                output.write(f'{{"ea":{ea},"word":{code_bytes},{fields}}}\n')
+                count += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"{count} instructions from {code_size / 1e6:.1f} MB of code in {elapsed:.2f} s "
+          f"({code_size / 1e6 / elapsed if elapsed else 0:.1f} MB/s)", file=sys.stderr)
+    return 0
 
-    # Estrai i byte di operazione con la maschera OP_MASK
-    op_bytes = code_bytes & OP_MASK
 
-    # Opcode supportati
-    supported_opcodes = {0, 4, 5, 6, 17, 31, 56, 57, 60, 61}
+#	FUNCTION		instruction_token
+
+#	DESCRIPTION		Function similarity works on instruction kinds only, so that code
+#					compiled with a different register allocation still matches. A token
+#					is our opcode table index for Altivec instructions, otherwise the PowerPC
+#					primary opcode plus, where the primary opcode is shared, the extended
+#					opcode (without register fields).
+
+def instruction_token(code_bytes: int, index: int) -> int:
+    if index >= 0:
+        return 0x10000 | index
+
+    primary = code_bytes >> 26
+    if primary in (19, 31):
+        return primary << 10 | (code_bytes >> 1) & 0x3FF
+    if primary in (59, 63):
+        extended = (code_bytes >> 1) & 0x3FF
+        # A-form floating point instructions keep FRC in the upper extended opcode bits
+        return primary << 10 | (extended & 0x1F if extended & 0x10 else extended)
+    if primary == 30:
+        return primary << 10 | (code_bytes >> 1) & 0xF
+    if primary in (58, 62):
+        return primary << 10 | code_bytes & 0x3
+    return primary << 10
+
+def function_tokens(words) -> list:
+    return [instruction_token(code_bytes, index) for code_bytes, index in zip(words, altivec_decode_many(words))]
+
+
+#	FUNCTION		minhash_signature
+
+#	DESCRIPTION		MinHash of a function's token n-grams: SIMILARITY_HASHES multiply-shift
+#					hashes (fixed seed, so signatures from different runs and machines can be
+#					compared), keeping the minimum of each over all the n-grams. The fraction
+#					of equal entries between two signatures estimates the Jaccard similarity
+#					of their n-gram sets. Returns None for functions too short to tell apart.
+
+SIMILARITY_NGRAM = 4
+SIMILARITY_HASHES = 64
+SIMILARITY_BANDS = 16       # LSH bands of SIMILARITY_HASHES // SIMILARITY_BANDS rows
+SIMILARITY_MIN_WORDS = 12
+SIMILARITY_THRESHOLD = 0.8
+MINHASH_SLICE = 0x4000
+
+g_minhash_seeds = None
+
+def minhash_seeds():
+    global g_minhash_seeds
+
+    if g_minhash_seeds is None:
+        generator = np.random.Generator(np.random.PCG64(0x416C74697665630A))
+        multipliers = generator.integers(0, 1 << 63, SIMILARITY_HASHES, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        offsets = generator.integers(0, 1 << 63, SIMILARITY_HASHES, dtype=np.uint64)
+        g_minhash_seeds = (multipliers[:, None], offsets[:, None])
+    return g_minhash_seeds
+
+def minhash_signature(tokens):
+    if len(tokens) < max(SIMILARITY_MIN_WORDS, SIMILARITY_NGRAM):
+        return None
+
+    tokens = np.asarray(tokens, dtype=np.uint64)
+    count = len(tokens) - SIMILARITY_NGRAM + 1
+
+    # uint64 arithmetic wraps, which is what the hashing wants
+    with np.errstate(over="ignore"):
+        shingles = tokens[:count].copy()
+        for position in range(1, SIMILARITY_NGRAM):
+            shingles = shingles * np.uint64(0x9E3779B97F4A7C15) + tokens[position:position + count]
+        shingles ^= shingles >> np.uint64(31)
+
+        shingles = np.unique(shingles)
+        multipliers, offsets = minhash_seeds()
+
+        # In slices, so that huge functions don't need a SIMILARITY_HASHES times larger temporary
+        signature = np.full(SIMILARITY_HASHES, 0xFFFFFFFF, dtype=np.uint64)
+        for first in range(0, len(shingles), MINHASH_SLICE):
+            hashes = (multipliers * shingles[None, first:first + MINHASH_SLICE] + offsets) >> np.uint64(32)
+            np.minimum(signature, hashes.min(axis=1), out=signature)
+        return signature.astype(np.uint32)
+
+def band_keys(signatures):
+    rows = SIMILARITY_HASHES // SIMILARITY_BANDS
+    bands = signatures.reshape(-1, SIMILARITY_BANDS, rows).astype(np.uint64)
+
+    with np.errstate(over="ignore"):
+        keys = np.arange(SIMILARITY_BANDS, dtype=np.uint64)[None, :] * np.uint64(0xC2B2AE3D27D4EB4F)
+        for row in range(rows):
+            keys = (keys ^ bands[:, :, row]) * np.uint64(0x100000001B3)
+    return keys.T      # (bands, functions)
+
+
+#	CLASS			SimilarityIndex
+
+#	DESCRIPTION		MinHash signatures of named functions with an LSH table to find candidates.
+#					The index is a directory of .npy files which are memory mapped when opened,
+#					so loading is instant whatever the size; a query does one binary search
+#					per band and compares the signatures of the few candidates found.
+#
+#					signatures.npy		(N, SIMILARITY_HASHES) uint32
+#					words.npy			(N,) uint32, function size in instructions
+#					names.npy			utf-8 names back to back, names_offsets.npy (N + 1,)
+#					band_keys.npy		(SIMILARITY_BANDS, N) uint64, sorted per band
+#					band_rows.npy		(SIMILARITY_BANDS, N) uint32, the row of each key
+
+SIMILARITY_FILES = ("signatures", "words", "names", "names_offsets", "band_keys", "band_rows")
+
+class SimilarityIndex:
+    def __init__(self, path: str):
+        self.path = path
+        for name in SIMILARITY_FILES:
+            setattr(self, name, np.load(os.path.join(path, name + ".npy"), mmap_mode="r"))
+
+    def __len__(self):
+        return len(self.words)
+
+    def name(self, row: int) -> str:
+        return bytes(self.names[self.names_offsets[row]:self.names_offsets[row + 1]]).decode("utf-8")
+
+    def candidates(self, signature):
+        keys = band_keys(signature[None, :])[:, 0]
+        rows = []
+        for band, key in enumerate(keys):
+            sorted_keys = self.band_keys[band]
+            first = np.searchsorted(sorted_keys, key, "left")
+            last = np.searchsorted(sorted_keys, key, "right")
+            rows.append(self.band_rows[band, first:last])
+        return np.unique(np.concatenate(rows)) if rows else np.empty(0, dtype=np.uint32)
+
+    # Best matches as (similarity, name), at most one entry per name
+    def query(self, signature, threshold: float = SIMILARITY_THRESHOLD, limit: int = 5) -> list:
+        rows = self.candidates(signature)
+        if not len(rows):
+            return []
+
+        similarities = (np.asarray(self.signatures[rows]) == signature[None, :]).mean(axis=1)
+        order = np.argsort(-similarities, kind="stable")
+
+        matches, seen = [], set()
+        for position in order:
+            if similarities[position] < threshold or len(matches) == limit:
+                break
+            name = self.name(int(rows[position]))
+            if name not in seen:
+                seen.add(name)
+                matches.append((float(similarities[position]), name))
+        return matches
+
+    # Writes an index from (name, signature, words) entries, adding them to an existing one;
+    # entries already in the index (same name and signature) are not added again
+    @staticmethod
+    def build(path: str, entries, merge: bool = True) -> int:
+        names, signatures, words = [], [], []
+        for name, signature, size in entries:
+            names.append(name.encode("utf-8"))
+            signatures.append(signature)
+            words.append(size)
+
+        signatures = np.array(signatures, dtype=np.uint32).reshape(-1, SIMILARITY_HASHES)
+        words = np.array(words, dtype=np.uint32)
+        lengths = np.array([len(name) for name in names], dtype=np.uint64)
+        names = np.frombuffer(b"".join(names), dtype=np.uint8)
+
+        if merge and os.path.exists(os.path.join(path, "signatures.npy")):
+            existing = SimilarityIndex(path)
+            signatures = np.concatenate((existing.signatures, signatures))
+            words = np.concatenate((existing.words, words))
+            lengths = np.concatenate((np.diff(existing.names_offsets), lengths))
+            names = np.concatenate((existing.names, names))
+            del existing
+
+        # Adding the same binary again must not grow the index: keep one row per (name, signature)
+        offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.uint64).tolist()
+        name_bytes = np.asarray(names).tobytes()
+        signature_bytes = np.ascontiguousarray(signatures).tobytes()
+        row_size = SIMILARITY_HASHES * 4
+        keep, seen = [], set()
+        for row in range(len(words)):
+            key = (name_bytes[offsets[row]:offsets[row + 1]], signature_bytes[row * row_size:(row + 1) * row_size])
+            if key not in seen:
+                seen.add(key)
+                keep.append(row)
+        if len(keep) < len(words):
+            signatures = signatures[keep]
+            words = words[keep]
+            lengths = lengths[keep]
+            names = np.frombuffer(b"".join(name_bytes[offsets[row]:offsets[row + 1]] for row in keep), dtype=np.uint8)
+
+        keys = band_keys(signatures)
+        order = np.argsort(keys, axis=1, kind="stable").astype(np.uint32)
+        arrays = {
+            "signatures": signatures,
+            "words": words,
+            "names": names,
+            "names_offsets": np.concatenate(([0], np.cumsum(lengths))).astype(np.uint64),
+            "band_keys": np.take_along_axis(keys, order, axis=1),
+            "band_rows": order,
+        }
+
+        # Write everything next to the index, then swap the files in: open readers keep their maps
+        os.makedirs(path, exist_ok=True)
+        for name in SIMILARITY_FILES:
+            np.save(os.path.join(path, name + ".tmp.npy"), arrays[name])
+        for name in SIMILARITY_FILES:
+            os.replace(os.path.join(path, name + ".tmp.npy"), os.path.join(path, name + ".npy"))
+        return len(words)
+
+
+#	FUNCTION		command_similar
+
+#	DESCRIPTION		"similar add" puts the named functions of binaries with symbols (ELF) in an
+#					index; "similar query" lists, for every function of a binary, the named
+#					functions it most likely is.
+
+g_default_name_prefixes = ("sub_", "loc_", "nullsub_", "j_", "unknown_", "__unnamed")
+
+def named_function_signatures(path: str):
+    with open(path, "rb") as binary:
+        data = binary.read()
+    if data[:4] != b"\x7fELF":
+        return
+
+    names = {}
+    for value, name in elf_function_symbols(data):
+        if name and not name.startswith(g_default_name_prefixes):
+            names.setdefault(value, name)
+
+    code, starts = load_binary(path)
+    for start_ea, words in iter_functions(code, starts):
+        name = names.get(start_ea)
+        if name is not None:
+            signature = minhash_signature(function_tokens(words))
+            if signature is not None:
+                yield name, signature, len(words)
+
+def command_similar(args) -> int:
+    if np is None:
+        print("the similarity index needs NumPy", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+
+    if args.action == "add":
+        entries = (entry for path in args.binaries for entry in named_function_signatures(path))
+        count = SimilarityIndex.build(args.index, entries)
+        print(f"{count} functions in {args.index} ({time.perf_counter() - started:.2f} s)", file=sys.stderr)
+        return 0
 
-    # Controlla se l'opcode è supportato
-    if op_bytes in supported_opcodes:
-        opcode_array_size = len(g_altivec_opcodes)
-        p_current_opcode : altivec_opcode = g_altivec_opcodes
-        
-        for opcodeLoop in range(opcode_array_size):
-            operandLoop = 0;
-            while pCurrentOpcode.operands[operandLoop] != 0 and operandLoop < MAX_OPERANDS:
-            
-                pOperandData : op_t = insn.ops[operandLoop] # cmd.Operands[operandLoop];
-                pCurrentOperand : altivec_operand = g_altivecOperands[pCurrentOpcode.operands[operandLoop]]
+    index = SimilarityIndex(args.index)
+    matched = total = 0
+    for path in args.binaries:
+        code, starts = load_binary(path)
+        for start_ea, words in iter_functions(code, starts):
+            signature = minhash_signature(function_tokens(words))
+            if signature is None:
+                continue
+            total += 1
+            matches = index.query(signature, args.threshold)
+            if matches:
+                matched += 1
+                print(f"{path}\t{start_ea:08X}\t" + "\t".join(f"{name} ({similarity:.2f})" for similarity, name in matches))
+
+    print(f"{matched} of {total} functions matched against {len(index)} in {time.perf_counter() - started:.2f} s", file=sys.stderr)
+    return 0
 
-                raw_bits = (code_bytes >> pCurrent_operand.shift) & ((1 << pCurrent_operand.bits) - 1)
-                extended_bits = (raw_bits << (32 - pCurrent_operand.bits)) >> (32 - pCurrent_operand.bits)
 
-                match pCurrentOpcode.operands[operandLoop]:
+#	FUNCTION		pipeline_class
+
+#	DESCRIPTION		Pipeline metadata of the opcode table. Every entry is put in a timing class
+#					from its mnemonic, and g_pipeline_timings gives, per CPU model, the unit,
+#					latency and issue interval (cycles before the unit takes the next one) of
+#					each class. The figures are the usual published ones for dependent vector
+#					code hitting L1; they are good enough to rank loops, not to count cycles.
+
+g_pipeline_estimates = frozenset({"vrefp", "vrsqrtefp", "vexptefp", "vlogefp", "vrefp128", "vrsqrtefp128", "vexptefp128", "vlogefp128"})
+g_pipeline_whole_shifts = frozenset({"vsl", "vsr", "vslo", "vsro", "vslo128", "vsro128"})
+
+def pipeline_class(name: str) -> str:
+    name = name.rstrip(".")
+    if name.startswith(("lv", "psq_l")):
+        return "load"
+    if name.startswith(("stv", "psq_st")):
+        return "store"
+    if name.startswith(("dst", "dss", "dcbz")):
+        return "stream"
+    if name in ("mfvscr", "mtvscr"):
+        return "simple"
+    if not name.startswith("v"):
+        return "other"
+    if name in g_pipeline_estimates:
+        return "estimate"
+    if name in ("vmsum3fp128", "vmsum4fp128"):
+        return "dot"
+    if "fp" in name or name.startswith(("vcfsx", "vcfux", "vctsxs", "vctuxs", "vcsxwfp", "vcuxwfp", "vrfi")):
+        return "float"
+    if name.startswith(("vperm", "vsldoi", "vsplt", "vmrg", "vpk", "vupk", "vrlimi")) or name in g_pipeline_whole_shifts:
+        return "permute"
+    if name.startswith(("vmul", "vmsum", "vsum", "vmhadd", "vmhradd", "vmladd")):
+        return "complex"
+    return "simple"
+
+# Per model: (instructions issued per cycle, {class: (unit, latency, issue interval)}). The Xenon
+# cores and the Cell PPU are the same PPE design with the same vector pipeline, so they share one
+# model; their names are kept as aliases.
+g_pipeline_timings = {
+    "ppe": (2, {
+        "load": ("LSU", 5, 1), "store": ("LSU", 1, 1), "stream": ("LSU", 1, 1),
+        "simple": ("VIU", 4, 1), "complex": ("VIU", 9, 1), "permute": ("VPERM", 4, 1),
+        "float": ("VFPU", 12, 1), "estimate": ("VFPU", 14, 2), "dot": ("VFPU", 14, 1),
+        "other": ("FXU", 1, 1),
+    }),
+    "g4": (2, {
+        "load": ("LSU", 3, 1), "store": ("LSU", 1, 1), "stream": ("LSU", 1, 1),
+        "simple": ("VIU", 1, 1), "complex": ("VIU", 4, 1), "permute": ("VPERM", 2, 1),
+        "float": ("VFPU", 4, 1), "estimate": ("VFPU", 4, 1), "dot": ("VFPU", 4, 1),
+        "other": ("FXU", 1, 1),
+    }),
+}
+
+g_pipeline_classes = tuple(pipeline_class(opcode.name) for opcode in g_altivec_opcodes)
+
+# Per model, per table entry: (unit, latency, issue interval)
+g_pipeline_info = {model: tuple(timings[cls] for cls in g_pipeline_classes) for model, (_, timings) in g_pipeline_timings.items()}
+
+g_pipeline_model_aliases = {"xenon": "ppe", "cell": "ppe"}
+g_pipeline_model_names = tuple(sorted(g_pipeline_timings)) + tuple(sorted(g_pipeline_model_aliases))
+
+def pipeline_model(name: str) -> str:
+    return g_pipeline_model_aliases.get(name, name)
+
+
+#	FUNCTION		find_loops
+
+#	DESCRIPTION		Innermost loops of a run of instruction words, found from the backward
+#					b/bc branches (not calls, not absolute) that land inside it. Returns
+#					(first, last) word positions.
+
+# Longer "loops" are nearly always data decoded as a branch
+PIPELINE_MAX_LOOP_WORDS = 0x1000
+
+def branch_target(position: int, code_bytes: int):
+    primary = code_bytes >> 26
+    if code_bytes & 3 or primary not in (16, 18):
+        return None
+    if primary == 18:
+        displacement = code_bytes & 0x03FFFFFC
+        displacement -= (displacement & 0x02000000) << 1
+    else:
+        displacement = code_bytes & 0xFFFC
+        displacement -= (displacement & 0x8000) << 1
+    return position + (displacement >> 2)
+
+def find_loops(words) -> list:
+    loops = set()
+    for position, code_bytes in enumerate(words):
+        target = branch_target(position, code_bytes)
+        if target is not None and 0 <= target <= position:
+            loops.add((target, position))
+
+    # A loop is innermost when no other one starts at or after its first word and ends at or
+    # before its last. Sweeping from the last start backwards (shortest first for the same start),
+    # every loop already seen starts at or after the current one, so the smallest end seen so far
+    # tells whether one of them is nested inside.
+    innermost = []
+    smallest_last = None
+    for first, last in sorted((loop for loop in loops if loop[1] - loop[0] < PIPELINE_MAX_LOOP_WORDS),
+                              key=lambda loop: (-loop[0], loop[1])):
+        if smallest_last is None or smallest_last > last:
+            innermost.append((first, last))
+            smallest_last = last
+    return sorted(innermost)
+
+
+#	CLASS			LoopEstimate
+
+#	DESCRIPTION		Static timing of a loop body: an in-order schedule (issue width, one
+#					instruction per unit per issue interval, operands ready after the producer's
+#					latency) run over several iterations, so loop carried dependencies count.
+#					Only vector register dependencies are tracked; everything in the address
+#					range of the loop is taken as executed once per iteration.
+
+PIPELINE_ITERATIONS = 4
+
+class LoopEstimate:
+    def __init__(self, words, indices, model: str):
+        model = pipeline_model(model)
+        width, timings = g_pipeline_timings[model]
+        info = g_pipeline_info[model]
+        other = timings["other"]
+
+        entries = []
+        for code_bytes, index in zip(words, indices):
+            if index < 0:
+                entries.append((other[0], other[1], other[2], (), ()))
+                continue
+            defined, used = vector_defs_uses(index, code_bytes) if g_vector_register_positions[index] else (0, 0)
+            unit, latency, interval = info[index]
+            entries.append((unit, latency, interval, register_numbers(defined), register_numbers(used)))
+
+        self.instructions = len(entries)
+        self.vector_instructions = sum(1 for index in indices if index >= 0)
+
+        # Dependency chain of one iteration with unlimited resources
+        ready = [0] * 128
+        self.critical_path = 0
+        for _, latency, _, defines, uses in entries:
+            start = max((ready[register] for register in uses), default=0)
+            for register in defines:
+                ready[register] = start + latency
+            self.critical_path = max(self.critical_path, start + latency)
+
+        # In-order schedule over a few iterations, the steady state is the distance between the last two
+        ready = [0] * 128
+        unit_free = {}
+        cycle = slots = 0
+        starts = []
+        for _ in range(PIPELINE_ITERATIONS):
+            starts.append(cycle)
+            for unit, latency, interval, defines, uses in entries:
+                issue = max(cycle, unit_free.get(unit, 0), max((ready[register] for register in uses), default=0))
+                if issue == cycle and slots >= width:
+                    issue += 1
+                if issue > cycle:
+                    cycle, slots = issue, 0
+                slots += 1
+                unit_free[unit] = issue + interval
+                for register in defines:
+                    ready[register] = issue + latency
+        self.cycles_per_iteration = starts[-1] - starts[-2] if len(starts) > 1 else cycle
+
+        busy = {}
+        for unit, _, interval, _, _ in entries:
+            busy[unit] = busy.get(unit, 0) + interval
+        resource, resource_cycles = max(busy.items(), key=lambda item: item[1]) if busy else ("FXU", 0)
+        resource_cycles = max(resource_cycles, -(-len(entries) // width))
+        self.bound = f"{resource} bound" if self.cycles_per_iteration <= resource_cycles else "latency bound"
+
+    def describe(self, model: str) -> str:
+        return (f"{self.cycles_per_iteration} cycles/iteration ({model}), critical path {self.critical_path}, "
+                f"{self.vector_instructions}/{self.instructions} vector, {self.bound}")
+
+def register_numbers(bits: int) -> tuple:
+    numbers = []
+    while bits:
+        low = bits & -bits
+        numbers.append(low.bit_length() - 1)
+        bits ^= low
+    return tuple(numbers)
+
+# (first, last, LoopEstimate) of every innermost loop using vector instructions
+def estimate_loops(words, model: str, indices=None) -> list:
+    if indices is None:
+        indices = [altivec_decode(code_bytes) for code_bytes in words]
+
+    estimates = []
+    for first, last in find_loops(words):
+        body_indices = indices[first:last + 1]
+        if any(index >= 0 for index in body_indices):
+            estimates.append((first, last, LoopEstimate(words[first:last + 1], body_indices, model)))
+    return estimates
+
+
+#	FUNCTION		command_timing
+
+#	DESCRIPTION		Ranks the vector loops of binaries by their estimated cycles per iteration.
+
+def command_timing(args) -> int:
+    rows = []
+    for path in args.binaries:
+        code, starts = load_binary(path)
+        for section_ea, words in code:
+            indices = altivec_decode_many(words)
+            for first, last, estimate in estimate_loops(words, args.model, indices):
+                rows.append((estimate.cycles_per_iteration, path, section_ea + first * 4, section_ea + last * 4, estimate))
+
+    rows.sort(key=lambda row: (-row[0], row[1], row[2]))
+    for _, path, start_ea, end_ea, estimate in rows[:args.top]:
+        print(f"{path}\t{start_ea:08X}-{end_ea:08X}\t{estimate.describe(args.model)}")
+    print(f"{len(rows)} vector loops", file=sys.stderr)
+    return 0
 
-                    # Main Altivec Registers
-                    case AltivecOperandID.VA | AltivecOperandID.VB | AltivecOperandID.VC | AltivecOperandID.VD:  # VS
-                        pOperandData.type = o_reg
-                        pOperandData.reg = raw_bits
-                        pOperandData.specflag1 = 0x01  # marks the register as Altivec
-                        break
 
-                    # Signed immediate (extended_bits is sign extended into 32 bits)
-                    case AltivecOperandID.SIMM:
-                        pOperandData.type = o_imm
-                        pOperandData.dtype = dt_byte
-                        pOperandData.value = extended_bits
-                        break
+#	FUNCTION		decode_stream_control
 
-                    # Unsigned immediate
-                    case AltivecOperandID.UIMM:
-                        pOperandData.type = o_imm
-                        pOperandData.dtype = dt_byte
-                        pOperandData.value = raw_bits
-                        break
+#	DESCRIPTION		Field layout of the dst RB control word: block size in vectors (bits 24-28,
+#					0 meaning 32), block count (bits 16-23, 0 meaning 256) and the signed
+#					byte stride between blocks (bits 0-15, 0 meaning 32768). Returns (block
+#					size in bytes, count, stride).
 
-                    # Shift values are the same as unsigned immediates, but we separate for clarity
-                    case AltivecOperandID.SHB:
-                        pOperandData.type = o_imm
-                        pOperandData.dtype = dt_byte
-                        pOperandData.value = raw_bits
-                        break
+def decode_stream_control(control: int):
+    size = (control >> 24) & 0x1F or 32
+    count = (control >> 16) & 0xFF or 256
+    stride = ((control & 0xFFFF) ^ 0x8000) - 0x8000 or 32768
+    return size * 16, count, stride
 
-                    # Altivec memory loads are always via a CPU register
-                    case AltivecOperandID.RA | AltivecOperandID.RB:
-                        pOperandData.type = o_reg
-                        pOperandData.reg = raw_bits
-                        pOperandData.specflag1 = 0x00
-                        break
-                    
-                    # Altivec data stream ID
-                    case AltivecOperandID.STRM:
-                        pOperandData.type = o_imm
-                        pOperandData.dtype = dt_byte
-                        pOperandData.value = raw_bits
-                        break
-                    
-                    # Takires: Added operands
-                    case AltivecOperandID.L9_10 | AltivecOperandID.L10 | AltivecOperandID.L15:
-                        pOperandData.type = o_imm
-                        pOperandData.dtype = dt_byte
-                        pOperandData.value = raw_bits
-                        break
+T = altivec_insn_type_t
 
-                    case AltivecOperandID.RS: # Also RT
+# dst family: (for store, transient)
+g_stream_touch_itypes = {
+    T.altivec_dst: (False, False), T.altivec_dstt: (False, True),
+    T.altivec_dstst: (True, False), T.altivec_dststt: (True, True),
+}
 
-                        pOperandData.type = o_reg
-                        pOperandData.reg = raw_bits
-                        pOperandData.specflag1 = 0x00
-                        break
+g_streamed_load_itypes = frozenset({T.altivec_lvx, T.altivec_lvxl, T.vmx128_lvx128, T.vmx128_lvxl128})
 
-                    case AltivecOperandID.VD128: # Also VS128
+del T
 
-                        pOperandData.type = o_reg
-                        pOperandData.reg = ((code_bytes >> 21) & 0x1F | ((code_bytes & 0x0C) << 3))
-                        pOperandData.specflag1 = 0x01
-                        break
 
-                    case AltivecOperandID.VA128:
+#	CLASS			StreamReport
 
-                        pOperandData.type = o_reg
-                        pOperandData.reg = ((code_bytes >> 16) & 0x1F) | (code_bytes & 0x20) | ((code_bytes >> 4) & 0x40)
-                        pOperandData.specflag1 = 0x01
-                        break
+#	DESCRIPTION		Data stream prefetch coverage of one function (a run of instruction words).
+#					Every dst/dstt/dstst/dststt is recorded with its stream ID, base register
+#					and, when the RB control word is a constant built in the same block, the
+#					decoded block size, count and stride. The vector loads of each innermost
+#					loop are then matched by base register against the streams running at
+#					that point. Findings are (position, kind, message) with kind one of:
+#
+#					missing		:	a loop loads through a base register no stream covers
+#					stride		:	the loop steps the base by something else than the stride
+#					overlap		:	two stream IDs running over the same base register
+#					unstopped	:	no dss/dssall for the stream after it is started
+#
+#					Branches are ignored apart from the loops: streams are taken as running
+#					from their dst to the next dss of their ID in address order.
+
+STREAM_PREFIX = "Altivec stream: "
+
+class StreamReport:
+    def __init__(self, words, indices=None):
+        if indices is None:
+            indices = [altivec_decode(code_bytes) for code_bytes in words]
+
+        self.streams = []   # [position, stream ID, base register, control word or None, for store, transient, stop position]
+        self.findings = []
+        loads = []          # (position, rA, rB)
+        stops = []          # (position, stream ID or None for dssall)
+
+        constants = {}
+        for position, (code_bytes, index) in enumerate(zip(words, indices)):
+            if index >= 0:
+                itype = g_altivec_opcodes[index].insn
+                touch = g_stream_touch_itypes.get(itype)
+                if touch is not None:
+                    ra, rb, stream = altivec_decode_operands(index, code_bytes)
+                    self.streams.append([position, stream, ra, constants.get(rb), touch[0], touch[1], None])
+                elif itype == altivec_insn_type_t.altivec_dss:
+                    stops.append((position, altivec_decode_operands(index, code_bytes)[0]))
+                elif itype == altivec_insn_type_t.altivec_dssall:
+                    stops.append((position, None))
+                elif itype in g_streamed_load_itypes:
+                    loads.append((position, (code_bytes >> 16) & 0x1F, (code_bytes >> 11) & 0x1F))
+            track_gpr_constants(constants, code_bytes)
+
+        for stream in self.streams:
+            stream[6] = next((position for position, stopped in stops if position > stream[0] and stopped in (None, stream[1])), None)
+            if stream[6] is None:
+                self.findings.append((stream[0], "unstopped", f"stream {stream[1]} is never stopped (no dss {stream[1]} or dssall)"))
+
+        # Different IDs prefetching from the same register at the same time
+        for first, stream in enumerate(self.streams):
+            for other in self.streams[first + 1:]:
+                running = stream[6] is None or other[0] < stream[6]
+                if running and other[1] != stream[1] and other[2] == stream[2]:
+                    self.findings.append((other[0], "overlap", f"streams {stream[1]} and {other[1]} both prefetch from r{stream[2]}"))
+
+        for first, last in find_loops(words):
+            loop_loads = [load for load in loads if first <= load[0] <= last]
+            if not loop_loads:
+                continue
+
+            steps = loop_register_steps(words[first:last + 1])
+            running = [stream for stream in self.streams if stream[0] <= last and (stream[6] is None or stream[6] > first)]
+            uncovered = set()
+            for _, ra, rb in loop_loads:
+                bases = {ra, rb} - {0}
+                covering = [stream for stream in running if stream[2] in bases]
+                if not covering:
+                    uncovered.add(ra or rb)
+
+            for base in sorted(uncovered):
+                count = sum(1 for _, ra, rb in loop_loads if (ra or rb) == base)
+                self.findings.append((first, "missing", f"loop of {last - first + 1} instructions has {count} vector loads through r{base} without a data stream"))
+
+            for stream in running:
+                step = steps.get(stream[2])
+                if stream[3] is not None and step:
+                    _, _, stride = decode_stream_control(stream[3])
+                    if stride != step:
+                        self.findings.append((first, "stride", f"loop steps r{stream[2]} by {step} but stream {stream[1]} strides {stride}"))
+
+        self.findings.sort()
+
+    @staticmethod
+    def describe_stream(stream) -> str:
+        _, identifier, base, control, for_store, transient, _ = stream
+        kind = ("store " if for_store else "") + ("transient " if transient else "")
+        if control is None:
+            return f"{kind}stream {identifier} from r{base}, control word unknown"
+        size, count, stride = decode_stream_control(control)
+        return f"{kind}stream {identifier} from r{base}: {count} blocks of {size} bytes every {stride} bytes"
+
+# Constant amounts added to registers by addi rX, rX, imm / add in a loop body
+def loop_register_steps(words) -> dict:
+    steps = {}
+    for code_bytes in words:
+        if code_bytes >> 26 == 14:
+            rd = (code_bytes >> 21) & 0x1F
+            if rd == (code_bytes >> 16) & 0x1F and rd:
+                steps[rd] = steps.get(rd, 0) + (((code_bytes & 0xFFFF) ^ 0x8000) - 0x8000)
+    return steps
+
+
+#	FUNCTION		command_assemble
+
+#	DESCRIPTION		Assembles a file of instructions (or stdin) and prints the words, or writes
+#					them big endian to a file. Errors name the line and fail the command.
+
+def command_assemble(args) -> int:
+    if args.source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(args.source, encoding="utf-8") as source:
+            lines = source.read().splitlines()
+
+    words, errors = altivec_assemble_many(lines, not args.no_check)
+    for number, message in errors:
+        print(f"{args.source}:{number}: {message}", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, "wb") as output:
+            output.write(struct.pack(f">{len(words)}I", *words))
+    else:
+        for word in words:
+            print(f"{word:08X}")
+    return 1 if errors else 0
+
+
+#	FUNCTION		command_streams
+
+#	DESCRIPTION		Prints the data stream findings of every function of binaries.
+
+def command_streams(args) -> int:
+    interesting = frozenset(index for index, opcode in enumerate(g_altivec_opcodes)
+                            if opcode.insn in g_streamed_load_itypes or opcode.insn in g_stream_touch_itypes)
+
+    totals = {}
+    for path in args.binaries:
+        code, starts = load_binary(path)
+        for start_ea, words in iter_functions(code, starts):
+            indices = altivec_decode_many(words)
+            if interesting.isdisjoint(indices):
+                continue
+
+            report = StreamReport(words, indices)
+            for position, kind, message in report.findings:
+                totals[kind] = totals.get(kind, 0) + 1
+                print(f"{path}\t{start_ea + position * 4:08X}\t{kind}\t{message}")
+
+    print(", ".join(f"{count} {kind}" for kind, count in sorted(totals.items())) or "no findings", file=sys.stderr)
+    return 0
 
-                    case AltivecOperandID.VB128:
-                        pOperandData.type = o_reg
-                        pOperandData.reg = ((code_bytes << 5) & 0x60 | ((code_bytes >> 11) & 0x1F))
-                        pOperandData.specflag1 = 0x01
-                        break
 
-                    case AltivecOperandID.VC128:
-                        pOperandData.type = o_reg
-                        pOperandData.reg = raw_bits
-                        pOperandData.specflag1 = 0x01
-                        break
+#	FUNCTION		format_vector_literal
+
+#	DESCRIPTION		Constant vectors. Values are kept as their 16 big endian bytes; the text
+#					shows the four words as floats when they all look like ordinary floats
+#					(no NaN/infinity, no denormals), as integers otherwise, and folds splats.
+
+def plausible_float(word: int) -> bool:
+    exponent = (word >> 23) & 0xFF
+    return exponent != 0xFF and (exponent != 0 or word & 0x7FFFFF == 0)
+
+def format_vector_literal(value: bytes) -> str:
+    words = struct.unpack(">4I", value)
+    if not any(words):
+        return "{0} x4"
+    if all(plausible_float(word) for word in words):
+        lanes = [f"{lane:g}" for lane in struct.unpack(">4f", value)]
+    elif len(set(value)) == 1:
+        return f"{{0x{value[0]:02X}}} x16 bytes"
+    elif len(set(struct.unpack(">8H", value))) == 1:
+        return f"{{0x{words[0] & 0xFFFF:04X}}} x8 halfwords"
+    else:
+        lanes = [f"0x{word:08X}" for word in words]
+
+    if len(set(lanes)) == 1:
+        return f"{{{lanes[0]}}} x4"
+    return "{" + ", ".join(lanes) + "}"
+
+# vperm control vector as the source of every result byte, folded to words when they line up
+def format_permute_control(control: bytes) -> str:
+    selectors = [byte & 0x1F for byte in control]
+    words = []
+    for word in range(4):
+        first = selectors[word * 4]
+        if first & 3 == 0 and selectors[word * 4:word * 4 + 4] == list(range(first, first + 4)):
+            words.append("ab"[first >> 4] + "xyzw"[(first & 0xF) >> 2])
+        else:
+            words = None
+            break
+
+    if words is not None:
+        return "vperm: " + " ".join(words)
+    return "vperm: " + " ".join("ab"[selector >> 4] + f"{selector & 0xF:X}" for selector in selectors)
+
+def permute_bytes(a: bytes, b: bytes, control: bytes) -> bytes:
+    source = a + b
+    return bytes(source[byte & 0x1F] for byte in control)
+
+
+#	FUNCTION		unpack_d3d_splat
+
+#	DESCRIPTION		vupkd3d128 of a splatted source (every word the same, as vspltis* leaves
+#					it), for which the result doesn't depend on which source word the format
+#					takes its data from. Biased formats come out as the hardware leaves them
+#					(3.0 + n * 2^-22 for normalized shorts, 1.0 + n * 2^-23 for colours).
+
+def float_word(value: float) -> int:
+    return struct.unpack(">I", struct.pack(">f", value))[0]
+
+def half_word(half: int) -> int:
+    return float_word(struct.unpack(">e", struct.pack(">H", half))[0])
+
+def unpack_d3d_splat(source: bytes, format_id: int):
+    words = struct.unpack(">4I", source)
+    if len(set(words)) != 1:
+        return None
+
+    word = words[0]
+    high, low = word >> 16, word & 0xFFFF
+    signed = lambda value, bits: (value ^ (1 << (bits - 1))) - (1 << (bits - 1))
+    one, three = 0x3F800000, 0x40400000
+
+    match format_id:
+        case 0:  # D3DCOLOR, ARGB to RGBA
+            lanes = [one | (word >> shift) & 0xFF for shift in (16, 8, 0, 24)]
+        case 1:  # NORMSHORT2
+            lanes = [three + signed(high, 16), three + signed(low, 16), 0, one]
+        case 2:  # NORMPACKED32, 10:10:10:2
+            lanes = [three + signed((word >> shift) & 0x3FF, 10) for shift in (0, 10, 20)] + [one + (word >> 30)]
+        case 3:  # FLOAT16_2
+            lanes = [half_word(high), half_word(low), 0, one]
+        case 4:  # NORMSHORT4
+            lanes = [three + signed(high, 16), three + signed(low, 16)] * 2
+        case 5:  # FLOAT16_4
+            lanes = [half_word(high), half_word(low)] * 2
+        case _:
+            return None
+
+    return struct.pack(">4I", *(lane & 0xFFFFFFFF for lane in lanes))
+
+
+#	CLASS			VectorConstantTracker
+
+#	DESCRIPTION		Follows constant vectors through a basic block: loads from a constant
+#					address (lvx/lvxl and the 128 forms, read through 'read_literal'),
+#					vspltis*, splats and vupkd3d128 of known vectors, vor copies and vperm of
+#					known inputs. step() returns the annotation of an instruction, if any:
+#					the value it produces, or the pattern of a vperm with a known control.
+
+T = altivec_insn_type_t
+
+g_constant_loads = frozenset({T.altivec_lvx, T.altivec_lvxl, T.vmx128_lvx128, T.vmx128_lvxl128})
+g_splat_immediates = {T.altivec_vspltisb: (1, ">16b"), T.altivec_vspltish: (2, ">8h"), T.altivec_vspltisw: (4, ">4i"), T.vmx128_vspltisw128: (4, ">4i")}
+g_splat_elements = {T.altivec_vspltb: 1, T.altivec_vsplth: 2, T.altivec_vspltw: 4, T.vmx128_vspltw128: 4}
+g_vector_copies = frozenset({T.altivec_vor, T.vmx128_vor128})
+g_vector_permutes = frozenset({T.altivec_vperm, T.vmx128_vperm128})
+
+del T
+
+class VectorConstantTracker:
+    def __init__(self, read_literal):
+        self.read_literal = read_literal
+        self.constants = {}     # GPR constants, as track_gpr_constants keeps them
+        self.vectors = {}       # vector register -> 16 bytes
+
+    def reset(self):
+        self.constants = {}
+        self.vectors = {}
+
+    def step(self, index: int, code_bytes: int):
+        annotation = None
+        value = None
+
+        if index >= 0:
+            itype = g_altivec_opcodes[index].insn
+            operands = altivec_decode_operands(index, code_bytes)
+
+            if itype in g_constant_loads:
+                address = resolve_vector_address(self.constants, index, code_bytes)
+                if address is not None:
+                    value = self.read_literal(address)
+                    if value is not None:
+                        annotation = f"[{address:X}] = {format_vector_literal(value)}"
+
+            elif itype in g_splat_immediates:
+                size, layout = g_splat_immediates[itype]
+                value = struct.pack(layout, *([operands[-1]] * (16 // size)))
+                annotation = format_vector_literal(value)
+
+            elif itype in g_splat_elements and operands[1] in self.vectors:
+                size = g_splat_elements[itype]
+                element = operands[2] % (16 // size)
+                value = self.vectors[operands[1]][element * size:element * size + size] * (16 // size)
+                annotation = format_vector_literal(value)
+
+            elif itype == altivec_insn_type_t.vmx128_vupkd3d128 and operands[1] in self.vectors:
+                value = unpack_d3d_splat(self.vectors[operands[1]], operands[2] >> 2)
+                if value is not None:
+                    annotation = format_vector_literal(value)
+
+            elif itype in g_vector_copies and operands[1] == operands[2] and operands[1] in self.vectors:
+                value = self.vectors[operands[1]]
+
+            elif itype in g_vector_permutes and operands[3] in self.vectors:
+                control = self.vectors[operands[3]]
+                annotation = format_permute_control(control)
+                if operands[1] in self.vectors and operands[2] in self.vectors:
+                    value = permute_bytes(self.vectors[operands[1]], self.vectors[operands[2]], control)
+
+            if g_vector_register_positions[index]:
+                defined, _ = vector_defs_uses(index, code_bytes)
+                for register in register_numbers(defined):
+                    self.vectors.pop(register, None)
+                if value is not None:
+                    self.vectors[operands[0]] = value
+
+        # Branches end the block, for the vectors as for the GPR constants
+        track_gpr_constants(self.constants, code_bytes)
+        if code_bytes >> 26 in (16, 18, 19):
+            self.vectors = {}
+        return annotation
+
+
+#	FUNCTION		describe_gqr
+
+#	DESCRIPTION		Gekko graphics quantization registers. GQRn (SPR 912 + n) holds the store
+#					type in bits 0-2 and scale in bits 8-13, the load type in bits 16-18 and
+#					scale in bits 24-29. Types are 0 float, 4 u8, 5 u16, 6 s8, 7 s16; the
+#					scale is a signed power of two the integer is divided by when loading and
+#					multiplied by when storing.
+
+GQR_SPR = 912
+
+g_gqr_type_names = ("float", "type1", "type2", "type3", "u8", "u16", "s8", "s16")
+
+def describe_gqr(value: int, is_store: bool) -> str:
+    field = value & 0xFFFF if is_store else value >> 16
+    name = g_gqr_type_names[field & 7]
+    scale = (((field >> 8) & 0x3F) ^ 0x20) - 0x20
+    if name == "float" or scale == 0:
+        return name
+    return f"{name} {'*' if is_store else '/'} 2^{scale}"
+
+T = altivec_insn_type_t
+
+# Quantized loads and stores: itype -> is_store. W and I are always their last two operands
+g_quantized_itypes = {
+    T.gekko_psq_l: False, T.gekko_psq_lu: False, T.gekko_psq_lx: False, T.gekko_psq_lux: False,
+    T.gekko_psq_st: True, T.gekko_psq_stu: True, T.gekko_psq_stx: True, T.gekko_psq_stux: True,
+}
+
+del T
+
+# The indexed forms share primary opcode 4 with Altivec, whose entries come first in the table and
+# take some of their encodings in altivec_decode. Match the encodings themselves instead.
+def gekko_encoding_matcher(itypes):
+    encodings = [(opcode.opcode & opcode.mask, opcode.mask, index)
+                 for index, opcode in enumerate(g_altivec_opcodes) if opcode.insn in itypes]
+    primaries = frozenset(value >> 26 for value, _, _ in encodings)
+
+    def match(code_bytes: int) -> int:
+        if code_bytes >> 26 in primaries:
+            for value, mask, index in encodings:
+                if code_bytes & mask == value:
+                    return index
+        return -1
+    return match
+
+quantized_index = gekko_encoding_matcher(g_quantized_itypes)
+
+
+#	CLASS			GqrAnalysis
+
+#	DESCRIPTION		Follows the GQR values through the call graph. The state is a tuple of the
+#					eight register values (None when unknown); mtspr from a constant built in
+#					the block sets one, calls apply the callee's effect. Functions are solved
+#					once per entry state and the exit state memoized, so a callee shared by
+#					many callers with the same GQR setup is only walked once.
+#
+#					'function_blocks(ea)' gives the basic blocks of the function starting at
+#					ea as (start_ea, words, successor indices), the entry block first, or None
+#					when ea is not a function. Recursion and very deep call chains are
+#					assumed to leave the GQRs alone.
+#
+#					'annotations' maps the address of every quantized load/store reached to
+#					the set of (GQR number, value or None, is_store, single) seen there.
+
+GQR_UNKNOWN = (None, ) * 8
+GQR_MAX_DEPTH = 200
+
+def meet_gqr_states(first: tuple, second: tuple) -> tuple:
+    return tuple(a if a == b else None for a, b in zip(first, second))
+
+class GqrAnalysis:
+    def __init__(self, function_blocks):
+        self.function_blocks = function_blocks
+        self.summaries = {}     # (function start, entry state) -> exit state
+        self.in_progress = set()
+        self.annotations = {}
+        self.reached = set()
+        self.functions_walked = 0
+
+    def analyse(self, start_ea: int, state: tuple, depth: int = 0) -> tuple:
+        key = (start_ea, state)
+        summary = self.summaries.get(key)
+        if summary is not None:
+            return summary
+        if key in self.in_progress or depth > GQR_MAX_DEPTH:
+            return state
+
+        blocks = self.function_blocks(start_ea)
+        if not blocks:
+            return state
+
+        self.in_progress.add(key)
+        self.reached.add(start_ea)
+        self.functions_walked += 1
+
+        # Block entry states only ever lose values, so this ends; the last walk of a block wins
+        entry = [None] * len(blocks)
+        entry[0] = state
+        seen = {}
+        exit_state = None
+        pending = [0]
+        while pending:
+            block = pending.pop()
+            block_ea, words, successors = blocks[block]
+            out = self.walk_block(block_ea, words, entry[block], depth, seen)
+
+            if not successors:
+                exit_state = out if exit_state is None else meet_gqr_states(exit_state, out)
+            for successor in successors:
+                merged = out if entry[successor] is None else meet_gqr_states(entry[successor], out)
+                if merged != entry[successor]:
+                    entry[successor] = merged
+                    pending.append(successor)
+
+        for ea, annotation in seen.items():
+            self.annotations.setdefault(ea, set()).add(annotation)
+
+        self.in_progress.discard(key)
+        summary = self.summaries[key] = exit_state if exit_state is not None else state
+        return summary
+
+    def walk_block(self, block_ea: int, words, state: tuple, depth: int, seen: dict) -> tuple:
+        state = list(state)
+        constants = {}
+
+        for offset, code_bytes in enumerate(words):
+            index = quantized_index(code_bytes)
+            if index >= 0:
+                operands = altivec_decode_operands(index, code_bytes)
+                single, gqr = operands[-2], operands[-1]
+                seen[block_ea + offset * 4] = (gqr, state[gqr], g_quantized_itypes[g_altivec_opcodes[index].insn], single)
+
+            elif code_bytes >> 26 == 31:
+                index = altivec_decode(code_bytes)
+                if index >= 0 and g_altivec_opcodes[index].insn == altivec_insn_type_t.std_mtspr:
+                    spr, rs = altivec_decode_operands(index, code_bytes)
+                    if GQR_SPR <= spr < GQR_SPR + 8:
+                        state[spr - GQR_SPR] = constants.get(rs)
+
+            elif code_bytes >> 26 == 18 and code_bytes & 3 == 1:  # bl
+                target = block_ea + branch_target(offset, code_bytes & ~1) * 4
+                state = list(self.analyse(target & 0xFFFFFFFF, tuple(state), depth + 1))
+
+            track_gpr_constants(constants, code_bytes)
+
+        return tuple(state)
+
+# The GQR values programs set once at start up (OSInitFastCast and the like) are taken as the
+# state of every function we find no caller for: those with a single constant ever written.
+def global_gqr_state(function_words) -> tuple:
+    written = [set() for _ in range(8)]
+    for words in function_words:
+        constants = {}
+        for code_bytes in words:
+            index = altivec_decode(code_bytes) if code_bytes >> 26 == 31 else -1
+            if index >= 0 and g_altivec_opcodes[index].insn == altivec_insn_type_t.std_mtspr:
+                spr, rs = altivec_decode_operands(index, code_bytes)
+                if GQR_SPR <= spr < GQR_SPR + 8:
+                    written[spr - GQR_SPR].add(constants.get(rs))
+            track_gpr_constants(constants, code_bytes)
+
+    return tuple(next(iter(values)) if len(values) == 1 else None for values in written)
+
+
+#	CLASS			LockedCacheReport
+
+#	DESCRIPTION		Gekko/Broadway locked cache use in one function (a run of instruction
+#					words). Three things are recorded as (position, kind, message):
+#
+#					hid2	:	mtspr to HID2 (SPR 920), with the locked cache enable bit when the
+#								value is a constant built in the same block
+#					dcbz_l	:	dcbz_l allocating locked cache blocks; in a loop the size is the
+#								constant loaded into CTR before it times the step of the address
+#					dma		:	a locked cache DMA started by mtspr to DMA_L (SPR 923), with the
+#								direction and length from it and the preceding DMA_U (SPR 922)
+#
+#					'block_sizes' lists the bytes of every dcbz_l run and DMA transfer whose
+#					size is known; 'stages' is set when the function moves data through the
+#					locked cache at all.
+
+LOCKED_CACHE_PREFIX = "Locked cache: "
+
+SPR_CTR, SPR_HID2, SPR_DMA_U, SPR_DMA_L = 9, 920, 922, 923
+HID2_LCE = 0x10000000
+DMA_L_LOAD, DMA_L_TRIGGER = 0x10, 0x2
+CACHE_BLOCK_BYTES = 32
+
+class LockedCacheReport:
+    def __init__(self, words, indices=None):
+        if indices is None:
+            indices = [altivec_decode(code_bytes) for code_bytes in words]
+
+        self.sites = []
+        self.block_sizes = []
+        clears = []         # (position, rA, rB)
+        counters = []       # (position, CTR value or None)
+
+        constants = {}
+        upper = None
+        for position, (code_bytes, index) in enumerate(zip(words, indices)):
+            if dcbz_l_index(code_bytes) >= 0:
+                clears.append((position, (code_bytes >> 16) & 0x1F, (code_bytes >> 11) & 0x1F))
+            elif index >= 0:
+                if g_altivec_opcodes[index].insn == altivec_insn_type_t.std_mtspr:
+                    spr, rs = altivec_decode_operands(index, code_bytes)
+                    value = constants.get(rs)
+                    if spr == SPR_CTR:
+                        counters.append((position, value))
+                    elif spr == SPR_HID2:
+                        state = "value unknown" if value is None else "locked cache " + ("enabled" if value & HID2_LCE else "disabled")
+                        self.sites.append((position, "hid2", f"HID2 written, {state}"))
+                    elif spr == SPR_DMA_U:
+                        upper = value
+                    elif spr == SPR_DMA_L:
+                        self.sites.append((position, "dma", self.describe_dma(upper, value)))
+            track_gpr_constants(constants, code_bytes)
+
+        looped = set()
+        for first, last in find_loops(words):
+            loop_clears = [clear for clear in clears if first <= clear[0] <= last]
+            if not loop_clears:
+                continue
+            looped.update(clear[0] for clear in loop_clears)
+
+            steps = loop_register_steps(words[first:last + 1])
+            step = next((steps[register] for _, ra, rb in loop_clears for register in (rb, ra) if steps.get(register)), None)
+            count = next((value for position, value in reversed(counters) if position < first), None)
+            if step is not None and count is not None:
+                size = abs(step) * count
+                self.block_sizes.append(size)
+                message = f"dcbz_l loop allocates {count} x {abs(step)} = {size} bytes"
+            else:
+                message = f"dcbz_l loop of {last - first + 1} instructions, size unknown"
+            self.sites.append((loop_clears[0][0], "dcbz_l", message))
+
+        straight = [clear for clear in clears if clear[0] not in looped]
+        if straight:
+            size = len(straight) * CACHE_BLOCK_BYTES
+            self.block_sizes.append(size)
+            self.sites.append((straight[0][0], "dcbz_l", f"{len(straight)} dcbz_l outside loops allocate {size} bytes"))
+
+        self.sites.sort()
+        self.stages = any(kind != "hid2" for _, kind, _ in self.sites)
+
+    def describe_dma(self, upper, lower) -> str:
+        if lower is None:
+            return "locked cache DMA, DMA_L value unknown"
+        if not lower & DMA_L_TRIGGER:
+            return "DMA_L written without the trigger bit" + (" (flush)" if lower & 1 else "")
+        direction = "memory -> locked cache" if lower & DMA_L_LOAD else "locked cache -> memory"
+        if upper is None:
+            return f"locked cache DMA {direction} at 0x{lower & ~0x1F:08X}, length unknown"
+        blocks = ((upper & 0x1F) << 2 | (lower >> 2) & 3) or 128
+        self.block_sizes.append(blocks * CACHE_BLOCK_BYTES)
+        return (f"locked cache DMA {direction}: {blocks} blocks ({blocks * CACHE_BLOCK_BYTES} bytes) "
+                f"between 0x{upper & ~0x1F:08X} and 0x{lower & ~0x1F:08X}")
+
+    def summary(self) -> str:
+        kinds = [kind for _, kind, _ in self.sites]
+        sizes = ", ".join(str(size) for size in sorted(set(self.block_sizes))) or "unknown"
+        return (f"{kinds.count('dcbz_l')} dcbz_l runs, {kinds.count('dma')} DMA transfers, "
+                f"{kinds.count('hid2')} HID2 writes; block sizes {sizes}")
+
+dcbz_l_index = gekko_encoding_matcher((altivec_insn_type_t.gekko_ps_dcbz_l, ))
+
+
+#	FUNCTION		command_locked_cache
+
+#	DESCRIPTION		Prints the locked cache sites of every function of binaries, followed by a
+#					one line summary of each function that stages data through it.
+
+def command_locked_cache(args) -> int:
+    mtspr = next(index for index, opcode in enumerate(g_altivec_opcodes) if opcode.insn == altivec_insn_type_t.std_mtspr)
+
+    staging = 0
+    for path in args.binaries:
+        code, starts = load_binary(path)
+        for start_ea, words in iter_functions(code, starts):
+            indices = altivec_decode_many(words)
+            if mtspr not in indices and not any(dcbz_l_index(code_bytes) >= 0 for code_bytes in words):
+                continue
+
+            report = LockedCacheReport(words, indices)
+            for position, kind, message in report.sites:
+                print(f"{path}\t{start_ea + position * 4:08X}\t{kind}\t{message}")
+            if report.stages:
+                staging += 1
+                print(f"{path}\t{start_ea:08X}\tfunction\t{report.summary()}")
+
+    print(f"{staging} functions stage data through the locked cache", file=sys.stderr)
+    return 0
 
-                    case AltivecOperandID.CRM:
-                        pOperandData.type = o_reg
-                        pOperandData.reg = raw_bits
-                        pOperandData.specflag1 = 0x02 # Mark the register as being a CRF.
-                        break
 
-                    case AltivecOperandID.VPERM128:
-                        pOperandData.type = o_imm
-                        pOperandData.dtype = dt_byte
-                        pOperandData.value = ((code_bytes >> 1) & 0xE0) | ((code_bytes >> 16) & 0x1F)
-                        break
-                    
-                    case AltivecOperandID.VD3D0 | AltivecOperandID.VD3D1 | AltivecOperandID.VD3D2:
-                        pOperandData.type = o_imm
-                        pOperandData.dtype = dt_byte
-                        pOperandData.value = raw_bits
-                        break
+#	CLASS			VectorEmulator
 
-                    case AltivecOperandID.RA0:
-                        if raw_bits == 0:
-                            pOperandData.type = o_imm
-                            pOperandData.dtype = dt_byte
-                            pOperandData.value = raw_bits
-                        else:
-                            pOperandData.type = o_reg
-                            pOperandData.reg = raw_bits
-                            pOperandData.specflag1 = 0
-                        break
+#	DESCRIPTION		Runs straight-line vector code over many register states at once. Every
+#					register holds an (N, 16) uint8 array, one big endian vector per sample,
+#					so a sequence is evaluated for thousands of inputs with a handful of NumPy
+#					calls per instruction. Registers never written read as zero.
+#
+#					Semantics are registered by mnemonic with @vector_semantics and looked up
+#					by itype. They get the instruction's operands in table order, leaving out
+#					a destination that is only written: (N, 16) arrays for vector registers
+#					and the decoded value for the rest. The VMX128 forms share the semantics
+#					of the form without the 128 suffix unless they have their own, and record
+#					forms are run as the plain form (CR6 isn't modelled). Saturation doesn't
+#					set VSCR[SAT]; the estimate instructions give exact results.
+
+g_vector_semantics = {}
+
+def vector_semantics(*names):
+    def register(function):
+        for name in names:
+            g_vector_semantics[name] = function
+        return function
+    return register
+
+def vector_lanes(value, kind: str):
+    return np.ascontiguousarray(value).view(kind)
+
+def vector_from_lanes(lanes, kind: str):
+    return np.ascontiguousarray(lanes, dtype=kind).view(np.uint8)
+
+g_vector_lane_bits = {"b": 8, "h": 16, "w": 32}
+
+def integer_lanes(value, size: str, signed: bool):
+    return vector_lanes(value, f">{'i' if signed else 'u'}{g_vector_lane_bits[size] // 8}").astype(np.int64)
+
+def integer_vector(lanes, size: str, signed: bool = False, saturate: bool = False):
+    bits = g_vector_lane_bits[size]
+    if saturate:
+        low, high = (-(1 << (bits - 1)), (1 << (bits - 1)) - 1) if signed else (0, (1 << bits) - 1)
+        lanes = np.clip(lanes, low, high)
+    return vector_from_lanes(lanes & ((1 << bits) - 1), f">u{bits // 8}")
+
+def float_lanes(value):
+    return vector_lanes(value, ">f4").astype(np.float32)
+
+def float_vector(lanes):
+    return vector_from_lanes(lanes, ">f4")
+
+def mask_vector(condition, size: str):
+    return integer_vector(np.where(condition, -1, 0), size)
+
+def register_integer_family(template: str, function, signs=("u", "s"), sizes="bhw", saturate=False):
+    for sign in signs:
+        for size in sizes:
+            vector_semantics(template.format(sign=sign, size=size))(
+                lambda a, b, sign=sign, size=size: integer_vector(
+                    function(integer_lanes(a, size, sign == "s"), integer_lanes(b, size, sign == "s"), size),
+                    size, sign == "s", saturate))
+
+# Modulo and saturating arithmetic, averages, minimum and maximum
+register_integer_family("vaddu{size}m", lambda a, b, size: a + b, signs="u")
+register_integer_family("vsubu{size}m", lambda a, b, size: a - b, signs="u")
+register_integer_family("vadd{sign}{size}s", lambda a, b, size: a + b, saturate=True)
+register_integer_family("vsub{sign}{size}s", lambda a, b, size: a - b, saturate=True)
+register_integer_family("vavg{sign}{size}", lambda a, b, size: (a + b + 1) >> 1)
+register_integer_family("vmax{sign}{size}", lambda a, b, size: np.maximum(a, b))
+register_integer_family("vmin{sign}{size}", lambda a, b, size: np.minimum(a, b))
+register_integer_family("vaddcuw", lambda a, b, size: (a + b) >> 32, signs="u", sizes="w")
+register_integer_family("vsubcuw", lambda a, b, size: (a >= b).astype(np.int64), signs="u", sizes="w")
+
+# Shifts and rotates take the count from the low bits of each lane of b
+register_integer_family("vsl{size}", lambda a, b, size: a << (b & (g_vector_lane_bits[size] - 1)), signs="u")
+register_integer_family("vsr{size}", lambda a, b, size: a >> (b & (g_vector_lane_bits[size] - 1)), signs="u")
+register_integer_family("vrl{size}", lambda a, b, size: (a << (b & (g_vector_lane_bits[size] - 1)))
+                        | (a >> (g_vector_lane_bits[size] - (b & (g_vector_lane_bits[size] - 1)))), signs="u")
+
+for size in "bhw":
+    vector_semantics(f"vsra{size}")(lambda a, b, size=size: integer_vector(
+        integer_lanes(a, size, True) >> (integer_lanes(b, size, False) & (g_vector_lane_bits[size] - 1)), size))
+
+@vector_semantics("vand")
+def vector_and(a, b):
+    return a & b
+
+@vector_semantics("vandc")
+def vector_and_complement(a, b):
+    return a & ~b
+
+@vector_semantics("vor")
+def vector_or(a, b):
+    return a | b
+
+@vector_semantics("vnor")
+def vector_nor(a, b):
+    return ~(a | b)
+
+@vector_semantics("vxor")
+def vector_xor(a, b):
+    return a ^ b
+
+@vector_semantics("vsel")
+def vector_select(a, b, c):
+    return (a & ~c) | (b & c)
+
+# Whole vector shifts by octets (vslo/vsro) and by bits (vsl/vsr), the count from byte 15 of b
+def shift_octets(a, counts, left: bool):
+    counts = counts.astype(np.intp)[:, None]
+    positions = np.arange(16) + (counts if left else -counts)
+    inside = (positions >= 0) & (positions < 16)
+    return np.where(inside, np.take_along_axis(a, np.clip(positions, 0, 15), axis=1), 0).astype(np.uint8)
+
+@vector_semantics("vslo")
+def vector_shift_left_octets(a, b):
+    return shift_octets(a, (b[:, 15] >> 3) & 15, True)
+
+@vector_semantics("vsro")
+def vector_shift_right_octets(a, b):
+    return shift_octets(a, (b[:, 15] >> 3) & 15, False)
+
+@vector_semantics("vsl")
+def vector_shift_left(a, b):
+    counts = (b[:, 15:16] & 7).astype(np.uint16)
+    wide = a.astype(np.uint16)
+    following = np.concatenate((wide[:, 1:], np.zeros_like(wide[:, :1])), axis=1)
+    return ((wide << counts) | (following >> (8 - counts))).astype(np.uint8)
+
+@vector_semantics("vsr")
+def vector_shift_right(a, b):
+    counts = (b[:, 15:16] & 7).astype(np.uint16)
+    wide = a.astype(np.uint16)
+    preceding = np.concatenate((np.zeros_like(wide[:, :1]), wide[:, :-1]), axis=1)
+    return ((wide >> counts) | (preceding << (8 - counts))).astype(np.uint8)
+
+# Permutes, merges and splats
+@vector_semantics("vperm")
+def vector_permute(a, b, c):
+    return np.take_along_axis(np.concatenate((a, b), axis=1), (c & 0x1F).astype(np.intp), axis=1)
+
+@vector_semantics("vsldoi")
+def vector_shift_double(a, b, shift):
+    return np.concatenate((a, b), axis=1)[:, shift:shift + 16]
+
+for size, width in (("b", 1), ("h", 2), ("w", 4)):
+    def merge(a, b, high: bool, width=width):
+        lanes = 8 // width
+        first = slice(0, 8) if high else slice(8, 16)
+        pairs = np.stack((a[:, first].reshape(-1, lanes, width), b[:, first].reshape(-1, lanes, width)), axis=2)
+        return pairs.reshape(-1, 16)
+    vector_semantics(f"vmrgh{size}")(lambda a, b, merge=merge: merge(a, b, True))
+    vector_semantics(f"vmrgl{size}")(lambda a, b, merge=merge: merge(a, b, False))
+    vector_semantics(f"vsplt{size}")(lambda b, element, width=width: np.tile(
+        b.reshape(-1, 16 // width, width)[:, element % (16 // width)], 16 // width))
+    vector_semantics(f"vspltis{size}")(lambda immediate, size=size, width=width: integer_vector(
+        np.full((1, 16 // width), immediate, dtype=np.int64), size))
+
+# vspltisw128 carries an unused VB128
+@vector_semantics("vspltisw128")
+def vector_splat_immediate_128(b, immediate):
+    return integer_vector(np.full((1, 4), immediate, dtype=np.int64), "w")
+
+@vector_semantics("vpermwi128")
+def vector_permute_words(b, swizzle):
+    words = b.reshape(-1, 4, 4)
+    return words[:, [(swizzle >> shift) & 3 for shift in (6, 4, 2, 0)]].reshape(-1, 16)
+
+@vector_semantics("vrlimi128")
+def vector_rotate_insert(d, b, mask, rotate):
+    rotated = b.reshape(-1, 4, 4)[:, [(lane + rotate) & 3 for lane in range(4)]]
+    replaced = np.array([bool(mask & (8 >> lane)) for lane in range(4)])
+    return np.where(replaced[None, :, None], rotated, d.reshape(-1, 4, 4)).reshape(-1, 16)
+
+# Floating point
+@vector_semantics("vaddfp")
+def vector_add_float(a, b):
+    return float_vector(float_lanes(a) + float_lanes(b))
+
+@vector_semantics("vsubfp")
+def vector_subtract_float(a, b):
+    return float_vector(float_lanes(a) - float_lanes(b))
+
+@vector_semantics("vmulfp")
+def vector_multiply_float(a, b):
+    return float_vector(float_lanes(a) * float_lanes(b))
+
+# vmaddfp vD,vA,vC,vB and the VMX128 forms, which list their addend or multiplier last or second
+@vector_semantics("vmaddfp", "vmaddcfp")
+def vector_multiply_add_float(a, c, b):
+    return float_vector(float_lanes(a) * float_lanes(c) + float_lanes(b))
+
+@vector_semantics("vnmsubfp")
+def vector_negative_multiply_subtract_float(a, c, b):
+    return float_vector(-(float_lanes(a) * float_lanes(c) - float_lanes(b)))
+
+@vector_semantics("vmaxfp")
+def vector_maximum_float(a, b):
+    return float_vector(np.maximum(float_lanes(a), float_lanes(b)))
+
+@vector_semantics("vminfp")
+def vector_minimum_float(a, b):
+    return float_vector(np.minimum(float_lanes(a), float_lanes(b)))
+
+# NumPy is looked up when an instruction runs, so the module still loads without it
+for name, function in (("vrefp", lambda x: np.float32(1) / x), ("vrsqrtefp", lambda x: np.float32(1) / np.sqrt(x)),
+                       ("vexptefp", lambda x: np.exp2(x)), ("vlogefp", lambda x: np.log2(x)),
+                       ("vrfin", lambda x: np.rint(x)), ("vrfiz", lambda x: np.trunc(x)),
+                       ("vrfip", lambda x: np.ceil(x)), ("vrfim", lambda x: np.floor(x))):
+    vector_semantics(name)(lambda b, function=function: float_vector(function(float_lanes(b))))
+
+@vector_semantics("vmsum3fp")
+def vector_dot3(a, b):
+    products = float_lanes(a) * float_lanes(b)
+    return float_vector(np.repeat(products[:, :3].sum(axis=1, dtype=np.float32)[:, None], 4, axis=1))
+
+@vector_semantics("vmsum4fp")
+def vector_dot4(a, b):
+    products = float_lanes(a) * float_lanes(b)
+    return float_vector(np.repeat(products.sum(axis=1, dtype=np.float32)[:, None], 4, axis=1))
+
+# Conversions, scaled by 2^immediate; out of range and NaN saturate as the hardware does
+@vector_semantics("vcfsx", "vcsxwfp")
+def vector_convert_from_signed(b, scale):
+    return float_vector(vector_lanes(b, ">i4").astype(np.float32) / np.float32(2.0 ** scale))
+
+@vector_semantics("vcfux", "vcuxwfp")
+def vector_convert_from_unsigned(b, scale):
+    return float_vector(vector_lanes(b, ">u4").astype(np.float32) / np.float32(2.0 ** scale))
+
+def convert_to_integer(b, scale, signed: bool):
+    values = np.trunc(float_lanes(b).astype(np.float64) * 2.0 ** scale)
+    values = np.clip(np.nan_to_num(values, nan=0.0), -2.0 ** 33, 2.0 ** 33)
+    return integer_vector(values.astype(np.int64), "w", signed, saturate=True)
+
+@vector_semantics("vctsxs", "vcfpsxws")
+def vector_convert_to_signed(b, scale):
+    return convert_to_integer(b, scale, True)
+
+@vector_semantics("vctuxs", "vcfpuxws")
+def vector_convert_to_unsigned(b, scale):
+    return convert_to_integer(b, scale, False)
+
+# Compares give all ones or all zeros lanes
+for name, function in (("vcmpeqfp", lambda x, y: x == y), ("vcmpgtfp", lambda x, y: x > y),
+                       ("vcmpgefp", lambda x, y: x >= y)):
+    vector_semantics(name)(lambda a, b, function=function: mask_vector(function(float_lanes(a), float_lanes(b)), "w"))
+
+@vector_semantics("vcmpbfp")
+def vector_compare_bounds(a, b):
+    a, b = float_lanes(a), float_lanes(b)
+    bounds = np.where(a <= b, 0, 0x80000000) | np.where(a >= -b, 0, 0x40000000)
+    return integer_vector(bounds.astype(np.int64), "w")
+
+register_integer_family("vcmpequ{size}", lambda a, b, size: np.where(a == b, -1, 0), signs="u")
+register_integer_family("vcmpgt{sign}{size}", lambda a, b, size: np.where(a > b, -1, 0))
+
+# Packs take the lanes of a then b at half the width; unpacks sign extend one half
+for name in ("vpkuhum", "vpkuwum", "vpkuhus", "vpkuwus", "vpkshus", "vpkswus", "vpkshss", "vpkswss"):
+    size, narrow = name[4], "b" if name[4] == "h" else "h"
+    vector_semantics(name)(lambda a, b, size=size, narrow=narrow, source=name[3] == "s", saturate=name[6] == "s", target=name[5] == "s":
+        integer_vector(np.concatenate((integer_lanes(a, size, source), integer_lanes(b, size, source)), axis=1), narrow, target, saturate))
+
+for size, wide in (("b", "h"), ("h", "w")):
+    count = 16 // (g_vector_lane_bits[size] // 8) // 2
+    vector_semantics(f"vupkhs{size}")(lambda b, size=size, wide=wide, count=count: integer_vector(integer_lanes(b, size, True)[:, :count], wide))
+    vector_semantics(f"vupkls{size}")(lambda b, size=size, wide=wide, count=count: integer_vector(integer_lanes(b, size, True)[:, count:], wide))
+
+# Integer multiplies and multiply-sums
+for sign in "us":
+    for size, wide in (("b", "h"), ("h", "w")):
+        vector_semantics(f"vmule{sign}{size}")(lambda a, b, sign=sign, size=size, wide=wide: integer_vector(
+            integer_lanes(a, size, sign == "s")[:, 0::2] * integer_lanes(b, size, sign == "s")[:, 0::2], wide))
+        vector_semantics(f"vmulo{sign}{size}")(lambda a, b, sign=sign, size=size, wide=wide: integer_vector(
+            integer_lanes(a, size, sign == "s")[:, 1::2] * integer_lanes(b, size, sign == "s")[:, 1::2], wide))
+
+def multiply_sum(a, b, c, a_signed: bool, size: str, saturate: bool):
+    products = integer_lanes(a, size, a_signed) * integer_lanes(b, size, size == "h" and a_signed)
+    sums = products.reshape(products.shape[0], 4, -1).sum(axis=2) + integer_lanes(c, "w", saturate and a_signed)
+    return integer_vector(sums, "w", a_signed, saturate)
+
+vector_semantics("vmsumubm")(lambda a, b, c: multiply_sum(a, b, c, False, "b", False))
+vector_semantics("vmsummbm")(lambda a, b, c: multiply_sum(a, b, c, True, "b", False))
+vector_semantics("vmsumuhm")(lambda a, b, c: multiply_sum(a, b, c, False, "h", False))
+vector_semantics("vmsumshm")(lambda a, b, c: multiply_sum(a, b, c, True, "h", False))
+vector_semantics("vmsumuhs")(lambda a, b, c: multiply_sum(a, b, c, False, "h", True))
+vector_semantics("vmsumshs")(lambda a, b, c: multiply_sum(a, b, c, True, "h", True))
+
+@vector_semantics("vmladduhm")
+def vector_multiply_low_add(a, b, c):
+    return integer_vector(integer_lanes(a, "h", False) * integer_lanes(b, "h", False) + integer_lanes(c, "h", False), "h")
+
+@vector_semantics("vmhaddshs")
+def vector_multiply_high_add(a, b, c):
+    return integer_vector(((integer_lanes(a, "h", True) * integer_lanes(b, "h", True)) >> 15) + integer_lanes(c, "h", True), "h", True, True)
+
+@vector_semantics("vmhraddshs")
+def vector_multiply_high_round_add(a, b, c):
+    return integer_vector(((integer_lanes(a, "h", True) * integer_lanes(b, "h", True) + 0x4000) >> 15) + integer_lanes(c, "h", True), "h", True, True)
+
+# Sums of the lanes of a in 'groups' groups plus the matching words of b, into words 0-3, 1 and 3 or 3
+def sum_across(a, b, size: str, signed: bool, groups: int):
+    lanes = integer_lanes(a, size, signed)
+    accumulators = integer_lanes(b, "w", signed)
+    targets = slice(4 // groups - 1, 4, 4 // groups)
+    result = np.zeros_like(accumulators)
+    result[:, targets] = lanes.reshape(lanes.shape[0], groups, -1).sum(axis=2) + accumulators[:, targets]
+    return integer_vector(result, "w", signed, True)
+
+vector_semantics("vsum4ubs")(lambda a, b: sum_across(a, b, "b", False, 4))
+vector_semantics("vsum4sbs")(lambda a, b: sum_across(a, b, "b", True, 4))
+vector_semantics("vsum4shs")(lambda a, b: sum_across(a, b, "h", True, 4))
+vector_semantics("vsum2sws")(lambda a, b: sum_across(a, b, "w", True, 2))
+vector_semantics("vsumsws")(lambda a, b: sum_across(a, b, "w", True, 1))
+
+del size, width, wide, sign, name, function, narrow, count, merge
+
+# Per table index: (semantics, positions of the inputs, vector positions among them, destination)
+def build_vector_semantics_plan():
+    plan = []
+    for opcode, positions, (writes, reads), decoders in zip(g_altivec_opcodes, g_vector_register_positions,
+                                                             g_vector_register_roles, g_operand_decoders):
+        name = opcode.name.rstrip(".")
+        function = g_vector_semantics.get(name)
+        if function is None and name.endswith("128"):
+            function = g_vector_semantics.get(name[:-3])
+        if function is None or len(writes) != 1:
+            plan.append(None)
+            continue
+        inputs = tuple(position for position in range(len(decoders)) if position not in writes or position in reads)
+        plan.append((function, inputs, frozenset(positions), writes[0]))
+    return tuple(plan)
+
+g_vector_semantics_plan = build_vector_semantics_plan() if np is not None else ()
+
+class VectorEmulator:
+    def __init__(self, samples: int):
+        if np is None:
+            raise RuntimeError("the vector emulator needs NumPy")
+        self.samples = samples
+        self.registers = {}
+
+    def __getitem__(self, register: int):
+        value = self.registers.get(register)
+        return value if value is not None else np.zeros((self.samples, 16), dtype=np.uint8)
+
+    # Takes 16 bytes for every sample or an (N, 16) array
+    def __setitem__(self, register: int, value):
+        if isinstance(value, (bytes, bytearray)):
+            value = np.frombuffer(value, dtype=np.uint8)
+        self.registers[register] = np.ascontiguousarray(np.broadcast_to(np.asarray(value, dtype=np.uint8), (self.samples, 16)))
+
+    @staticmethod
+    def supports(index: int) -> bool:
+        return 0 <= index < len(g_vector_semantics_plan) and g_vector_semantics_plan[index] is not None
+
+    def execute(self, index: int, operands: tuple):
+        function, inputs, vectors, destination = g_vector_semantics_plan[index]
+        arguments = [self[operands[position]] if position in vectors else operands[position] for position in inputs]
+        with np.errstate(all="ignore"):
+            result = function(*arguments)
+        self.registers[operands[destination]] = np.ascontiguousarray(np.broadcast_to(result.astype(np.uint8, copy=False), (self.samples, 16)))
+
+    # Raises ValueError at the first word that isn't an instruction we can run
+    def run(self, words):
+        for position, code_bytes in enumerate(words):
+            index = altivec_decode(code_bytes)
+            if not self.supports(index):
+                raise ValueError(f"word {position} ({code_bytes:08X}) can't be emulated")
+            self.execute(index, altivec_decode_operands(index, code_bytes))
+        return self
+
+
+#	CLASS			IdiomSearch
+
+#	DESCRIPTION		Multi-pattern search for SIMD idioms. Code is turned into a stream of opcode
+#					table indices with the decoder: words we don't decode are left out (so
+#					address arithmetic between vector instructions doesn't break a match)
+#					and branches reset the stream. All idioms are compiled into one
+#					Aho-Corasick automaton over table indices, completed into a transition
+#					table per state, so a scan is a single dictionary lookup per instruction
+#					whatever the number of idioms. Register constraints are only checked for
+#					the candidates the automaton reports.
+#
+#					An idiom is a list of instructions separated by ';'. Each is a mnemonic,
+#					or several joined by '|', followed by one pattern per operand: '*' for
+#					anything, '$name' for a value that must be the same everywhere the name
+#					is used, or a literal written as the assembler takes it (v0, 16, .wzyx).
+
+g_idiom_library = (
+    ("unaligned load", "lvlx|lvlx128 $lo, *, $p; lvrx|lvrx128 $hi, *, $p; vor|vor128 *, $lo, $hi"),
+    ("unaligned load", "lvlx|lvlx128 $lo, *, $p; lvrx|lvrx128 $hi, *, $p; vor|vor128 *, $hi, $lo"),
+    ("unaligned store", "stvlx|stvlx128 $v, *, $p; stvrx|stvrx128 $v, *, $p"),
+    ("unaligned store", "stvrx|stvrx128 $v, *, $p; stvlx|stvlx128 $v, *, $p"),
+    ("permuted load", "lvsl|lvsl128 $c, *, $p; lvx|lvx128 $a, *, $p; lvx|lvx128 $b, *, *; vperm|vperm128 *, $a, $b, $c"),
+    ("matrix x vector (dot products)", "vmsum4fp128 *, *, $v; vmsum4fp128 *, *, $v; vmsum4fp128 *, *, $v; vmsum4fp128 *, *, $v"),
+    ("matrix x vector (dot products)", "vmsum4fp128 *, $v, *; vmsum4fp128 *, $v, *; vmsum4fp128 *, $v, *; vmsum4fp128 *, $v, *"),
+    ("matrix x vector (splats)", "vspltw|vspltw128 *, $v, 0; vspltw|vspltw128 *, $v, 1; vspltw|vspltw128 *, $v, 2; vspltw|vspltw128 *, $v, 3"),
+    ("normalize", "vmsum3fp128 $d, $v, $v; vrsqrtefp|vrsqrtefp128 $r, $d; vmulfp128 *, $v, $r"),
+    ("length squared", "vmsum3fp128 *, $v, $v"),
+    ("zero vector", "vxor|vxor128 *, $v, $v"),
+    ("all ones vector", "vcmpequw|vcmpequw128 *, $v, $v"),
+)
+
+IDIOM_RESET = -1
+
+# Table index stream of a run of words: (indices, word positions)
+def idiom_stream(words, indices=None):
+    if indices is None:
+        indices = altivec_decode_many(words)
+
+    symbols, positions = [], []
+    for position, (code_bytes, index) in enumerate(zip(words, indices)):
+        if index >= 0:
+            symbols.append(index)
+            positions.append(position)
+        elif code_bytes >> 26 in (16, 18) or (code_bytes >> 26 == 19 and (code_bytes >> 1) & 0x3FF in (16, 528)):
+            symbols.append(IDIOM_RESET)
+            positions.append(position)
+    return symbols, positions
+
+def compile_idiom(text: str) -> list:
+    elements = []
+    for instruction in text.split(";"):
+        mnemonics, _, operands = instruction.strip().partition(" ")
+        indices = []
+        for mnemonic in mnemonics.split("|"):
+            index = g_altivec_mnemonics.get(mnemonic)
+            if index is None:
+                raise ValueError(f"unknown mnemonic {mnemonic!r}")
+            indices.append(index)
+
+        patterns = [operand.strip() for operand in operands.split(",")] if operands.strip() else []
+        constraints = []
+        for position, pattern in enumerate(patterns):
+            if pattern == "*":
+                continue
+            if pattern.startswith("$"):
+                constraints.append((position, pattern[1:], None))
+                continue
+            # Literals are read against the first mnemonic's operand
+            operand_id = g_operand_decoders[indices[0]][position][0]
+            plan = g_output_plans[indices[0]]
+            constraints.append((position, None, parse_operand(operand_id, plan.symbol_names[position], pattern, plan.register_names[position])))
+        elements.append((tuple(indices), tuple(constraints)))
+    return elements
+
+class IdiomSearch:
+    def __init__(self, idioms=g_idiom_library):
+        self.idioms = [(name, compile_idiom(text)) for name, text in idioms]
+
+        # Trie of every table index sequence the idioms allow
+        goto = [{}]
+        self.outputs = [[]]
+        for number, (_, elements) in enumerate(self.idioms):
+            states = [0]
+            for indices, _ in elements:
+                following = []
+                for state in states:
+                    for index in indices:
+                        target = goto[state].get(index)
+                        if target is None:
+                            target = goto[state][index] = len(goto)
+                            goto.append({})
+                            self.outputs.append([])
+                        following.append(target)
+                states = following
+            for state in set(states):
+                self.outputs[state].append((number, len(elements)))
+
+        # Failure links breadth first, folding them into a complete transition table
+        self.delta = [dict(goto[0])]
+        self.delta.extend({} for _ in range(len(goto) - 1))
+        failure = [0] * len(goto)
+        pending = list(goto[0].values())
+        while pending:
+            state = pending.pop(0)
+            self.delta[state] = dict(self.delta[failure[state]])
+            self.delta[state].update(goto[state])
+            self.outputs[state] = self.outputs[state] + self.outputs[failure[state]]
+            for index, target in goto[state].items():
+                failure[target] = self.delta[failure[state]].get(index, 0)
+                pending.append(target)
+
+    # Returns (word position of the first instruction, idiom name, {name: value}) for every match
+    def scan(self, words, indices=None) -> list:
+        symbols, positions = idiom_stream(words, indices)
+        delta, outputs = self.delta, self.outputs
+        matches = []
+        state = 0
+        for end, symbol in enumerate(symbols):
+            state = delta[state].get(symbol, 0)
+            for number, length in outputs[state]:
+                bindings = self.bind(self.idioms[number][1], words, positions[end - length + 1:end + 1], symbols[end - length + 1:end + 1])
+                if bindings is not None:
+                    matches.append((positions[end - length + 1], self.idioms[number][0], bindings))
+        return matches
+
+    @staticmethod
+    def bind(elements, words, positions, symbols):
+        bindings = {}
+        for (_, constraints), position, index in zip(elements, positions, symbols):
+            if not constraints:
+                continue
+            operands = altivec_decode_operands(index, words[position])
+            for operand, name, literal in constraints:
+                value = operands[operand]
+                if name is None:
+                    if value != literal:
+                        return None
+                elif bindings.setdefault(name, value) != value:
+                    return None
+        return bindings
+
+    @staticmethod
+    def describe(name: str, bindings: dict) -> str:
+        return name + "".join(f" ${variable}={value}" for variable, value in sorted(bindings.items()))
+
+def load_idioms(path: str) -> list:
+    idioms = []
+    with open(path, encoding="utf-8") as source:
+        for line in source:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                name, _, text = line.partition(":")
+                idioms.append((name.strip(), text.strip()))
+    return idioms
+
+
+#	FUNCTION		command_idioms
+
+#	DESCRIPTION		Scans every code section of binaries for the idiom library, plus those of
+#					a file of 'name: pattern' lines, and prints the matches.
+
+def command_idioms(args) -> int:
+    search = IdiomSearch(g_idiom_library + tuple(load_idioms(args.patterns) if args.patterns else ()))
+
+    totals = {}
+    for path in args.binaries:
+        code, _ = load_binary(path)
+        for section_ea, words in code:
+            for position, name, bindings in search.scan(words):
+                totals[name] = totals.get(name, 0) + 1
+                print(f"{path}\t{section_ea + position * 4:08X}\t{IdiomSearch.describe(name, bindings)}")
+
+    print(", ".join(f"{count} {name}" for name, count in sorted(totals.items())) or "no idioms found", file=sys.stderr)
+    return 0
 
-                    case AltivecOperandID.SPR:
-                        pOperandData.type = o_reg
-                        pOperandData.dtype = (((raw_bits & 0x3E0) >> 5) + ((raw_bits & 0x1F) << 5));
-                        pOperandData.value = 0x04 # Mark the register as being a SPR.
-                        break
-                    
-                    # gekko specific
 
-                    # These are main Gekko registers
+#	FUNCTION		function_start_score
 
-                    case AltivecOperandID.FA | AltivecOperandID.FB | AltivecOperandID.FC | AltivecOperandID.FD:
-                        pOperandData.type = o_reg
-                        pOperandData.reg = raw_bits
-                        pOperandData.specflag1 = 0x08 # Mark the register as being a Gekko one
-                        break
-                    
-                    case AltivecOperandID.crfD | AltivecOperandID.WB | AltivecOperandID.IB | AltivecOperandID.WC | AltivecOperandID.IC:
+#	DESCRIPTION		How likely an instruction of ours starts a function, for ev_may_be_func.
+#					A vector instruction on its own says nothing: unrolled loops are full of
+#					them. The evidence is what prologues look like:
+#
+#					vrsave		:	mfspr of VRSAVE (SPR 256)
+#					save		:	stvx/stvx128 of a non-volatile register through r1, r11 or r12
+#					helper		:	a bl to a vector save helper in the next few words
+#									(is_save_helper gets its target in words from here)
+#					boundary	:	the previous word ends the flow (b, blr, bctr, trap) or is
+#									padding, or there is none
+#
+#					Without a boundary the evidence is worth a quarter. The per entry part of
+#					it is looked up in g_prologue_signals, precomputed from the opcode table.
+#					Returns (score 1-100, signal bits).
+
+SIGNAL_VRSAVE, SIGNAL_SAVE, SIGNAL_HELPER, SIGNAL_BOUNDARY = 1, 2, 4, 8
+g_prologue_signal_names = ((SIGNAL_VRSAVE, "vrsave"), (SIGNAL_SAVE, "save"), (SIGNAL_HELPER, "helper"), (SIGNAL_BOUNDARY, "boundary"))
+g_prologue_signal_scores = {SIGNAL_VRSAVE: 60, SIGNAL_SAVE: 20, SIGNAL_HELPER: 40, SIGNAL_BOUNDARY: 30}
+
+SPR_VRSAVE = 256
+PROLOGUE_LOOKAHEAD = 8
+PROLOGUE_THRESHOLD = 50
+g_prologue_frame_registers = frozenset({1, 11, 12})
+
+def build_prologue_signals():
+    signals = []
+    for opcode in g_altivec_opcodes:
+        if opcode.insn == altivec_insn_type_t.std_mfspr:
+            signals.append(SIGNAL_VRSAVE)
+        elif opcode.name in ("stvx", "stvxl", "stvx128", "stvxl128"):
+            signals.append(SIGNAL_SAVE)
+        else:
+            signals.append(0)
+    return tuple(signals)
+
+g_prologue_signals = build_prologue_signals()
+
+def ends_flow(code_bytes: int) -> bool:
+    primary = code_bytes >> 26
+    if code_bytes in (0, 0x60000000, 0x7FE00008):   # padding, nop, trap
+        return True
+    if primary == 18:
+        return not code_bytes & 1
+    if primary == 19 and (code_bytes >> 1) & 0x3FF in (16, 528):  # bclr / bcctr, always taken
+        return (code_bytes >> 21) & 0x14 == 0x14 and not code_bytes & 1
+    return False
+
+def function_start_score(code_bytes: int, index: int, previous=None, following=(), is_save_helper=None):
+    signals = 0
+    candidate = g_prologue_signals[index]
+    if candidate == SIGNAL_VRSAVE:
+        if altivec_decode_operands(index, code_bytes)[1] == SPR_VRSAVE:
+            signals |= SIGNAL_VRSAVE
+    elif candidate == SIGNAL_SAVE:
+        source, ra, rb = altivec_decode_operands(index, code_bytes)
+        if source in g_nonvolatile_vector_registers and (ra in g_prologue_frame_registers or rb in g_prologue_frame_registers):
+            signals |= SIGNAL_SAVE
+
+    if is_save_helper is not None:
+        for offset, word in enumerate(following[:PROLOGUE_LOOKAHEAD], 1):
+            if word >> 26 == 18 and word & 3 == 1 and is_save_helper(branch_target(offset, word & ~1)):
+                signals |= SIGNAL_HELPER
+                break
+
+    if previous is None or ends_flow(previous):
+        signals |= SIGNAL_BOUNDARY
+
+    score = sum(points for signal, points in g_prologue_signal_scores.items() if signals & signal)
+    if not signals & SIGNAL_BOUNDARY:
+        score //= 4
+    return max(1, min(score, 100)), signals
+
+
+#	FUNCTION		command_prologues
+
+#	DESCRIPTION		Measures the function start scoring against the function symbols of
+#					binaries: of our instructions, how many start a function and how many
+#					would be proposed as one with the old flat 100 and with the scores. The
+#					entries of the save ladders find_vector_save_ladders finds stand in for
+#					the named save helpers the plugin looks for.
+
+def command_prologues(args) -> int:
+    totals = {"instructions": 0, "starts": 0, "proposed": 0, "starts kept": 0}
+    signals_seen = {name: 0 for _, name in g_prologue_signal_names}
+
+    for path in args.binaries:
+        code, starts = load_binary(path)
+        starts = set(starts)
+        for section_ea, words in code:
+            helpers = {entry for kind, entries, _ in find_vector_save_ladders(words) if kind == "save" for entry, _ in entries}
+            for position, (code_bytes, index) in enumerate(zip(words, altivec_decode_many(words))):
+                if index < 0:
+                    continue
+                score, signals = function_start_score(code_bytes, index, words[position - 1] if position else None,
+                                                      words[position + 1:position + 1 + PROLOGUE_LOOKAHEAD],
+                                                      lambda offset, position=position: position + offset in helpers)
+                is_start = section_ea + position * 4 in starts
+                totals["instructions"] += 1
+                totals["starts"] += is_start
+                totals["proposed"] += score >= args.threshold
+                totals["starts kept"] += is_start and score >= args.threshold
+                for signal, name in g_prologue_signal_names:
+                    signals_seen[name] += bool(signals & signal)
+
+    spurious_before = totals["instructions"] - totals["starts"]
+    spurious_after = totals["proposed"] - totals["starts kept"]
+    print(f"{totals['instructions']} instructions of ours, {totals['starts']} of them start a function")
+    print(f"proposed as function starts: {totals['instructions']} before, {totals['proposed']} now "
+          f"({totals['starts kept']} real starts kept)")
+    print(f"spurious starts: {spurious_before} before, {spurious_after} now")
+    print("signals: " + ", ".join(f"{name} {count}" for name, count in signals_seen.items()))
+    return 0
+
+
+#	FUNCTION		find_vector_save_ladders
+
+#	DESCRIPTION		The vector register save/restore helpers of the Xbox 360 and PS3 compilers
+#					(__savevmx_14..31, __savevmx_64..127 and the __restvmx_ ones) are ladders
+#					of 'li rX, offset' + stvx/stvx128 (lvx/lvx128) vN, rX, rY pairs, one per
+#					register with the offset growing by 16, ending in blr. Callers branch to
+#					the pair of the first register they need, so every pair is an entry.
+#
+#					The words following an 'li' are classified in one altivec_decode_many
+#					call and the pairs are chained in a single walk. Returns (kind, entries,
+#					blr position) per ladder, kind "save" or "restore" and entries the
+#					(position of the li, register) of every pair.
+
+g_vector_ladder_kinds = {"stvx": "save", "stvx128": "save", "lvx": "restore", "lvx128": "restore"}
+VECTOR_LADDER_MINIMUM = 2
+g_vector_ladder_names = {"save": "__savevmx_{}", "restore": "__restvmx_{}"}
+
+def find_vector_save_ladders(words) -> list:
+    candidates = [position for position in range(len(words) - 1) if words[position] & 0xFC1F0000 == 0x38000000]
+    indices = altivec_decode_many([words[position + 1] for position in candidates])
+
+    pairs = {}
+    for position, index in zip(candidates, indices):
+        kind = g_vector_ladder_kinds.get(g_altivec_opcodes[index].name) if index >= 0 else None
+        if kind is None:
+            continue
+        register, ra, rb = altivec_decode_operands(index, words[position + 1])
+        offset_register = (words[position] >> 21) & 0x1F
+        if ra == offset_register:
+            offset = ((words[position] & 0xFFFF) ^ 0x8000) - 0x8000
+            pairs[position] = (kind, register, ra, rb, offset)
+
+    ladders = []
+    consumed = set()
+    for position in sorted(pairs):
+        if position in consumed:
+            continue
+        kind, register, ra, rb, offset = pairs[position]
+        entries = [(position, register)]
+        following = position + 2
+        while pairs.get(following) == (kind, register + len(entries), ra, rb, offset + 16 * len(entries)):
+            entries.append((following, register + len(entries)))
+            following += 2
+
+        consumed.update(entry for entry, _ in entries)
+        if len(entries) >= VECTOR_LADDER_MINIMUM and following < len(words) and words[following] == 0x4E800020:
+            ladders.append((kind, entries, following))
+    return ladders
+
+
+#	FUNCTION		command_vector_helpers
+
+#	DESCRIPTION		Lists the vector save/restore ladders of binaries with the names their
+#					entries get.
+
+def command_vector_helpers(args) -> int:
+    found = 0
+    for path in args.binaries:
+        code, _ = load_binary(path)
+        for section_ea, words in code:
+            for kind, entries, _ in find_vector_save_ladders(words):
+                found += 1
+                first, last = entries[0][1], entries[-1][1]
+                print(f"{path}\t{section_ea + entries[0][0] * 4:08X}\t{g_vector_ladder_names[kind].format(first)}"
+                      f"..{g_vector_ladder_names[kind].format(last)}\t{len(entries)} entries")
+
+    print(f"{found} vector save/restore ladders", file=sys.stderr)
+    return 0
+
+
+#	FUNCTION		find_base_registers
+
+#	DESCRIPTION		r2 (the TOC on the PS3, _SDA2_BASE_ on the GameCube/Wii) and r13
+#					(_SDA_BASE_) are built once at startup with a lis + addi/ori pair and
+#					keep their value everywhere else. Every 'lis' into one of them is followed
+#					for a few words to the value it ends with; a register counts as a base
+#					when all of them agree. Returns {register: value}.
+
+BASE_REGISTERS = (2, 13)
+BASE_BUILD_WORDS = 4
+
+def find_base_registers(code) -> dict:
+    values = {register: set() for register in BASE_REGISTERS}
+    for _, words in code:
+        for position in range(len(words)):
+            code_bytes = words[position]
+            register = (code_bytes >> 21) & 0x1F
+            if code_bytes & 0xFC1F0000 != 0x3C000000 or register not in values:
+                continue
+
+            state = {}
+            value = None
+            for code_bytes in words[position:position + BASE_BUILD_WORDS]:
+                track_gpr_constants(state, code_bytes)
+                if register not in state:
+                    break
+                value = state[register]
+            values[register].add(value)
+
+    return {register: seen.pop() for register, seen in values.items() if len(seen) == 1}
+
+
+#	FUNCTION		track_based_constants
+
+#	DESCRIPTION		track_gpr_constants() for code where 'bases' registers hold a known value
+#					everywhere: they are put back in the state when a branch clears it.
+
+def track_based_constants(state: dict, code_bytes: int, bases: dict):
+    track_gpr_constants(state, code_bytes)
+    if bases and code_bytes >> 26 in (16, 18, 19):
+        state.update(bases)
+
+
+#	FUNCTION		resolve_vector_references
+
+#	DESCRIPTION		Data references of the vector loads and stores of a run of words, from
+#					the lis/addi constants of the block and the base registers. Returns
+#					(position, address, is_store) per reference. While nothing but the bases
+#					is known only the words that build constants are followed.
+
+g_constant_building_primaries = frozenset({14, 15, 24, 25})
+
+def resolve_vector_references(words, bases: dict) -> list:
+    references = []
+    state = dict(bases)
+    for position, (code_bytes, index) in enumerate(zip(words, altivec_decode_many(words))):
+        if index >= 0:
+            address = resolve_vector_address(state, index, code_bytes)
+            if address is not None:
+                references.append((position, address, g_vector_memory_access[g_altivec_opcodes[index].insn][0]))
+        if code_bytes >> 26 in g_constant_building_primaries or state != bases:
+            track_based_constants(state, code_bytes, bases)
+    return references
+
+
+#	FUNCTION		command_vector_references
+
+#	DESCRIPTION		Lists the data references of the vector loads and stores of binaries,
+#					with the base registers found in each (or given on the command line).
+
+def command_vector_references(args) -> int:
+    for path in args.binaries:
+        code, _ = load_binary(path)
+        bases = find_base_registers(code)
+        bases.update({register: value for register, value in ((2, args.r2), (13, args.r13)) if value is not None})
+        print(f"{path}\tbases: " + (", ".join(f"r{register} = {value:08X}" for register, value in sorted(bases.items())) or "none"),
+              file=sys.stderr)
+
+        references = 0
+        for section_ea, words in code:
+            for position, address, is_store in resolve_vector_references(words, bases):
+                references += 1
+                print(f"{path}\t{section_ea + position * 4:08X}\t{'W' if is_store else 'R'}\t{address:08X}")
+        print(f"{path}\t{references} vector data references", file=sys.stderr)
+    return 0
+
+
+#	CLASS			TraceRing
+
+#	DESCRIPTION		Fixed size in-memory ring of trace records: ea, instruction word, matched
+#					table index (-1 for none), event id and a perf_counter_ns() timestamp.
+#					'events' is the mask of the event types being recorded. The event
+#					handlers append the record tuples to the bounded deque directly, through
+#					the bound 'append', which is about five times cheaper than calling a
+#					method packing them; records are only packed to the 24 byte binary form
+#					when dumped. dump() writes them oldest first after a small header,
+#					read() gives them back.
+
+# Event 1 was the processor_run event, which IDA never sends; the others keep their ids so older dumps still read
+TRACE_ANALYSE = 2
+TRACE_OUTPUT = 4
+TRACE_FUNCTION_START = 8
+
+g_trace_event_names = {TRACE_ANALYSE: "analyse", TRACE_OUTPUT: "output", TRACE_FUNCTION_START: "function_start"}
+
+TRACE_CAPACITY = 1 << 16
+TRACE_MAGIC = b"PPCTRACE"
+
+g_trace_header = struct.Struct("<8sII")
+g_trace_record = struct.Struct("<QIhHQ")
+
+def parse_trace_events(text: str) -> int:
+    events = 0
+    for name in filter(None, (part.strip() for part in text.replace(",", " ").split())):
+        if name == "all":
+            events |= sum(g_trace_event_names)
+            continue
+        event = next((event for event, known in g_trace_event_names.items() if known == name), None)
+        if event is None:
+            raise ValueError(f"unknown trace event {name!r}, expected one of: all, {', '.join(g_trace_event_names.values())}")
+        events |= event
+    return events
+
+class TraceRing:
+    def __init__(self, capacity: int = TRACE_CAPACITY, events: int = 0):
+        self.capacity = capacity
+        self.events = events
+        self.ring = collections.deque(maxlen=capacity)
+        self.append = self.ring.append  # takes (ea, code_bytes, index, event, perf_counter_ns())
+
+    def record(self, event: int, ea: int, code_bytes: int = 0, index: int = -1):
+        self.append((ea, code_bytes & 0xFFFFFFFF, index, event, time.perf_counter_ns()))
+
+    def clear(self):
+        self.ring.clear()
+
+    def records(self) -> bytes:
+        return b"".join(g_trace_record.pack(*record) for record in self.ring)
+
+    def dump(self, path: str) -> int:
+        data = self.records()
+        with open(path, "wb") as file:
+            file.write(g_trace_header.pack(TRACE_MAGIC, g_trace_record.size, len(data) // g_trace_record.size))
+            file.write(data)
+        return len(data) // g_trace_record.size
+
+    @staticmethod
+    def read(path: str):
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, size, count = g_trace_header.unpack_from(data)
+        if magic != TRACE_MAGIC or size != g_trace_record.size:
+            raise ValueError(f"{path} is not a trace dump")
+        return list(g_trace_record.iter_unpack(data[g_trace_header.size:g_trace_header.size + count * size]))
+
+
+#	FUNCTION		command_trace
+
+#	DESCRIPTION		Prints trace dumps as text, one record per line with the time relative
+#					to the first record.
+
+def command_trace(args) -> int:
+    for path in args.dumps:
+        records = TraceRing.read(path)
+        first = records[0][4] if records else 0
+        for ea, code_bytes, index, event, timestamp in records:
+            name = g_altivec_opcodes[index].name if 0 <= index < len(g_altivec_opcodes) else "-"
+            print(f"{(timestamp - first) / 1000:12.3f} us\t{g_trace_event_names.get(event, event)}\t{ea:08X}\t{code_bytes:08X}\t{name}")
+        print(f"{path}: {len(records)} records", file=sys.stderr)
+    return 0
+
+
+#	FUNCTION		command_serve
+
+#	DESCRIPTION		Runs the decode daemon until it is interrupted or killed.
+
+def command_serve(args) -> int:
+    if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        print("Unix domain sockets are not supported on this platform", file=sys.stderr)
+        return 1
+
+    # Let a plain kill remove the socket too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        server = AltivecDecodeServer(args.socket)
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    with server:
+        print(f"{PLUGIN_NAME} decode daemon listening on {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(args.socket)
+
+    return 0
+
+
+#	FUNCTION		main
+
+#	DESCRIPTION		Command line entry point, used when the script runs outside IDA.
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="ppc_altivec.py", description=PLUGIN_COMMENT)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="run the shared decode daemon")
+    serve.add_argument("--socket", default=DAEMON_SOCKET, help=f"Unix domain socket path (default: {DAEMON_SOCKET})")
+    serve.set_defaults(handler=command_serve)
+
+    batch = commands.add_parser("batch", help="analyse every binary below a directory")
+    batch.add_argument("directory")
+    batch.add_argument("--out", required=True, help="output directory (shards and manifest)")
+    batch.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    batch.add_argument("--retry-failed", action="store_true", help="analyse binaries the manifest records as failed again")
+    batch.set_defaults(handler=command_batch)
+
+    export = commands.add_parser("export", help="stream the decoded instructions of a binary")
+    export.add_argument("binary")
+    export.add_argument("--out", required=True, help="output file, '-' for stdout")
+    export.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    export.add_argument("--gzip", action="store_true", help="compress the output (implied by a .gz name)")
+    export.set_defaults(handler=command_export)
+
+    similar = commands.add_parser("similar", help="name functions from an index of known ones")
+    similar.add_argument("action", choices=("add", "query"), help="add named functions to the index, or look up every function")
+    similar.add_argument("index", help="index directory")
+    similar.add_argument("binaries", nargs="+")
+    similar.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD, help="minimum estimated similarity")
+    similar.set_defaults(handler=command_similar)
+
+    timing = commands.add_parser("timing", help="rank vector loops by estimated cycles per iteration")
+    timing.add_argument("binaries", nargs="+")
+    timing.add_argument("--model", choices=g_pipeline_model_names, default="ppe")
+    timing.add_argument("--top", type=int, default=50, help="loops to list")
+    timing.set_defaults(handler=command_timing)
+
+    streams = commands.add_parser("streams", help="report missing, overlapping and unstopped data streams")
+    streams.add_argument("binaries", nargs="+")
+    streams.set_defaults(handler=command_streams)
+
+    locked = commands.add_parser("lockedcache", help="report HID2, dcbz_l and locked cache DMA use")
+    locked.add_argument("binaries", nargs="+")
+    locked.set_defaults(handler=command_locked_cache)
+
+    assemble = commands.add_parser("asm", help="assemble instructions, one per line")
+    assemble.add_argument("source", help="file of instructions, - for stdin")
+    assemble.add_argument("--out", help="write the words big endian to this file instead of printing them")
+    assemble.add_argument("--no-check", action="store_true", help="don't decode the words again to check them")
+    assemble.set_defaults(handler=command_assemble)
+
+    idioms = commands.add_parser("idioms", help="find known SIMD idioms")
+    idioms.add_argument("binaries", nargs="+")
+    idioms.add_argument("--patterns", help="file of extra 'name: pattern' idioms")
+    idioms.set_defaults(handler=command_idioms)
+
+    prologues = commands.add_parser("prologues", help="measure function start scoring against symbols")
+    prologues.add_argument("binaries", nargs="+")
+    prologues.add_argument("--threshold", type=int, default=PROLOGUE_THRESHOLD, help="score IDA is taken to accept")
+    prologues.set_defaults(handler=command_prologues)
+
+    helpers = commands.add_parser("vmxhelpers", help="list the __savevmx/__restvmx register save ladders")
+    helpers.add_argument("binaries", nargs="+")
+    helpers.set_defaults(handler=command_vector_helpers)
+
+    references = commands.add_parser("vrefs", help="list the data references of vector loads and stores")
+    references.add_argument("binaries", nargs="+")
+    references.add_argument("--r2", type=lambda text: int(text, 0), help="TOC / _SDA2_BASE_ value, found in the code by default")
+    references.add_argument("--r13", type=lambda text: int(text, 0), help="_SDA_BASE_ value, found in the code by default")
+    references.set_defaults(handler=command_vector_references)
+
+    trace = commands.add_parser("trace", help="print trace dumps written from IDA")
+    trace.add_argument("dumps", nargs="+")
+    trace.set_defaults(handler=command_trace)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.handler(args)
+    except UnsupportedBinary as error:
+        print(f"{error.path}: {error}", file=sys.stderr)
+    except OSError as error:
+        print(f"{error.filename}: {error.strerror}" if error.filename else str(error), file=sys.stderr)
+    return 1
+
+
+# Everything below needs IDA. Run from the command line, stop here; imported outside of IDA,
+# only the decoder core and the tools above are defined.
+if __name__ == "__main__" and not HAVE_IDA:
+    sys.exit(main())
+
+
+if HAVE_IDA:
+    #	CLASS			AltivecReadAhead
+
+    #	DESCRIPTION		Read-ahead window over the database bytes. Auto-analysis mostly asks
+    #					for instructions in ascending address order, so instead of crossing
+    #					into the kernel with get_dword() for every instruction we fetch a
+    #					large chunk of the segment with get_bytes() and serve the following
+    #					words from an array('I') already swapped to host order.
+    #					The window is dropped whenever the bytes or segments change.
+
+    READ_AHEAD_SIZE = 0x10000
+    READ_AHEAD_MINIMUM = 0x100
+
+    class AltivecReadAhead:
+        def __init__(self, size: int = READ_AHEAD_SIZE):
+            self.size = size
+            self.words = array('I')
+            self.start_ea = BADADDR
+            self.end_ea = BADADDR
+            self.failed_start_ea = BADADDR
+            self.failed_end_ea = BADADDR
+
+            # Statistics, printed when the plugin terminates with PROFILE_EVENTS on
+            self.reads = 0      # words requested by the analyser
+            self.fetches = 0    # get_bytes() calls issued to fill the window
+            self.fallbacks = 0  # get_dword() calls for words we could not buffer
+
+        def invalidate(self):
+            self.words = array('I')
+            self.start_ea = BADADDR
+            self.end_ea = BADADDR
+            self.failed_start_ea = BADADDR
+            self.failed_end_ea = BADADDR
+
+        # A window that can't be read (unloaded bytes) is retried smaller down to
+        # READ_AHEAD_MINIMUM; a range failing even then is remembered, and its words
+        # go straight to get_dword() instead of retrying the read for each of them.
+        def fill(self, ea: int) -> bool:
+            if self.failed_start_ea <= ea < self.failed_end_ea:
+                return False
+
+            seg = ida_segment.getseg(ea)
+            if seg is None:
+                return False
+
+            # Never read past the end of the segment, and keep whole words only
+            size = (min(seg.end_ea, ea + self.size) - ea) & ~3
+            if size <= 0:
+                return False
+
+            while True:
+                data = ida_bytes.get_bytes(ea, size)
+                self.fetches += 1
+                if data is not None and len(data) == size:
+                    break
+                if size <= READ_AHEAD_MINIMUM:
+                    self.invalidate()
+                    self.failed_start_ea = ea
+                    self.failed_end_ea = ea + size
+                    return False
+                size = max(READ_AHEAD_MINIMUM, (size // 4) & ~3)
+
+            words = array('I', data)
+            if ida_ida.inf_is_be() != (sys.byteorder == "big"):
+                words.byteswap()
+
+            self.words = words
+            self.start_ea = ea
+            self.end_ea = ea + size
+            return True
+
+        def get_dword(self, ea: int) -> int:
+            self.reads += 1
+
+            # Only serve words that share the window alignment, otherwise start a new window here
+            if not (self.start_ea <= ea < self.end_ea and ((ea - self.start_ea) & 3) == 0):
+                if not self.fill(ea):
+                    self.fallbacks += 1
+                    return get_dword(ea)
+
+            return self.words[(ea - self.start_ea) >> 2]
+
+        def stats(self) -> str:
+            calls = self.fetches + self.fallbacks
+            return f"{self.reads} words read with {calls} kernel calls ({self.reads - calls} saved)"
+
+    g_read_ahead = AltivecReadAhead()
+
+
+    #	CLASS			AltivecIDBHooks
+
+    #	DESCRIPTION		Drops the read-ahead window when bytes are patched or the segment
+    #					layout changes, so we never decode stale data. Also keeps the usage
+    #					index and the per function caches in step with function changes and saves
+    #					the usage index with the database. Patches and renames of the base symbols
+    #					make the r2/r13 values be worked out again.
+
+    class AltivecIDBHooks(ida_idp.IDB_Hooks):
+        def byte_patched(self, ea, old_value):
+            global g_analysed_ea
+            if g_read_ahead.start_ea <= ea < g_read_ahead.end_ea:
+                g_read_ahead.invalidate()
+            if g_analysed_ea <= ea < g_analysed_ea + 4:
+                g_analysed_ea = BADADDR
+            invalidate_function_caches(ea, ea + 1)
+            g_literal_cache.invalidate(ea)
+            g_base_registers.invalidate()
+            return 0
+
+        def segm_added(self, s):
+            g_read_ahead.invalidate()
+            return 0
+
+        def segm_deleted(self, start_ea, end_ea, flags):
+            g_read_ahead.invalidate()
+            return 0
+
+        def segm_start_changed(self, s, oldstart):
+            g_read_ahead.invalidate()
+            return 0
+
+        def segm_end_changed(self, s, oldend):
+            g_read_ahead.invalidate()
+            return 0
+
+        def segm_moved(self, _from, to, size, changed_netmap):
+            g_read_ahead.invalidate()
+            return 0
+
+        def closebase(self):
+            g_read_ahead.invalidate()
+            g_background.cancel()
+            g_usage_index.clear()
+            clear_function_caches()
+            g_literal_cache.clear()
+            g_base_registers.invalidate()
+            return 0
+
+        def renamed(self, ea, new_name, local_name, *args):
+            if g_base_registers.is_symbol(new_name) or (args and g_base_registers.is_symbol(args[0] or "")):
+                g_base_registers.invalidate()
+            return 0
+
+        def func_added(self, pfn):
+            function_range_changed(pfn.start_ea, pfn.end_ea)
+            return 0
+
+        def deleting_func(self, pfn):
+            function_range_changed(pfn.start_ea, pfn.end_ea)
+            return 0
+
+        def set_func_start(self, pfn, new_start):
+            function_range_changed(min(pfn.start_ea, new_start), pfn.end_ea)
+            return 0
+
+        def set_func_end(self, pfn, new_end):
+            function_range_changed(pfn.start_ea, max(pfn.end_ea, new_end))
+            return 0
+
+        def func_tail_appended(self, pfn, tail):
+            function_range_changed(tail.start_ea, tail.end_ea)
+            return 0
+
+        def tail_owner_changed(self, tail, owner_func, old_owner):
+            function_range_changed(tail.start_ea, tail.end_ea)
+            return 0
+
+        def func_tail_deleted(self, pfn, tail_ea):
+            function_range_changed(pfn.start_ea, pfn.end_ea)
+            function_range_changed(tail_ea, tail_ea + 1)
+            return 0
+
+        def savebase(self):
+            g_AltivecNode.create(g_AltivecNodeName)
+            g_usage_index.save(g_AltivecNode)
+            return 0
+
+
+    # Function boundary changes move instructions between usage index entries and outdate
+    # the cached analyses of the functions involved
+    def function_range_changed(start_ea: int, end_ea: int):
+        g_usage_index.function_changed(start_ea, end_ea)
+        invalidate_function_caches(start_ea, end_ea)
+
+
+    #	FUNCTION		PluginAnalyse
+
+    #	DESCRIPTION		This is the main analysis function.. it runs the decoder core over the
+    #					instruction word and fills in IDA's operands from the decoded values.
+
+    # The last word plugin_analyse read. IDA decodes an instruction right before it prints it or
+    # asks whether it starts a function, so those events take the word from here instead of
+    # reading it again.
+    g_analysed_ea = BADADDR
+    g_analysed_word = 0
+
+    def analysed_word(ea: int) -> int:
+        if ea == g_analysed_ea:
+            return g_analysed_word
+        return g_read_ahead.get_dword(ea)
+
+    def plugin_analyse(insn: ida_ua.insn_t):
+        global g_analysed_ea, g_analysed_word
+
+        code_bytes = g_read_ahead.get_dword(insn.ea)
+        g_analysed_ea, g_analysed_word = insn.ea, code_bytes
+        index = altivec_decode(code_bytes)
+
+        # We obviously didn't find our opcode this time round..
+        if index < 0:
+            return 0
+
+        for operandLoop, (operand_id, extract) in enumerate(g_operand_decoders[index]):
+
+            pOperandData : ida_ua.op_t = insn.ops[operandLoop] # cmd.Operands[operandLoop];
+            value = extract(code_bytes)
+
+            match operand_id:
+
+                # Altivec registers (VMX128 ones have their number scattered, the core reassembled it)
+                case AltivecOperandID.VA | AltivecOperandID.VB | AltivecOperandID.VC | AltivecOperandID.VD | \
+                     AltivecOperandID.VD128 | AltivecOperandID.VA128 | AltivecOperandID.VB128 | AltivecOperandID.VC128:
+                    pOperandData.type = o_reg
+                    pOperandData.reg = value
+                    pOperandData.specflag1 = 0x01  # marks the register as Altivec
+
+                # Altivec memory loads are always via a CPU register
+                case AltivecOperandID.RA | AltivecOperandID.RB | AltivecOperandID.RS:  # RS is also RT
+                    pOperandData.type = o_reg
+                    pOperandData.reg = value
+                    pOperandData.specflag1 = 0x00
+
+                case AltivecOperandID.CRM:
+                    pOperandData.type = o_reg
+                    pOperandData.reg = value
+                    pOperandData.specflag1 = 0x02 # Mark the register as being a CRF.
+
+                case AltivecOperandID.RA0:
+                    if value == 0:
                         pOperandData.type = o_imm
                         pOperandData.dtype = dt_byte
-                        pOperandData.value = raw_bits
-                        break
+                        pOperandData.value = value
+                    else:
+                        pOperandData.type = o_reg
+                        pOperandData.reg = value
+                        pOperandData.specflag1 = 0
+
+                case AltivecOperandID.SPR:
+                    pOperandData.type = o_reg
+                    pOperandData.reg = value
+                    pOperandData.specflag1 = 0x04 # Mark the register as being a SPR.
+
+                # These are main Gekko registers
+                case AltivecOperandID.FA | AltivecOperandID.FB | AltivecOperandID.FC | AltivecOperandID.FD:
+                    pOperandData.type = o_reg
+                    pOperandData.reg = value
+                    pOperandData.specflag1 = 0x08 # Mark the register as being a Gekko one
+
+                case AltivecOperandID.DRA:
+                    pOperandData.type = o_displ
+                    pOperandData.phrase = value
+                    pOperandData.addr = gekko_displacement(code_bytes)
+
+                # Everything else is an immediate: SIMM (sign extended by the core), UIMM, SHB,
+                # STRM, L*, VPERM128, VD3D*, crfD and the Gekko quantization fields
+                case _:
+                    pOperandData.type = o_imm
+                    pOperandData.dtype = dt_byte
+                    pOperandData.value = value
+
+        # Make a not of which opcode we are, we need it to print our stuff out.
+        insn.itype = g_altivec_opcodes[index].insn
+
+        # The command is 4 bytes long..
+        return 4
+
+
+    #	CLASS			AltivecBackgroundDecoder
+
+    #	DESCRIPTION		Background mode. When a database is opened a worker thread snapshots the
+    #					code segments and runs the decoder core over every word. IDA's API may
+    #					only be used from the main thread, so the worker reads the bytes and
+    #					commits its results through execute_sync(), one batch at a time:
+    #
+    #						- words IDA left unexplored right after code that flows into them
+    #						  become instructions,
+    #						- vector loads/stores whose address is built by li/lis/addi/ori in
+    #						  the same block get a data cross reference.
+    #
+    #					The descriptions of our instructions are left to the auto comment
+    #					ev_out_insn prints, nothing is written into the user's comments.
+    #
+    #					Decoding also fills the shared decode cache, so ev_ana_insn no longer
+    #					has to search the opcode table for words the worker has seen.
+    #
+    #					The worker is pure Python and holds the GIL while it decodes, so it can't
+    #					run in parallel with our own event handlers: next to auto-analysis it
+    #					only slowed them down (4.4 times in a simulation). It waits while
+    #					auto-analysis is busy and decodes when IDA is idle. This keeps the UI
+    #					responsive; it does not make the analysis itself faster.
+
+    BACKGROUND_CHUNK_SIZE = 0x100000
+    BACKGROUND_BATCH_SIZE = 4096
+    BACKGROUND_IDLE_DELAY = 0.25
+
+    class AltivecBackgroundDecoder:
+        def __init__(self):
+            self.thread = None
+            self.cancel_event = threading.Event()
+            self.total_bytes = 0
+            self.done_bytes = 0
+            self.reported_percent = -1
+            self.committed = 0
+
+        def running(self) -> bool:
+            return self.thread is not None and self.thread.is_alive()
+
+        def start(self):
+            if self.running():
+                return
+
+            self.cancel_event.clear()
+            self.total_bytes = self.done_bytes = self.committed = 0
+            self.reported_percent = -1
+            self.thread = threading.Thread(target=self.run, name="AltivecBackgroundDecoder", daemon=True)
+            self.thread.start()
+
+        def cancel(self):
+            # Never join here: the worker may be waiting for the main thread in execute_sync()
+            self.cancel_event.set()
+
+        # Runs 'func' on the main thread and hands its result back to the worker
+        def sync(self, func, flags=ida_kernwin.MFF_READ):
+            result = []
+
+            def call():
+                if not self.cancel_event.is_set():
+                    result.append(func())
+                return 0
+
+            ida_kernwin.execute_sync(call, flags)
+            return result[0] if result else None
+
+        def run(self):
+            segments = self.sync(snapshot_code_segments)
+            if not segments:
+                return
+
+            self.total_bytes = sum(end - start for start, end in segments)
+            big_endian = self.sync(ida_ida.inf_is_be)
+            bases = self.sync(lambda: g_base_registers.bases) or {}
+            batch = []
+
+            for start_ea, end_ea in segments:
+                state = dict(bases)
+                for chunk_ea in range(start_ea, end_ea, BACKGROUND_CHUNK_SIZE):
+                    while not self.cancel_event.is_set() and not self.sync(ida_auto.auto_is_ok):
+                        self.cancel_event.wait(BACKGROUND_IDLE_DELAY)
+                    if self.cancel_event.is_set():
+                        ida_kernwin.msg(f"{PLUGIN_NAME}: background decode cancelled\n")
+                        return
+
+                    size = min(BACKGROUND_CHUNK_SIZE, end_ea - chunk_ea) & ~3
+                    data = self.sync(lambda: ida_bytes.get_bytes(chunk_ea, size))
+                    if data is None or len(data) != size:
+                        state = dict(bases)
+                        self.done_bytes += size
+                        continue
+
+                    words = array('I', data)
+                    if big_endian != (sys.byteorder == "big"):
+                        words.byteswap()
+
+                    decode_words(words, chunk_ea, state, batch, bases)
+                    self.done_bytes += size
+
+                    if len(batch) >= BACKGROUND_BATCH_SIZE:
+                        self.commit(batch)
+                        batch = []
+
+            self.commit(batch)
+            if not self.cancel_event.is_set():
+                ida_kernwin.msg(f"{PLUGIN_NAME}: background decode finished, {self.committed} instructions committed\n")
+
+        def commit(self, batch):
+            percent = self.done_bytes * 100 // self.total_bytes if self.total_bytes else 100
+            self.sync(lambda: self.commit_batch(batch, percent), ida_kernwin.MFF_WRITE)
+
+        # Main thread side
+        def commit_batch(self, batch, percent):
+            for ea, code_bytes, index, target in batch:
+                # The bytes may have been patched since the snapshot
+                if ida_bytes.get_dword(ea) != code_bytes:
+                    continue
+
+                if ida_bytes.is_unknown(ida_bytes.get_flags(ea)) and flows_into(ea):
+                    ida_ua.create_insn(ea)
+
+                if not ida_bytes.is_code(ida_bytes.get_flags(ea)):
+                    continue
+
+                if target is not None and ida_bytes.is_mapped(target):
+                    is_store = g_vector_memory_access[g_altivec_opcodes[index].insn][0]
+                    ida_xref.add_dref(ea, target, ida_xref.dr_W if is_store else ida_xref.dr_R)
+
+                self.committed += 1
+
+            if percent // 10 != self.reported_percent // 10:
+                self.reported_percent = percent
+                ida_kernwin.msg(f"{PLUGIN_NAME}: background decode {percent}% done\n")
+            return 0
 
-                    case AltivecOperandID.DRA:
-                        imm = code_bytes & 0x7FF
-                        sign = code_bytes & 0x800
-                        displacement = 0
+    g_background = AltivecBackgroundDecoder()
 
-                        if sign == 0:
-                            displacement = imm
-                        else:
-                            displacement = -1 * imm
 
-                        pOperandData.type = o_displ
-                        pOperandData.phrase = raw_bits
-                        pOperandData.addr = displacement
-                        break
+    def snapshot_code_segments():
+        segments = []
+        for n in range(ida_segment.get_segm_qty()):
+            seg = ida_segment.getnseg(n)
+            if seg is not None and seg.type == ida_segment.SEG_CODE:
+                segments.append((seg.start_ea, seg.end_ea))
+        return segments
 
-                    case _:
-                        pass
-                    
-                    # Next operand please..
-                operandLoop+=1
-            
-            # Make a not of which opcode we are, we need it to print our stuff out.
-            insn.itype = pCurrentOpcode.insn
 
-            # The command is 4 bytes long..
-            return 4
+    # Decodes a run of words starting at 'ea', appending (ea, word, index, data address) for our
+    # instructions to 'batch'. IDA independent, 'state' carries the GPR constants across calls and
+    # 'bases' the base registers known everywhere (see find_base_registers).
+    def decode_words(words, ea, state: dict, batch: list, bases: dict = None):
+        for code_bytes, index in zip(words, altivec_decode_many(words)):
+            if index >= 0:
+                batch.append((ea, code_bytes, index, resolve_vector_address(state, index, code_bytes)))
+            track_based_constants(state, code_bytes, bases)
+            ea += 4
 
-    # We obviously didn't find our opcode this time round.. go test the next one.
-    pCurrentOpcode+=1;
 
+    def flows_into(ea: int) -> bool:
+        prev_ea = ea - 4
+        if not ida_bytes.is_code(ida_bytes.get_flags(prev_ea)):
+            return False
 
-# FUNCTION 		PluginExtentionCallback
+        insn = ida_ua.insn_t()
+        if ida_ua.decode_insn(insn, prev_ea) == 0:
+            return False
+        return (insn.get_canon_feature() & ida_idp.CF_STOP) == 0
 
-# DESCRIPTION	This callback is responsible for distributing work associated with each
-#					intercepted event that we deal with. In our case we deal with the following
-#					event identifiers.
-#
-#					custom_ana		:	Analyses a command (in 'cmd') to see if it is an Altivec
-#										instruction. If so, then it extracts information from the
-#										opcode in order to determine which opcode it is, along with
-#										data relating to any used operands.
-#
-#					custom_mnem		:	Generates the mnemonic for our Altivec instructions, by looking
-#										into our array of opcode information structures.
-#
-#					custom_outop	:	Outputs operands for Altivec instructions. In our case, we
-#										have an alternate register set (vr0 to vr31), so our operands
-#										may be marked as being Altivec registers.
-#
-#					may_be_func		:	It's perfectly OK for an Altivec instruction to be the start
-#										of a function, so I figured I should return 100 here. The
-#										return value is a percentage probability..
-#
-#					is_sane_insn	:	All our Altivec instructions (well, the ones we've identified
-#										inside custom_ana processing), are ok.
 
+    #	CLASS			AltivecAction
 
-def PluginExtensionCallback(user_data, event_id, *args):
-    match event_id:
+    #	DESCRIPTION		Small action handler running a callback, used for our menu entries.
 
-        # Analyze a command to see if it's an Altivec instruction
-        case ida_idp.processor_t.ev_ana_insn:
-            inst : insn_t = args[0]
+    class AltivecAction(ida_kernwin.action_handler_t):
+        def __init__(self, callback):
+            ida_kernwin.action_handler_t.__init__(self)
+            self.callback = callback
 
-            if lenght:
-                inst.size = lenght
-                return lenght # event processed
+        def activate(self, ctx):
+            self.callback()
+            return 1
 
-        # Display operands that differ from PPC ones.. like our altivec registers
-        case ida_idp.processor_t.ev_out_operand:
-            ctx : outctx_t = args[0]
-
-            if ctx.insn.itype > altivec_insn_start:
-                operand : op_t = args[0]
-                if operand.type == o_reg and operand.specflag1 & 0x01:
-                    buf = f"%vr{operand.reg}"
-                    ctx.out_register(buf)
-                    return 1
-                elif operand.type == o_reg and operand.specflag1 & 0x02:
-                    for i in range(8):
-                        if operand.reg & (1 << i):
-                            buf = f"cr{7 - i}"
-                            ctx.out_register(buf)
-                            break
-                    
-                    return 1
-                elif operand.type == o_reg and operand-specflag1 & 0x04:
-                    sprg_array_size = len(g_cbeaSprgs)
-                    p_current_sprg : CbeaSprg = g_cbeaSprgs
-
-                    for sprg in g_cbeaSprgs:
-                        if operand.reg == sprg.sprg:
-                            ctx.out_register(sprg.shortName)
-                            return 1
-
-                    buf = f"{operand.reg:x}"
-                    ctx.out_register(buf)
-                    return 1
-                
-                elif operand.type == o_reg and operand-specflag1 & 0x08:
-                        buf = f"%fr{operand.reg}"
-                        ctx.out_register(buf)
-                        return 1
-
-        
-        case ida_idp.processor_t.ev_out_insn:
-            ctx : outctx_t = args[0]
-
-            if ctx-insn.itype > altivec_insn_start:
-                # Output mnemonic
-                ctx.out_custom_mnem(g_altivec_opcodes[ctx.insn.itype - altivec_lvebx].name, 10)
-                
-                # Output operands
-            if ctx.insn.ops[0].shown() and ctx.insn.ops[0].type != o_void:
-                ctx.out_one_operand(0)
-
-            if ctx.insn.ops[1].shown() and ctx.insn.ops[1].type != o_void:
-                if ctx.insn.ops[0].shown():
-                    ctx.out_symbol(',')
-                    ctx.out_char(' ')
-                
-                ctx.out_one_operand(1)
-            
-            if ctx.insn.ops[2].shown() and ctx.insn.ops[2].type != o_void:
-                if ctx.insn.ops[0].shown() or ctx.insn.ops[1].shown():
-                    ctx.out_symbol(',')
-                    ctx.out_char(' ')
-                
-                ctx.out_one_operand(2)
-            
-            if ctx.insn.ops[3].shown() and ctx.insn.ops[3].type != o_void:
-                if ctx.insn.ops[0].shown() or ctx.insn.ops[1].shown() or ctx.insn.ops[2].shown():
-                    ctx.out_symbol(',')
-                    ctx.out_char(' ')
-                
-                ctx.out_one_operand(3)
+        def update(self, ctx):
+            return ida_kernwin.AST_ENABLE_ALWAYS
 
-            if ctx.insn.ops[4].shown() and ctx.insn.ops[4].type != o_void:
-                if ctx.insn.ops[0].shown() or ctx.insn.ops[1].shown() or ctx.insn.ops[2].shown() or ctx.insn.ops[3].shown():
-                    ctx.out_symbol(',')
-                    ctx.out_char(' ')
-                
-                ctx.out_one_operand(4)
 
-            if show_all_comments() and get_cmt(ctx.insn.ea, true) == -1:
-                indent_loop = len(ctx.outbuf)
-                while indent_loop < (inf.comment - inf.indent):
-                    ctx.out_char(' ')
-                    ctx.out_line("# ", COLOR_AUTOCMT)
-                    ctx.out_line(g_altivec_opcodes[ctx.insn.itype - altivec_lvebx].description, COLOR_AUTOCMT)
-                    
-                    # Print out description of SPRG
-                    for i in range(len(ctx.insn.ops)):  
-                        sprg_array_size = len(g_cbeaSprgs)
-                        pCurrentSprg : CbeaSprg = g_cbeaSprgs
-
-                        # go through the entire special register array for looking for a match
-                        for sprg in g_cbeaSprgs:
-                            if op.reg == sprg.sprg:
-                                ctx.out_line(sprg.comment, COLOR_AUTOCMT)
-
-                    indent_loop += 1
-                
-            ctx.flush_outbuf()
-            return 2
+    def toggle_background_mode():
+        global g_BackgroundState
 
-        # Can this be the start of a function?
-        case ida_idp.processor_t.ev_may_be_func:
-            insn : insn_t = args[0]
-            if insn.itype > altivec_insn_start:
-                return 100
-
-        # If we've identified the command as an Altivec instruction, it's good to go.
-        case ida_idp.processor_t.ev_is_sane_insn:
-            insn : insn_t = args[0]
-            if insn.itype > altivec_insn_start:
-                return 1
-            
-    # We didn't process the event, let IDA Handle it
-    return 0
+        g_BackgroundState = kDisabled if g_BackgroundState == kEnabled else kEnabled
+        g_AltivecNode.create(g_AltivecNodeName)
+        g_AltivecNode.altset(1, g_BackgroundState)
 
-# Plugin information
-PLUGIN_NAME = "PowerPC Altivec"
-PLUGIN_HELP = "support for VMX128, Xbox360(Xenon), PS3(CellBE) and GC/WII(Gekko) "
-PLUGIN_COMMENT = "Altivec Plugin for IDA Pro"
-PLUGIN_HOTKEY = "Ctrl+H"
+        if g_BackgroundState == kEnabled:
+            g_background.start()
+        else:
+            g_background.cancel()
+
+        hook_state_description = ["default", "enabled", "disabled"]
+        ida_kernwin.msg(f"{PLUGIN_NAME}: background decode is now {hook_state_description[g_BackgroundState]}\n")
 
 
-kDefault, kEnabled, kDisabled = 0, 1, 2
-g_HookState = kEnabled
-g_AltivecNodeName = "$ AltivecPlugin"
-g_AltivecNode = idaapi.netnode()
+    def cycle_immediate_display():
+        global g_immediate_display
 
+        g_immediate_display = g_immediate_display % IMMEDIATE_BOTH + 1
+        g_AltivecNode.create(g_AltivecNodeName)
+        g_AltivecNode.altset(2, g_immediate_display)
+        ida_kernwin.request_refresh(ida_kernwin.IWID_DISASMS)
 
-# Callback class
-class PluginExtensionCallback(ida_idp.IDP_Hooks):
-    def __init__(self):
-        ida_idp.IDP_Hooks.__init__(self)
+        display_description = {IMMEDIATE_SYMBOLIC: "symbolic", IMMEDIATE_RAW: "raw", IMMEDIATE_BOTH: "raw and symbolic"}
+        ida_kernwin.msg(f"{PLUGIN_NAME}: VMX128 immediates are now shown {display_description[g_immediate_display]}\n")
 
-    def processor_run(self, ea):
-        if g_HookState == kDisabled:
+
+    g_actions = [
+        ("ppc_altivec:toggle_background", "Altivec background decode on/off", toggle_background_mode),
+        ("ppc_altivec:cancel_background", "Cancel Altivec background decode", g_background.cancel),
+        ("ppc_altivec:immediate_display", "Altivec immediates: symbolic/raw/both", cycle_immediate_display),
+    ]
+
+    # Entries are (name, label, callback) with an optional shortcut
+    def register_actions():
+        for name, label, callback, *shortcut in g_actions:
+            ida_kernwin.register_action(ida_kernwin.action_desc_t(name, label, AltivecAction(callback), *shortcut))
+            ida_kernwin.attach_action_to_menu("Edit/Plugins/", name, ida_kernwin.SETMENU_APP)
+
+    def unregister_actions():
+        for name, *_ in g_actions:
+            ida_kernwin.detach_action_from_menu("Edit/Plugins/", name)
+            ida_kernwin.unregister_action(name)
+
+
+    #	CLASS			AltivecUIHooks
+
+    #	DESCRIPTION		Starts the background decoder once a new database has been loaded and adds
+    #					our actions to the disassembly context menu.
+
+    class AltivecUIHooks(ida_kernwin.UI_Hooks):
+        def database_inited(self, is_new_database, idc_script):
+            if g_BackgroundState == kEnabled and g_HookState == kEnabled:
+                g_background.start()
             return 0
-        print(f"Processing address: {ea}")
-        return 0
 
-hook = PluginExtensionCallback()
+        # Hex-Rays is loaded after processor plugins, so the microcode filter goes in from here
+        def ready_to_run(self):
+            if g_HookState == kEnabled and g_AltivecNode.altval(3) != kDisabled:
+                g_microcode_filter.install(True)
+            return 0
 
-def PluginStartup():
-    global g_HookState
-    
-    # Check if platform is PowerPC
-    if idaapi.ph.id != idaapi.PLFM_PPC:
-        return idaapi.PLUGIN_SKIP
+        def finish_populating_widget_popup(self, widget, popup):
+            if ida_kernwin.get_widget_type(widget) == ida_kernwin.BWN_DISASM:
+                for name in g_popup_actions:
+                    ida_kernwin.attach_action_to_popup(widget, popup, name)
+            return 0
 
-    g_AltivecNode.create(g_AltivecNodeName)
-    databaseHookState = g_AltivecNode.altval(0)
 
-    if databaseHookState != kDefault:
-        g_HookState = databaseHookState
+    #	CLASS			AltivecUsageIndex
+
+    #	DESCRIPTION		Per function usage of our instructions. ev_ana_insn records the opcode table
+    #					index of every instruction it decodes; flush() then assigns the changed
+    #					addresses to their function and keeps, per function, an array('I') with
+    #					one counter per table entry. Function boundary changes only mark their
+    #					range for reassignment. The index is saved in the netnode with the
+    #					database, so reopening it doesn't need a rebuild.
+
+    USAGE_INDEX_VERSION = 1
+    g_usage_header = struct.Struct("<II")
+
+    def little_endian_array(typecode: str, values) -> array:
+        data = array(typecode, values)
+        if sys.byteorder == "big":
+            data.byteswap()
+        return data
+
+    class AltivecUsageIndex:
+        def __init__(self):
+            self.clear()
+
+        def clear(self):
+            self.eas = {}           # ea -> opcode table index
+            self.owners = {}        # ea -> function start the ea is counted in
+            self.functions = {}     # function start -> array('I') of counts per table index
+            self.counted = {}       # ea -> table index it was counted with, may lag self.eas until flush()
+            self.dirty = set()
+            self.stale_ranges = []
+            self.modified = False
+
+        # Called for every decoded instruction, must stay cheap
+        def record(self, ea: int, index: int):
+            if self.eas.get(ea) != index:
+                self.eas[ea] = index
+                self.dirty.add(ea)
+
+        def forget(self, ea: int):
+            if self.eas.pop(ea, None) is not None:
+                self.dirty.add(ea)
+
+        def function_changed(self, start_ea: int, end_ea: int):
+            self.stale_ranges.append((start_ea, end_ea))
+
+        def flush(self):
+            if self.stale_ranges:
+                ordered = sorted(self.eas)
+                for start_ea, end_ea in self.stale_ranges:
+                    self.dirty.update(ordered[bisect.bisect_left(ordered, start_ea):bisect.bisect_left(ordered, end_ea)])
+                # Addresses counted in a function that lost them need a look too
+                self.dirty.update(ea for ea, owner in self.owners.items() if any(start <= owner < end for start, end in self.stale_ranges))
+                self.stale_ranges = []
+
+            if not self.dirty:
+                return
+
+            count = len(g_altivec_opcodes)
+            for ea in self.dirty:
+                owner = self.owners.pop(ea, None)
+                if owner is not None:
+                    counts = self.functions[owner]
+                    counts[self.counted[ea]] -= 1
+                    del self.counted[ea]
+                    if not any(counts):
+                        del self.functions[owner]
+
+                index = self.eas.get(ea)
+                pfn = ida_funcs.get_func(ea) if index is not None else None
+                if pfn is not None:
+                    counts = self.functions.get(pfn.start_ea)
+                    if counts is None:
+                        counts = self.functions[pfn.start_ea] = array('I', bytes(4 * count))
+                    counts[index] += 1
+                    self.owners[ea] = pfn.start_ea
+                    self.counted[ea] = index
+
+            self.dirty = set()
+            self.modified = True
+
+        def save(self, node):
+            self.flush()
+            if not self.modified:
+                return
+
+            eas = sorted(self.owners)
+            data = g_usage_header.pack(USAGE_INDEX_VERSION, len(eas))
+            data += little_endian_array('Q', eas).tobytes()
+            data += little_endian_array('Q', (self.owners[ea] for ea in eas)).tobytes()
+            data += little_endian_array('H', (self.counted[ea] for ea in eas)).tobytes()
+
+            node.setblob(zlib.compress(data), 0, 'U')
+            self.modified = False
+
+        def load(self, node):
+            self.clear()
+
+            blob = node.getblob(0, 'U')
+            if not blob:
+                return
+
+            data = zlib.decompress(blob)
+            version, count = g_usage_header.unpack_from(data)
+            if version != USAGE_INDEX_VERSION:
+                return
+
+            offset = g_usage_header.size
+            arrays = []
+            for typecode, size in (('Q', 8), ('Q', 8), ('H', 2)):
+                values = array(typecode, data[offset:offset + count * size])
+                if sys.byteorder == "big":
+                    values.byteswap()
+                arrays.append(values)
+                offset += count * size
+
+            table_size = len(g_altivec_opcodes)
+            for ea, owner, index in zip(*arrays):
+                if index >= table_size:
+                    continue
+                counts = self.functions.get(owner)
+                if counts is None:
+                    counts = self.functions[owner] = array('I', bytes(4 * table_size))
+                counts[index] += 1
+                self.eas[ea] = self.counted[ea] = index
+                self.owners[ea] = owner
+
+    g_usage_index = AltivecUsageIndex()
+
+
+    #	FUNCTION		compile_usage_filter
+
+    #	DESCRIPTION		Turns a filter such as "vmaddfp128>50 dst*" into a predicate over a count
+    #					array. Every term must hold: "pattern OP number" compares the total count
+    #					of the mnemonics matching the (fnmatch) pattern, a bare pattern requires
+    #					at least one of them. Returns None when the filter can't be parsed.
+
+    g_usage_term = re.compile(r"^([\w.*?\[\]]+)\s*(>=|<=|==|!=|>|<|=)?\s*(\d+)?$")
+
+    g_usage_comparisons = {
+        ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+        "=": operator.eq, "==": operator.eq, "!=": operator.ne,
+    }
+
+    def compile_usage_filter(text: str):
+        terms = []
+        for term in re.sub(r"\s*(>=|<=|==|!=|>|<|=)\s*", r"\1", text).split():
+            match = g_usage_term.match(term)
+            if match is None or (match.group(2) is None) != (match.group(3) is None):
+                return None
+
+            pattern, comparison, number = match.groups()
+            indices = [index for index, opcode in enumerate(g_altivec_opcodes) if fnmatch.fnmatchcase(opcode.name, pattern)]
+            if comparison is None:
+                terms.append((indices, operator.gt, 0))
+            else:
+                terms.append((indices, g_usage_comparisons[comparison], int(number)))
+
+        def predicate(counts):
+            for indices, compare, number in terms:
+                if not compare(sum(counts[index] for index in indices), number):
+                    return False
+            return True
+
+        # The value shown in the chooser and used to sort it: what the first term counts
+        first = terms[0][0] if terms else None
+        def metric(counts):
+            return sum(counts[index] for index in first) if first is not None else sum(counts)
+
+        return predicate, metric
+
+
+    #	CLASS			AltivecUsageChooser
+
+    #	DESCRIPTION		Lists the functions using our instructions, filtered and sorted by the
+    #					count of what the filter asks for. Double click jumps to the function.
+
+    class AltivecUsageChooser(ida_kernwin.Choose):
+        def __init__(self, title: str, rows: list):
+            ida_kernwin.Choose.__init__(self, title, [
+                ["Function", 30 | ida_kernwin.Choose.CHCOL_FNAME],
+                ["Address", 12 | ida_kernwin.Choose.CHCOL_EA],
+                ["Matched", 8 | ida_kernwin.Choose.CHCOL_DEC],
+                ["Altivec", 8 | ida_kernwin.Choose.CHCOL_DEC],
+                ["Most used", 40 | ida_kernwin.Choose.CHCOL_PLAIN],
+            ])
+            self.rows = rows
+
+        def OnGetSize(self):
+            return len(self.rows)
+
+        def OnGetLine(self, n):
+            return self.rows[n][1]
+
+        def OnSelectLine(self, n):
+            ida_kernwin.jumpto(self.rows[n][0])
+            return (ida_kernwin.Choose.NOTHING_CHANGED, )
+
+    def usage_rows(predicate, metric) -> list:
+        rows = []
+        for start_ea, counts in g_usage_index.functions.items():
+            if not predicate(counts):
+                continue
+
+            top = sorted(((count, index) for index, count in enumerate(counts) if count), reverse=True)[:3]
+            most_used = ", ".join(f"{g_altivec_opcodes[index].name} x{count}" for count, index in top)
+            value = metric(counts)
+            rows.append((value, start_ea, [ida_funcs.get_func_name(start_ea) or f"{start_ea:X}", f"{start_ea:X}", str(value), str(sum(counts)), most_used]))
+
+        rows.sort(key=lambda row: (-row[0], row[1]))
+        return [(start_ea, line) for _, start_ea, line in rows]
+
+    g_usage_filter = ""
+
+    def show_usage_chooser():
+        global g_usage_filter
+
+        text = ida_kernwin.ask_str(g_usage_filter, 0, "Filter functions (e.g. \"vmaddfp128>50\", \"dst*\", empty for all)")
+        if text is None:
+            return
+
+        compiled = compile_usage_filter(text)
+        if compiled is None:
+            ida_kernwin.warning(f"Can't parse the filter \"{text}\"")
+            return
+
+        g_usage_filter = text
+        g_usage_index.flush()
+        rows = usage_rows(*compiled)
+        AltivecUsageChooser(f"Altivec usage: {text or 'all functions'} ({len(rows)})", rows).Show()
+
+    g_actions.append(("ppc_altivec:usage_chooser", "Altivec usage by function...", show_usage_chooser))
+
+
+    #	FUNCTION		function_signature
+
+    #	DESCRIPTION		Similarity index support inside IDA: the MinHash signature of a function
+    #					from its chunks, and the two menu entries adding the named functions of
+    #					this database to an index or naming the unnamed (sub_*) ones from it.
+    #					Named functions get the match in a function comment line; names already
+    #					used elsewhere in the database are left alone.
+
+    SIMILARITY_PREFIX = "Altivec similarity: "
+
+    def function_signature(pfn):
+        big_endian = ida_ida.inf_is_be()
+        words = array('I')
+        for start_ea, end_ea in idautils.Chunks(pfn.start_ea):
+            words.extend(section_words(ida_bytes.get_bytes(start_ea, end_ea - start_ea) or b"", big_endian))
+        return minhash_signature(function_tokens(words)), len(words)
+
+    def ask_similarity_index(save: bool):
+        if np is None:
+            ida_kernwin.warning("The similarity index needs NumPy")
+            return None
+        return ida_kernwin.ask_file(save, "*.npy", "Similarity index (any file in its directory)")
+
+    def add_to_similarity_index():
+        path = ask_similarity_index(True)
+        if not path:
+            return
+
+        entries = []
+        for start_ea in idautils.Functions():
+            if not ida_bytes.has_user_name(ida_bytes.get_flags(start_ea)):
+                continue
+            signature, size = function_signature(ida_funcs.get_func(start_ea))
+            if signature is not None:
+                entries.append((ida_funcs.get_func_name(start_ea), signature, size))
+
+        count = SimilarityIndex.build(os.path.dirname(path), entries)
+        ida_kernwin.msg(f"{PLUGIN_NAME}: added {len(entries)} functions, the index now has {count}\n")
+
+    def name_from_similarity_index():
+        path = ask_similarity_index(False)
+        if not path:
+            return
+
+        index = SimilarityIndex(os.path.dirname(path))
+        named = ambiguous = 0
+        for start_ea in idautils.Functions():
+            if not ida_funcs.get_func_name(start_ea).startswith("sub_"):
+                continue
+            pfn = ida_funcs.get_func(start_ea)
+            signature, _ = function_signature(pfn)
+            if signature is None:
+                continue
+
+            matches = index.query(signature)
+            if not matches:
+                continue
+
+            # Two different names just as likely: leave the function alone
+            if len(matches) > 1 and matches[1][0] == matches[0][0]:
+                ambiguous += 1
+                ida_kernwin.msg(f"{start_ea:X}: " + ", ".join(f"{name} ({similarity:.2f})" for similarity, name in matches) + "\n")
+                continue
+
+            similarity, name = matches[0]
+            if ida_name.set_name(start_ea, name, ida_name.SN_NOWARN | ida_name.SN_NOCHECK):
+                set_function_comment_line(pfn, SIMILARITY_PREFIX, f"{similarity:.2f} ({os.path.basename(index.path)})")
+                named += 1
+
+        ida_kernwin.msg(f"{PLUGIN_NAME}: named {named} functions, {ambiguous} ambiguous\n")
+
+    g_actions.append(("ppc_altivec:similarity_add", "Add named functions to similarity index...", add_to_similarity_index))
+    g_actions.append(("ppc_altivec:similarity_name", "Name functions from similarity index...", name_from_similarity_index))
+
+
+    #	CLASS			FunctionVectorDataflow
+
+    #	DESCRIPTION		Def-use index of the vector registers in one function: the defined and used
+    #					register bitsets (128 bit ints, bit n is %vrn) of every instruction touching
+    #					one, grouped by basic block. Liveness is only solved the first time it is
+    #					asked for. Calls are not modelled, they neither define nor use registers.
+
+    class FunctionVectorDataflow:
+        def __init__(self, pfn):
+            self.start_ea = pfn.start_ea
+            self.end_ea = pfn.end_ea
+            self.instructions = []  # (ea, defined, used)
+            self.blocks = []        # (start_ea, successor ids, first and end position in instructions)
+            self.live_in = self.live_after = None
+
+            big_endian = ida_ida.inf_is_be()
+            for block in ida_gdl.FlowChart(pfn, flags=ida_gdl.FC_NOEXT):
+                first = len(self.instructions)
+                data = ida_bytes.get_bytes(block.start_ea, block.end_ea - block.start_ea) or b""
+                for offset, code_bytes in enumerate(section_words(data, big_endian)):
+                    index = altivec_decode(code_bytes)
+                    if index >= 0 and g_vector_register_positions[index]:
+                        defined, used = vector_defs_uses(index, code_bytes)
+                        self.instructions.append((block.start_ea + offset * 4, defined, used))
+                self.blocks.append((block.start_ea, tuple(successor.id for successor in block.succs()), first, len(self.instructions)))
+
+        def solve_liveness(self):
+            gen, kill = [], []
+            for _, _, first, end in self.blocks:
+                block_gen = block_kill = 0
+                for _, defined, used in self.instructions[first:end]:
+                    block_gen |= used & ~block_kill
+                    block_kill |= defined
+                gen.append(block_gen)
+                kill.append(block_kill)
+
+            live_in = [0] * len(self.blocks)
+            live_out = [0] * len(self.blocks)
+            changed = True
+            while changed:
+                changed = False
+                for block in reversed(range(len(self.blocks))):
+                    out = 0
+                    for successor in self.blocks[block][1]:
+                        out |= live_in[successor]
+                    into = gen[block] | (out & ~kill[block])
+                    if out != live_out[block] or into != live_in[block]:
+                        live_out[block], live_in[block] = out, into
+                        changed = True
+
+            self.live_in = live_in
+
+            # What is live right after each instruction
+            self.live_after = [0] * len(self.instructions)
+            for (_, _, first, end), live in zip(self.blocks, live_out):
+                for position in range(end - 1, first - 1, -1):
+                    self.live_after[position] = live
+                    _, defined, used = self.instructions[position]
+                    live = (live & ~defined) | used
+
+        # Most vector registers holding a value at the same time
+        def max_live(self) -> int:
+            if self.live_after is None:
+                self.solve_liveness()
+            return max((live.bit_count() for live in self.live_after + self.live_in), default=0)
+
+        # Every instruction defining or using a register: (ea, defines, uses, value live afterwards)
+        def sites(self, register: int) -> list:
+            if self.live_after is None:
+                self.solve_liveness()
+
+            bit = 1 << register
+            return [(ea, bool(defined & bit), bool(used & bit), bool(self.live_after[position] & bit))
+                    for position, (ea, defined, used) in enumerate(self.instructions) if (defined | used) & bit]
+
+
+    #	CLASS			AltivecFunctionCache
+
+    #	DESCRIPTION		Per function analysis results, built on first use by 'factory(pfn)' and kept
+    #					until patched bytes or function changes touch the function. With a size
+    #					limit the least recently used entry goes first. The results only need
+    #					start_ea/end_ea attributes.
+
+    DATAFLOW_CACHE_SIZE = 256
+
+    class AltivecFunctionCache:
+        def __init__(self, factory, size: int = None):
+            self.factory = factory
+            self.size = size
+            self.functions = {}
+            g_function_caches.append(self)
+
+        def get(self, pfn):
+            result = self.functions.pop(pfn.start_ea, None)
+            if result is None:
+                result = self.factory(pfn)
+                if self.size is not None and len(self.functions) >= self.size:
+                    del self.functions[next(iter(self.functions))]
+            self.functions[pfn.start_ea] = result
+            return result
+
+        def invalidate(self, start_ea: int, end_ea: int):
+            if not self.functions:
+                return
+            stale = [key for key, result in self.functions.items() if result.start_ea < end_ea and start_ea < result.end_ea]
+            pfn = ida_funcs.get_func(start_ea)
+            if pfn is not None:
+                stale.append(pfn.start_ea)
+            for key in stale:
+                self.functions.pop(key, None)
+
+        def clear(self):
+            self.functions = {}
+
+    g_function_caches = []
+
+    def invalidate_function_caches(start_ea: int, end_ea: int):
+        for cache in g_function_caches:
+            cache.invalidate(start_ea, end_ea)
+
+    def clear_function_caches():
+        for cache in g_function_caches:
+            cache.clear()
+
+    g_dataflow_cache = AltivecFunctionCache(FunctionVectorDataflow, DATAFLOW_CACHE_SIZE)
+
+
+    #	CLASS			AltivecRegisterSitesChooser
+
+    #	DESCRIPTION		Lists and colours the definitions and uses of one vector register in a
+    #					function. The colours are put back when the list is closed.
+
+    DEFINITION_COLOR = 0xB0D8FF
+    USE_COLOR = 0xC8F0C8
+
+    class AltivecRegisterSitesChooser(ida_kernwin.Choose):
+        def __init__(self, title: str, sites: list):
+            ida_kernwin.Choose.__init__(self, title, [
+                ["Address", 12 | ida_kernwin.Choose.CHCOL_EA],
+                ["Role", 8 | ida_kernwin.Choose.CHCOL_PLAIN],
+                ["Instruction", 40 | ida_kernwin.Choose.CHCOL_PLAIN],
+                ["Note", 16 | ida_kernwin.Choose.CHCOL_PLAIN],
+            ])
+
+            self.sites = sites
+            self.rows = []
+            for ea, defines, uses, live in sites:
+                role = "def+use" if defines and uses else "def" if defines else "use"
+                text = ida_lines.tag_remove(ida_lines.generate_disasm_line(ea, 0) or "")
+                self.rows.append([f"{ea:X}", role, text, "" if live or not defines else "value never used"])
+
+            self.colors = {ea: ida_nalt.get_item_color(ea) for ea, *_ in sites}
+            for ea, defines, _, _ in sites:
+                ida_nalt.set_item_color(ea, DEFINITION_COLOR if defines else USE_COLOR)
+            ida_kernwin.refresh_idaview_anyway()
+
+        def OnGetSize(self):
+            return len(self.rows)
+
+        def OnGetLine(self, n):
+            return self.rows[n]
+
+        def OnSelectLine(self, n):
+            ida_kernwin.jumpto(self.sites[n][0])
+            return (ida_kernwin.Choose.NOTHING_CHANGED, )
+
+        def OnClose(self):
+            for ea, color in self.colors.items():
+                if color == ida_nalt.DEFCOLOR:
+                    ida_nalt.del_item_color(ea)
+                else:
+                    ida_nalt.set_item_color(ea, color)
+            ida_kernwin.refresh_idaview_anyway()
+
+
+    g_vector_register_text = re.compile(r"^%?v(?:r)?(\d+)$")
+
+    # The vector register under the cursor: the current operand, or else the highlighted text
+    def vector_register_at_cursor():
+        ea = ida_kernwin.get_screen_ea()
+        insn = ida_ua.insn_t()
+        operand = ida_kernwin.get_opnum()
+        if operand >= 0 and ida_ua.decode_insn(insn, ea) and is_altivec_itype(insn.itype):
+            op = insn.ops[operand]
+            if op.type == o_reg and op.specflag1 & 0x01:
+                return ea, op.reg
+
+        highlight = ida_kernwin.get_highlight(ida_kernwin.get_current_viewer())
+        if highlight:
+            match = g_vector_register_text.match(highlight[0])
+            if match and int(match.group(1)) < 128:
+                return ea, int(match.group(1))
+        return ea, None
+
+    def show_register_sites():
+        ea, register = vector_register_at_cursor()
+        pfn = ida_funcs.get_func(ea)
+        if register is None or pfn is None:
+            ida_kernwin.warning("Put the cursor on a vector register inside a function")
+            return
+
+        sites = g_dataflow_cache.get(pfn).sites(register)
+        AltivecRegisterSitesChooser(f"{g_vr_names[register]} in {ida_funcs.get_func_name(pfn.start_ea)}", sites).Show()
+
+    g_actions.append(("ppc_altivec:register_sites", "Highlight def/uses of this vector register", show_register_sites, "Shift-Alt-V"))
+    g_popup_actions = ("ppc_altivec:register_sites", )
+
+
+    #	FUNCTION		set_comment_line
+
+    #	DESCRIPTION		Our analyses annotate with one comment line each, starting with a fixed
+    #					prefix. The line is replaced when the analysis runs again, whatever else
+    #					the user wrote in the comment stays. Works on function comments too.
+
+    def merge_comment_line(comment: str, prefix: str, text: str) -> str:
+        lines = [line for line in (comment or "").split("\n") if line and not line.startswith(prefix)]
+        if text:
+            lines.append(prefix + text)
+        return "\n".join(lines)
+
+    def set_comment_line(ea: int, prefix: str, text: str, repeatable: bool = False):
+        ida_bytes.set_cmt(ea, merge_comment_line(ida_bytes.get_cmt(ea, repeatable), prefix, text), repeatable)
+
+    def set_function_comment_line(pfn, prefix: str, text: str):
+        ida_funcs.set_func_cmt(pfn, merge_comment_line(ida_funcs.get_func_cmt(pfn, False), prefix, text), False)
+
+
+    #	FUNCTION		estimate_function_timing
+
+    #	DESCRIPTION		Loop timing inside IDA: every function chunk is read in one go and its vector
+    #					loops estimated; the loop headers get their estimate as a comment and the
+    #					function a summary of its slowest loop. Runs over all functions as a batch
+    #					pass from the menu.
+
+    TIMING_PREFIX = "Altivec loop: "
+    TIMING_FUNCTION_PREFIX = "Altivec timing: "
+
+    g_timing_model = "ppe"
+
+    def estimate_function_timing(pfn, model: str) -> list:
+        big_endian = ida_ida.inf_is_be()
+        loops = []
+        for start_ea, end_ea in idautils.Chunks(pfn.start_ea):
+            words = section_words(ida_bytes.get_bytes(start_ea, end_ea - start_ea) or b"", big_endian)
+            for first, last, estimate in estimate_loops(words, model):
+                loops.append((start_ea + first * 4, start_ea + last * 4, estimate))
+
+        for start_ea, end_ea, estimate in loops:
+            set_comment_line(start_ea, TIMING_PREFIX, f"to {end_ea:X}, {estimate.describe(model)}")
+
+        if loops:
+            slowest = max(loops, key=lambda loop: loop[2].cycles_per_iteration)
+            set_function_comment_line(pfn, TIMING_FUNCTION_PREFIX, f"{len(loops)} vector loops, slowest at {slowest[0]:X}: {slowest[2].describe(model)}")
+        return loops
+
+    def estimate_database_timing():
+        global g_timing_model
+
+        model = ida_kernwin.ask_str(g_timing_model, 0, f"CPU model ({', '.join(g_pipeline_model_names)})")
+        if model is None:
+            return
+        if pipeline_model(model) not in g_pipeline_timings:
+            ida_kernwin.warning(f"Unknown CPU model \"{model}\"")
+            return
+        g_timing_model = model
+
+        ranking = []
+        ida_kernwin.show_wait_box("Estimating Altivec loop timing")
+        try:
+            for start_ea in idautils.Functions():
+                if ida_kernwin.user_cancelled():
+                    break
+                for loop_ea, _, estimate in estimate_function_timing(ida_funcs.get_func(start_ea), model):
+                    ranking.append((estimate.cycles_per_iteration, loop_ea, estimate))
+        finally:
+            ida_kernwin.hide_wait_box()
+
+        ranking.sort(key=lambda row: (-row[0], row[1]))
+        ida_kernwin.msg(f"{PLUGIN_NAME}: {len(ranking)} vector loops, slowest first:\n")
+        for _, loop_ea, estimate in ranking[:20]:
+            ida_kernwin.msg(f"  {loop_ea:X} {ida_funcs.get_func_name(loop_ea)}: {estimate.describe(model)}\n")
+
+    g_actions.append(("ppc_altivec:loop_timing", "Estimate Altivec loop timing...", estimate_database_timing))
+
+
+    #	CLASS			FunctionSpillReport
+
+    #	DESCRIPTION		Vector register spills of one function: the stack slots written and read by
+    #					lvx/stvx (and their 128 and LRU forms). A slot only ever holding the same
+    #					non-volatile register, stored once, is a callee save rather than a spill.
+    #					Also keeps the largest number of live vector registers from the def-use
+    #					index. Results are cached per function for the whole database.
+
+    SPILL_HEAVY_OPERATIONS = 8
+    SPILL_PREFIX = "Altivec spills: "
+
+    class FunctionSpillReport:
+        def __init__(self, pfn):
+            self.start_ea = pfn.start_ea
+            self.end_ea = pfn.end_ea
+
+            dataflow = g_dataflow_cache.get(pfn)
+            self.vector_instructions = len(dataflow.instructions)
+            self.max_live = dataflow.max_live()
+
+            slots = {}
+            frame = 0
+            big_endian = ida_ida.inf_is_be()
+            for block in ida_gdl.FlowChart(pfn, flags=ida_gdl.FC_NOEXT):
+                words = section_words(ida_bytes.get_bytes(block.start_ea, block.end_ea - block.start_ea) or b"", big_endian)
+                accesses, frame = find_stack_vector_accesses(words, frame)
+                for position, is_store, register, offset, access_frame in accesses:
+                    slots.setdefault((access_frame, offset), []).append((block.start_ea + position * 4, is_store, register))
+
+            self.spill_stores = self.spill_loads = 0
+            self.spill_slots = 0
+            self.saved_registers = set()
+            self.spill_eas = []
+            for accesses in slots.values():
+                registers = {register for _, _, register in accesses}
+                stores = sum(1 for _, is_store, _ in accesses if is_store)
+                if len(registers) == 1 and stores <= 1 and registers <= g_nonvolatile_vector_registers:
+                    self.saved_registers |= registers
+                    continue
+
+                self.spill_slots += 1
+                self.spill_stores += stores
+                self.spill_loads += len(accesses) - stores
+                self.spill_eas.extend(ea for ea, _, _ in accesses)
+
+        @property
+        def spill_operations(self) -> int:
+            return self.spill_stores + self.spill_loads
+
+        def describe(self) -> str:
+            return (f"{self.spill_stores} stores, {self.spill_loads} reloads in {self.spill_slots} slots, "
+                    f"{self.max_live} vector registers live at most, {len(self.saved_registers)} saved")
+
+    g_spill_cache = AltivecFunctionCache(FunctionSpillReport)
+
+
+    #	CLASS			AltivecSpillChooser
+
+    #	DESCRIPTION		Functions using vector registers, the most spills first.
+
+    class AltivecSpillChooser(ida_kernwin.Choose):
+        def __init__(self, reports: list):
+            ida_kernwin.Choose.__init__(self, f"Altivec spills ({len(reports)} functions)", [
+                ["Function", 30 | ida_kernwin.Choose.CHCOL_FNAME],
+                ["Address", 12 | ida_kernwin.Choose.CHCOL_EA],
+                ["Spill ops", 8 | ida_kernwin.Choose.CHCOL_DEC],
+                ["Slots", 6 | ida_kernwin.Choose.CHCOL_DEC],
+                ["Max live", 8 | ida_kernwin.Choose.CHCOL_DEC],
+                ["Vector insns", 8 | ida_kernwin.Choose.CHCOL_DEC],
+            ])
+            self.reports = reports
+            self.rows = [[ida_funcs.get_func_name(report.start_ea) or f"{report.start_ea:X}", f"{report.start_ea:X}",
+                          str(report.spill_operations), str(report.spill_slots), str(report.max_live), str(report.vector_instructions)]
+                         for report in reports]
+
+        def OnGetSize(self):
+            return len(self.rows)
+
+        def OnGetLine(self, n):
+            return self.rows[n]
+
+        def OnSelectLine(self, n):
+            ida_kernwin.jumpto(self.reports[n].start_ea)
+            return (ida_kernwin.Choose.NOTHING_CHANGED, )
+
+
+    # Batch pass over every function with vector instructions, cached results are reused
+    def analyse_database_spills():
+        g_usage_index.flush()
+
+        reports = []
+        ida_kernwin.show_wait_box("Looking for vector register spills")
+        try:
+            for start_ea in sorted(g_usage_index.functions):
+                if ida_kernwin.user_cancelled():
+                    break
+                pfn = ida_funcs.get_func(start_ea)
+                if pfn is None:
+                    continue
+
+                report = g_spill_cache.get(pfn)
+                reports.append(report)
+                set_function_comment_line(pfn, SPILL_PREFIX, report.describe() if report.spill_operations >= SPILL_HEAVY_OPERATIONS else "")
+        finally:
+            ida_kernwin.hide_wait_box()
+
+        reports.sort(key=lambda report: (-report.spill_operations, -report.max_live, report.start_ea))
+        heavy = sum(1 for report in reports if report.spill_operations >= SPILL_HEAVY_OPERATIONS)
+        ida_kernwin.msg(f"{PLUGIN_NAME}: {heavy} of {len(reports)} vector functions spill {SPILL_HEAVY_OPERATIONS} times or more\n")
+        AltivecSpillChooser(reports).Show()
+
+    g_actions.append(("ppc_altivec:spills", "Find Altivec register spills", analyse_database_spills))
+
+
+    #	CLASS			AltivecFindingsChooser
 
-    if g_HookState == kEnabled:
-        ida_kernwin.msg(f"{PLUGIN_NAME} is enabled\n")
-        return idaapi.PLUGIN_KEEP
+    #	DESCRIPTION		List of (ea, kind, message) findings of a batch pass, double click jumps to
+    #					the address.
+
+    class AltivecFindingsChooser(ida_kernwin.Choose):
+        def __init__(self, title: str, findings: list):
+            ida_kernwin.Choose.__init__(self, f"{title} ({len(findings)})", [
+                ["Address", 12 | ida_kernwin.Choose.CHCOL_EA],
+                ["Function", 24 | ida_kernwin.Choose.CHCOL_FNAME],
+                ["Kind", 10 | ida_kernwin.Choose.CHCOL_PLAIN],
+                ["Finding", 60 | ida_kernwin.Choose.CHCOL_PLAIN],
+            ])
+            self.findings = findings
+            self.rows = [[f"{ea:X}", ida_funcs.get_func_name(ea) or "", kind, message] for ea, kind, message in findings]
+
+        def OnGetSize(self):
+            return len(self.rows)
+
+        def OnGetLine(self, n):
+            return self.rows[n]
+
+        def OnSelectLine(self, n):
+            ida_kernwin.jumpto(self.findings[n][0])
+            return (ida_kernwin.Choose.NOTHING_CHANGED, )
+
+
+    #	CLASS			FunctionStreamReport
+
+    #	DESCRIPTION		StreamReport of a function's main chunk, cached per function. The batch
+    #					pass comments every stream touch with its decoded control word and lists
+    #					the findings of every function using dst or vector loads.
+
+    class FunctionStreamReport:
+        def __init__(self, pfn):
+            self.start_ea = pfn.start_ea
+            self.end_ea = pfn.end_ea
+            words = section_words(ida_bytes.get_bytes(pfn.start_ea, pfn.end_ea - pfn.start_ea) or b"", ida_ida.inf_is_be())
+            self.report = StreamReport(words)
 
-    return idaapi.PLUGIN_OK
+    g_stream_cache = AltivecFunctionCache(FunctionStreamReport)
+
+    def analyse_database_streams():
+        g_usage_index.flush()
+        interesting = [index for index, opcode in enumerate(g_altivec_opcodes)
+                       if opcode.insn in g_streamed_load_itypes or opcode.insn in g_stream_touch_itypes]
+
+        findings = []
+        ida_kernwin.show_wait_box("Checking data stream coverage")
+        try:
+            for start_ea, counts in sorted(g_usage_index.functions.items()):
+                if ida_kernwin.user_cancelled():
+                    break
+                pfn = ida_funcs.get_func(start_ea)
+                if pfn is None or not any(counts[index] for index in interesting):
+                    continue
+
+                entry = g_stream_cache.get(pfn)
+                for stream in entry.report.streams:
+                    set_comment_line(start_ea + stream[0] * 4, STREAM_PREFIX, StreamReport.describe_stream(stream))
+                findings.extend((start_ea + position * 4, kind, message) for position, kind, message in entry.report.findings)
+        finally:
+            ida_kernwin.hide_wait_box()
+
+        ida_kernwin.msg(f"{PLUGIN_NAME}: {len(findings)} data stream findings\n")
+        AltivecFindingsChooser("Altivec data streams", findings).Show()
+
+    g_actions.append(("ppc_altivec:streams", "Check Altivec data stream coverage", analyse_database_streams))
+
+
+    #	CLASS			AltivecLiteralCache
+
+    #	DESCRIPTION		16 byte literals read from the database by address, so the constant pools
+    #					shared by many functions are read once. Patching drops the literal.
+
+    class AltivecLiteralCache:
+        def __init__(self):
+            self.literals = {}
+
+        def read(self, address: int):
+            value = self.literals.get(address, False)
+            if value is False:
+                data = ida_bytes.get_bytes(address, 16) if ida_bytes.is_loaded(address) and ida_bytes.is_loaded(address + 15) else None
+                value = self.literals[address] = data if data is not None and len(data) == 16 else None
+            return value
+
+        def invalidate(self, ea: int):
+            self.literals.pop(ea & ~15, None)
+
+        def clear(self):
+            self.literals = {}
+
+    g_literal_cache = AltivecLiteralCache()
+
+
+    #	FUNCTION		annotate_constant_vectors
+
+    #	DESCRIPTION		Batch pass commenting the constant vectors built by every function using
+    #					vector instructions, block by block.
+
+    CONSTANT_PREFIX = "Altivec const: "
+
+    def annotate_function_constants(pfn, tracker: VectorConstantTracker) -> int:
+        big_endian = ida_ida.inf_is_be()
+        annotated = 0
+        for block in ida_gdl.FlowChart(pfn, flags=ida_gdl.FC_NOEXT):
+            tracker.reset()
+            words = section_words(ida_bytes.get_bytes(block.start_ea, block.end_ea - block.start_ea) or b"", big_endian)
+            for offset, code_bytes in enumerate(words):
+                annotation = tracker.step(altivec_decode(code_bytes), code_bytes)
+                if annotation is not None:
+                    set_comment_line(block.start_ea + offset * 4, CONSTANT_PREFIX, annotation)
+                    annotated += 1
+        return annotated
+
+    def annotate_constant_vectors():
+        g_usage_index.flush()
+        tracker = VectorConstantTracker(g_literal_cache.read)
+
+        annotated = 0
+        ida_kernwin.show_wait_box("Looking for constant vectors")
+        try:
+            for start_ea in sorted(g_usage_index.functions):
+                if ida_kernwin.user_cancelled():
+                    break
+                pfn = ida_funcs.get_func(start_ea)
+                if pfn is not None:
+                    annotated += annotate_function_constants(pfn, tracker)
+        finally:
+            ida_kernwin.hide_wait_box()
+
+        ida_kernwin.msg(f"{PLUGIN_NAME}: {annotated} constant vectors annotated, {len(g_literal_cache.literals)} literals read\n")
+
+    g_actions.append(("ppc_altivec:constants", "Annotate Altivec constant vectors", annotate_constant_vectors))
+
+
+    #	FUNCTION		track_gekko_gqrs
+
+    #	DESCRIPTION		Runs the GQR analysis over every function in the database and annotates
+    #					each psq_l/psq_st with the type and scale it loads or stores. Functions
+    #					nobody calls start from the GQR values written once at start up; a
+    #					quantized access reached with different values from different callers
+    #					says so instead of picking one.
+
+    GQR_PREFIX = "Gekko GQR: "
+
+    def function_gqr_blocks(pfn) -> list:
+        big_endian = ida_ida.inf_is_be()
+        chart = list(ida_gdl.FlowChart(pfn, flags=ida_gdl.FC_NOEXT))
+        numbers = {block.id: number for number, block in enumerate(chart)}
+        return [(block.start_ea,
+                 section_words(ida_bytes.get_bytes(block.start_ea, block.end_ea - block.start_ea) or b"", big_endian),
+                 [numbers[successor.id] for successor in block.succs() if successor.id in numbers])
+                for block in chart]
+
+    def describe_gqr_annotation(annotations: set) -> str:
+        gqr, value, is_store, single = next(iter(annotations))
+        if len(annotations) > 1:
+            return f"GQR{gqr} depends on the caller"
+        if value is None:
+            return f"GQR{gqr} is not known here"
+        return f"GQR{gqr} {describe_gqr(value, is_store)}{', ps0 only' if single else ''}"
+
+    def track_gekko_gqrs():
+        blocks = {}
+        called = set()
+        ida_kernwin.show_wait_box("Tracking Gekko GQRs")
+        try:
+            for start_ea in idautils.Functions():
+                if ida_kernwin.user_cancelled():
+                    return
+                pfn = ida_funcs.get_func(start_ea)
+                function = blocks[start_ea] = function_gqr_blocks(pfn)
+                for block_ea, words, _ in function:
+                    called.update(block_ea + branch_target(offset, code_bytes & ~1) * 4
+                                  for offset, code_bytes in enumerate(words) if code_bytes >> 26 == 18 and code_bytes & 3 == 1)
+
+            analysis = GqrAnalysis(blocks.get)
+            state = global_gqr_state(words for function in blocks.values() for _, words, _ in function)
+            roots = [start_ea for start_ea in blocks if start_ea not in called]
+            for start_ea in roots + list(blocks):
+                if ida_kernwin.user_cancelled():
+                    break
+                if start_ea not in analysis.reached:
+                    analysis.analyse(start_ea, state)
+        finally:
+            ida_kernwin.hide_wait_box()
+
+        for ea, annotations in analysis.annotations.items():
+            set_comment_line(ea, GQR_PREFIX, describe_gqr_annotation(annotations))
+
+        ida_kernwin.msg(f"{PLUGIN_NAME}: {len(analysis.annotations)} quantized loads/stores annotated, "
+                        f"{analysis.functions_walked} function walks for {len(blocks)} functions\n")
+
+    g_actions.append(("ppc_altivec:gekko_gqr", "Track Gekko GQR values", track_gekko_gqrs))
+
+
+    #	FUNCTION		analyse_database_locked_cache
+
+    #	DESCRIPTION		Locked cache use over the whole database. dcbz_l shares its encoding with
+    #					vsldoi in the decode table, so the usage index cannot narrow the search
+    #					and every function is read; the reports are cached per function, so only
+    #					functions changed since the last run are looked at again.
+
+    class FunctionLockedCacheReport:
+        def __init__(self, pfn):
+            self.start_ea = pfn.start_ea
+            self.end_ea = pfn.end_ea
+            words = section_words(ida_bytes.get_bytes(pfn.start_ea, pfn.end_ea - pfn.start_ea) or b"", ida_ida.inf_is_be())
+            self.report = LockedCacheReport(words)
+
+    g_locked_cache_cache = AltivecFunctionCache(FunctionLockedCacheReport)
+
+    def analyse_database_locked_cache():
+        findings = []
+        staging = 0
+        ida_kernwin.show_wait_box("Looking for locked cache use")
+        try:
+            for start_ea in idautils.Functions():
+                if ida_kernwin.user_cancelled():
+                    break
+                pfn = ida_funcs.get_func(start_ea)
+                if pfn is None:
+                    continue
+
+                report = g_locked_cache_cache.get(pfn).report
+                for position, kind, message in report.sites:
+                    set_comment_line(start_ea + position * 4, LOCKED_CACHE_PREFIX, message)
+                    findings.append((start_ea + position * 4, kind, message))
+                if report.stages:
+                    staging += 1
+                    set_function_comment_line(pfn, LOCKED_CACHE_PREFIX, report.summary())
+                    findings.append((start_ea, "function", report.summary()))
+        finally:
+            ida_kernwin.hide_wait_box()
+
+        ida_kernwin.msg(f"{PLUGIN_NAME}: {staging} functions stage data through the locked cache\n")
+        AltivecFindingsChooser("Gekko locked cache", findings).Show()
+
+    g_actions.append(("ppc_altivec:locked_cache", "Find Gekko locked cache use", analyse_database_locked_cache))
+
+
+    #	CLASS			AltivecMicrocodeFilter
+
+    #	DESCRIPTION		Hex-Rays support. Without it every instruction of ours decompiles as an
+    #					__asm block, which stops the decompiler from optimising the function. The
+    #					filter lifts each one to a call of a helper named after it (__vmaddfp,
+    #					__lvx128, ...) taking its operands and, when it has a destination, moves
+    #					the result into that register. Vector registers are typed __vector128,
+    #					Gekko FPRs as doubles (the two paired singles).
+    #
+    #					The lifting templates are built once per itype from the operand lists of
+    #					the opcode table, so lifting an instruction is an index into a tuple:
+    #					(helper name, destination kind or None, ((position, kind), ...)) with kind
+    #					one of "vector", "gpr", "fpr", "imm" and "displ" (register + offset).
+    #
+    #					Left as __asm: record forms (the CR6/CR1 update isn't modelled), the
+    #					update forms of the quantized loads/stores (rA write back) and anything
+    #					using a register the processor module has no microcode register for,
+    #					such as the VMX128 registers above v31 on most setups.
+
+    MICROCODE_VECTOR_TYPE = ("typedef union __declspec(align(16)) __vector128 "
+                             "{ float f[4]; unsigned int u[4]; unsigned short h[8]; unsigned char b[16]; } __vector128;")
+
+    g_microcode_operand_kinds = {
+        AltivecOperandID.RA: "gpr", AltivecOperandID.RB: "gpr", AltivecOperandID.RS: "gpr", AltivecOperandID.RA0: "gpr",
+        AltivecOperandID.FA: "fpr", AltivecOperandID.FB: "fpr", AltivecOperandID.FC: "fpr", AltivecOperandID.FD: "fpr",
+        AltivecOperandID.DRA: "displ",
+    }
+    g_microcode_operand_kinds.update((operand_id, "vector") for operand_id in g_vector_register_operands)
+
+    def build_microcode_template(opcode: altivec_opcode, decoders, roles):
+        name = opcode.name
+        if "." in name or (name.startswith("psq_") and name.rstrip("x").endswith("u")):
+            return None
+
+        kinds = [g_microcode_operand_kinds.get(operand_id, "imm") for operand_id, _ in decoders]
+        destination = None
+        if 0 in roles[0]:
+            destination = "vector"
+        elif kinds[:1] == ["fpr"] and not name.startswith(("psq_st", "stf")):
+            destination = "fpr"
+        elif kinds[:1] == ["gpr"] and decoders[0][0] == AltivecOperandID.RS and name.startswith(("mf", "l")):
+            destination = "gpr"
+
+        # A read-modify-write destination is passed in as well
+        first = 1 if destination is not None and 0 not in roles[1] else 0
+        return f"__{name}", destination, tuple((position, kinds[position]) for position in range(first, len(kinds)))
+
+    g_microcode_templates = tuple(build_microcode_template(opcode, decoders, roles)
+                                  for opcode, decoders, roles in zip(g_altivec_opcodes, g_operand_decoders, g_vector_register_roles))
+
+    # Microcode register of each processor register by kind, found through the register names
+    def microcode_registers(patterns, count: int) -> list:
+        registers = []
+        for number in range(count):
+            register = next((ida_idp.str2reg(pattern.format(number)) for pattern in patterns
+                             if ida_idp.str2reg(pattern.format(number)) >= 0), -1)
+            registers.append(ida_hexrays.reg2mreg(register) if register >= 0 else ida_hexrays.mr_none)
+        return registers
+
+    class AltivecMicrocodeFilter(ida_hexrays.microcode_filter_t):
+        def __init__(self):
+            ida_hexrays.microcode_filter_t.__init__(self)
+            self.installed = False
+            self.lifted = 0
+            self.registers = None
+            self.types = None
+
+        def prepare(self):
+            self.registers = {
+                "vector": microcode_registers(("vr{}", "v{}", "%vr{}"), 128),
+                "gpr": microcode_registers(("r{}", "%r{}"), 32),
+                "fpr": microcode_registers(("f{}", "fp{}", "%f{}"), 32),
+            }
+
+            vector = ida_typeinf.tinfo_t()
+            if not vector.get_named_type(None, "__vector128"):
+                ida_typeinf.idc_parse_types(MICROCODE_VECTOR_TYPE, 0)
+                if not vector.get_named_type(None, "__vector128"):
+                    vector = ida_typeinf.tinfo_t(ida_typeinf.BT_INT128 | ida_typeinf.BTMT_USIGNED)
+            gpr_type = ida_typeinf.BT_INT64 if ida_ida.inf_is_64bit() else ida_typeinf.BT_INT32
+            self.types = {
+                "vector": vector,
+                "gpr": ida_typeinf.tinfo_t(gpr_type | ida_typeinf.BTMT_USIGNED),
+                "fpr": ida_typeinf.tinfo_t(ida_typeinf.BT_FLOAT | ida_typeinf.BTMT_DOUBLE),
+                "imm": ida_typeinf.tinfo_t(ida_typeinf.BT_INT32),
+            }
+
+        def install(self, enable: bool):
+            if enable == self.installed or not ida_hexrays.init_hexrays_plugin():
+                return
+            if enable and self.registers is None:
+                self.prepare()
+            ida_hexrays.install_microcode_filter(self, enable)
+            self.installed = enable
+
+        def operand_register(self, kind: str, operand) -> int:
+            number = operand.phrase if kind == "displ" else operand.reg
+            return self.registers["gpr" if kind == "displ" else kind][number]
+
+        def match(self, cdg):
+            index = cdg.insn.itype - altivec_insn_type_t.altivec_insn_start
+            if not 0 <= index < len(g_microcode_templates) or g_microcode_templates[index] is None:
+                return False
+
+            _, destination, arguments = g_microcode_templates[index]
+            if destination is not None and self.operand_register(destination, cdg.insn.ops[0]) == ida_hexrays.mr_none:
+                return False
+            for position, kind in arguments:
+                operand = cdg.insn.ops[position]
+                if kind != "imm" and operand.type != o_imm and self.operand_register(kind, operand) == ida_hexrays.mr_none:
+                    return False
+            return True
+
+        def apply(self, cdg):
+            insn = cdg.insn
+            name, destination, arguments = g_microcode_templates[insn.itype - altivec_insn_type_t.altivec_insn_start]
+
+            info = ida_hexrays.mcallinfo_t()
+            info.cc = ida_typeinf.CM_CC_FASTCALL
+            info.callee = BADADDR
+            info.role = ida_hexrays.ROLE_UNK
+            info.flags = ida_hexrays.FCI_SPLOK | ida_hexrays.FCI_FINAL | ida_hexrays.FCI_PROP
+
+            for position, kind in arguments:
+                operand = insn.ops[position]
+                if kind == "displ":
+                    self.add_register(info, self.operand_register(kind, operand), "gpr")
+                    self.add_number(info, operand.addr)
+                elif kind == "imm" or operand.type == o_imm:
+                    self.add_number(info, operand.value if operand.type == o_imm else operand.reg)
+                else:
+                    self.add_register(info, self.operand_register(kind, operand), kind)
+            info.solid_args = info.args.size()
+
+            call = ida_hexrays.minsn_t(insn.ea)
+            call.opcode = ida_hexrays.m_call
+            call.l.make_helper(name)
+            call.d.t = ida_hexrays.mop_f
+            call.d.size = 0
+            call.d.f = info
+
+            if destination is not None:
+                result_type = self.types[destination]
+                size = result_type.get_size()
+                info.return_type = result_type
+                call.d.size = size
+
+                move = ida_hexrays.minsn_t(insn.ea)
+                move.opcode = ida_hexrays.m_mov
+                move.l.create_from_insn(call)
+                move.l.size = size
+                move.d.make_reg(self.operand_register(destination, insn.ops[0]), size)
+                if destination == "fpr":
+                    move.set_fpinsn()
+                call = move
+
+            cdg.mb.insert_into_block(call, cdg.mb.tail)
+            self.lifted += 1
+            return ida_hexrays.MERR_OK
+
+        def add_register(self, info, register: int, kind: str):
+            argument = ida_hexrays.mcallarg_t()
+            argument.type = self.types[kind]
+            argument.make_reg(register, argument.type.get_size())
+            info.args.push_back(argument)
+
+        def add_number(self, info, value: int):
+            argument = ida_hexrays.mcallarg_t()
+            argument.type = self.types["imm"]
+            argument.make_number(value & 0xFFFFFFFF, 4)
+            info.args.push_back(argument)
+
+    g_microcode_filter = AltivecMicrocodeFilter()
+
+    def toggle_microcode_lifting():
+        g_microcode_filter.install(not g_microcode_filter.installed)
+        g_AltivecNode.altset(3, kEnabled if g_microcode_filter.installed else kDisabled)
+        ida_kernwin.msg(f"{PLUGIN_NAME}: Hex-Rays lifting {'on' if g_microcode_filter.installed else 'off'}\n")
+
+
+    #	FUNCTION		benchmark_decompilation
+
+    #	DESCRIPTION		Decompiles the functions with the most vector instructions with the filter
+    #					installed and without it, bypassing the decompiler cache, and prints the
+    #					time of each and how many instructions were lifted.
+
+    MICROCODE_BENCHMARK_FUNCTIONS = 20
+
+    def benchmark_decompilation():
+        if not ida_hexrays.init_hexrays_plugin():
+            ida_kernwin.warning("The Hex-Rays decompiler is not available")
+            return
+
+        count = ida_kernwin.ask_long(MICROCODE_BENCHMARK_FUNCTIONS, "Number of vector heavy functions to decompile")
+        if not count:
+            return
+
+        g_usage_index.flush()
+        heaviest = sorted(g_usage_index.functions, key=lambda start_ea: sum(g_usage_index.functions[start_ea]), reverse=True)[:count]
+        was_installed = g_microcode_filter.installed
+        timings = {}
+        ida_kernwin.show_wait_box("Benchmarking decompilation")
+        try:
+            for lifting in (False, True):
+                g_microcode_filter.install(lifting)
+                g_microcode_filter.lifted = 0
+                started = time.perf_counter()
+                failures = 0
+                for start_ea in heaviest:
+                    if ida_kernwin.user_cancelled():
+                        return
+                    try:
+                        ida_hexrays.decompile(start_ea, None, ida_hexrays.DECOMP_NO_CACHE)
+                    except ida_hexrays.DecompilationFailure:
+                        failures += 1
+                timings[lifting] = (time.perf_counter() - started, failures, g_microcode_filter.lifted)
+        finally:
+            g_microcode_filter.install(was_installed)
+            ida_kernwin.hide_wait_box()
+
+        for lifting, (seconds, failures, lifted) in timings.items():
+            ida_kernwin.msg(f"{PLUGIN_NAME}: {len(heaviest)} functions {'with' if lifting else 'without'} lifting: "
+                            f"{seconds:.2f}s, {failures} failed, {lifted} instructions lifted\n")
+
+    g_actions.append(("ppc_altivec:microcode", "Altivec Hex-Rays lifting on/off", toggle_microcode_lifting))
+    g_actions.append(("ppc_altivec:microcode_benchmark", "Benchmark Hex-Rays on vector functions...", benchmark_decompilation))
+
+
+    #	FUNCTION		assemble_at_cursor
+
+    #	DESCRIPTION		Asks for an instruction, starting from the one under the cursor, and patches
+    #					its encoding over the word at the cursor.
+
+    def assemble_at_cursor():
+        ea = ida_kernwin.get_screen_ea()
+        insn = ida_ua.insn_t()
+        text = ""
+        if ida_ua.decode_insn(insn, ea) and is_altivec_itype(insn.itype):
+            index = insn.itype - altivec_insn_type_t.altivec_insn_start
+            code_bytes = get_dword(ea)
+            text = f"{g_altivec_opcodes[index].name} {render_operands(index, code_bytes)}".strip()
+
+        line = ida_kernwin.ask_str(text, 0, "Assemble")
+        if not line:
+            return
+        try:
+            code_bytes = altivec_assemble(line)
+        except ValueError as error:
+            ida_kernwin.warning(f"{error}")
+            return
+
+        ida_bytes.patch_dword(ea, code_bytes)
+        ida_bytes.del_items(ea, ida_bytes.DELIT_SIMPLE, 4)
+        ida_ua.create_insn(ea)
+
+    g_actions.append(("ppc_altivec:assemble", "Assemble Altivec instruction...", assemble_at_cursor))
+
+
+    #	FUNCTION		find_database_idioms
+
+    #	DESCRIPTION		Scans every code segment for the idiom library in one pass per segment and
+    #					lists the matches.
+
+    def find_database_idioms():
+        search = IdiomSearch()
+        big_endian = ida_ida.inf_is_be()
+        findings = []
+        ida_kernwin.show_wait_box("Looking for Altivec idioms")
+        try:
+            for start_ea, end_ea in snapshot_code_segments():
+                if ida_kernwin.user_cancelled():
+                    break
+                words = section_words(ida_bytes.get_bytes(start_ea, end_ea - start_ea) or b"", big_endian)
+                findings.extend((start_ea + position * 4, name, IdiomSearch.describe(name, bindings))
+                                for position, name, bindings in search.scan(words))
+        finally:
+            ida_kernwin.hide_wait_box()
+
+        ida_kernwin.msg(f"{PLUGIN_NAME}: {len(findings)} idioms found\n")
+        AltivecFindingsChooser("Altivec idioms", findings).Show()
+
+    g_actions.append(("ppc_altivec:idioms", "Find Altivec idioms", find_database_idioms))
+
+
+    #	CLASS			FunctionVectorReferences
+
+    #	DESCRIPTION		The data references of the vector loads and stores of a function, block
+    #					by block, resolved against the base registers of g_base_registers.
+
+    class FunctionVectorReferences:
+        def __init__(self, pfn):
+            self.start_ea = pfn.start_ea
+            self.end_ea = pfn.end_ea
+
+            bases = g_base_registers.get()
+            big_endian = ida_ida.inf_is_be()
+            self.references = []
+            for block in ida_gdl.FlowChart(pfn, flags=ida_gdl.FC_NOEXT):
+                words = section_words(ida_bytes.get_bytes(block.start_ea, block.end_ea - block.start_ea) or b"", big_endian)
+                self.references.extend((block.start_ea + position * 4, address, is_store)
+                                       for position, address, is_store in resolve_vector_references(words, bases))
+
+    g_vector_reference_cache = AltivecFunctionCache(FunctionVectorReferences)
+
+
+    #	CLASS			AltivecBaseRegisters
+
+    #	DESCRIPTION		The r2/r13 values vector references are resolved against: the symbol
+    #					when the database has one, found in the code otherwise. Worked out once
+    #					per database and again after one of the symbols is renamed; when the
+    #					values change the cached references are dropped.
+
+    g_base_register_symbols = {13: ("_SDA_BASE_", ), 2: ("_SDA2_BASE_", ".TOC.", "_TOC_")}
+
+    class AltivecBaseRegisters:
+        def __init__(self):
+            self.bases = None
+
+        def get(self) -> dict:
+            if self.bases is None:
+                self.update(self.compute())
+            return self.bases
 
+        @staticmethod
+        def compute() -> dict:
+            big_endian = ida_ida.inf_is_be()
+            bases = find_base_registers((start_ea, section_words(ida_bytes.get_bytes(start_ea, end_ea - start_ea) or b"", big_endian))
+                                        for start_ea, end_ea in snapshot_code_segments())
+            for register, names in g_base_register_symbols.items():
+                for name in names:
+                    ea = ida_name.get_name_ea(BADADDR, name)
+                    if ea != BADADDR:
+                        bases[register] = ea
+                        break
+            return bases
+
+        def update(self, bases: dict):
+            if bases != self.bases:
+                self.bases = bases
+                g_vector_reference_cache.clear()
+
+        def invalidate(self):
+            self.bases = None
+
+        def is_symbol(self, name: str) -> bool:
+            return any(name in names for names in g_base_register_symbols.values())
+
+    g_base_registers = AltivecBaseRegisters()
+
+
+    #	FUNCTION		add_vector_references
+
+    #	DESCRIPTION		Adds the data references of the vector loads and stores of every function
+    #					using them. References are gathered from the per function cache and
+    #					added VECTOR_REFERENCE_BATCH at a time, after the analysis rather than
+    #					while IDA decodes each instruction.
+
+    VECTOR_REFERENCE_BATCH = 4096
+
+    def commit_vector_references(batch: list) -> int:
+        added = 0
+        for ea, address, is_store in batch:
+            if ida_bytes.is_mapped(address):
+                ida_xref.add_dref(ea, address, ida_xref.dr_W if is_store else ida_xref.dr_R)
+                added += 1
+        return added
+
+    def add_vector_references():
+        g_usage_index.flush()
+
+        batch = []
+        added = 0
+        ida_kernwin.show_wait_box("Adding Altivec data references")
+        try:
+            bases = g_base_registers.get()
+            for start_ea in sorted(g_usage_index.functions):
+                if ida_kernwin.user_cancelled():
+                    break
+                pfn = ida_funcs.get_func(start_ea)
+                if pfn is None:
+                    continue
+
+                batch.extend(g_vector_reference_cache.get(pfn).references)
+                if len(batch) >= VECTOR_REFERENCE_BATCH:
+                    added += commit_vector_references(batch)
+                    batch = []
+            added += commit_vector_references(batch)
+        finally:
+            ida_kernwin.hide_wait_box()
+
+        described = ", ".join(f"r{register} = {value:X}" for register, value in sorted(bases.items())) or "no base registers"
+        ida_kernwin.msg(f"{PLUGIN_NAME}: {added} vector data references added ({described})\n")
+
+    g_actions.append(("ppc_altivec:vector_references", "Add Altivec data references", add_vector_references))
+
+
+    #	FUNCTION		name_vector_save_helpers
+
+    #	DESCRIPTION		Finds the __savevmx/__restvmx ladders in one pass over the code segments,
+    #					makes each ladder one library function named after its first entry and
+    #					names the other entries. Functions calling into a ladder get the vector
+    #					registers it saves or restores as a comment, and the names make the
+    #					helper calls count as prologue evidence for ev_may_be_func.
+
+    VECTOR_HELPER_PREFIX = "Altivec saves: "
+
+    def name_vector_save_helpers():
+        big_endian = ida_ida.inf_is_be()
+        ladders = []
+        ida_kernwin.show_wait_box("Looking for vector save/restore helpers")
+        try:
+            for start_ea, end_ea in snapshot_code_segments():
+                if ida_kernwin.user_cancelled():
+                    break
+                words = section_words(ida_bytes.get_bytes(start_ea, end_ea - start_ea) or b"", big_endian)
+                ladders.extend((kind, [(start_ea + position * 4, register) for position, register in entries], start_ea + blr * 4 + 4)
+                               for kind, entries, blr in find_vector_save_ladders(words))
+        finally:
+            ida_kernwin.hide_wait_box()
+
+        callers = {}
+        for kind, entries, end_ea in ladders:
+            first_ea, last = entries[0][0], entries[-1][1]
+            for entry_ea, _ in entries[1:]:
+                pfn = ida_funcs.get_func(entry_ea)
+                if pfn is not None and pfn.start_ea == entry_ea:
+                    ida_funcs.del_func(entry_ea)
+            pfn = ida_funcs.get_func(first_ea)
+            if pfn is None or pfn.start_ea != first_ea:
+                ida_funcs.add_func(first_ea, end_ea)
+                pfn = ida_funcs.get_func(first_ea)
+            if pfn is not None:
+                pfn.flags |= ida_funcs.FUNC_LIB
+                ida_funcs.update_func(pfn)
+
+            for entry_ea, register in entries:
+                name = g_vector_ladder_names[kind].format(register)
+                ida_name.set_name(entry_ea, name, ida_name.SN_NOWARN | ida_name.SN_NOCHECK)
+                for caller_ea in idautils.CodeRefsTo(entry_ea, 0):
+                    caller = ida_funcs.get_func(caller_ea)
+                    if caller is not None and caller.start_ea != first_ea:
+                        callers.setdefault(caller.start_ea, []).append(f"{kind}s v{register}-v{last} ({name})")
+
+        for start_ea, ranges in callers.items():
+            set_function_comment_line(ida_funcs.get_func(start_ea), VECTOR_HELPER_PREFIX, ", ".join(ranges))
+
+        ida_kernwin.msg(f"{PLUGIN_NAME}: {len(ladders)} vector save/restore ladders "
+                        f"({sum(len(entries) for _, entries, _ in ladders)} entries), {len(callers)} callers marked\n")
+
+    g_actions.append(("ppc_altivec:vector_helpers", "Name vector save/restore helpers", name_vector_save_helpers))
+
+
+    #	CLASS			AltivecFunctionStartStats
+
+    #	DESCRIPTION		Counts the ev_may_be_func answers when profiling, printed at shutdown: how
+    #					many of our instructions IDA asked about, how many scored as likely
+    #					function starts (each of which used to be a 100) and which signals were
+    #					seen.
+
+    g_vector_save_helper_prefixes = ("__savevmx", "__savevr", "_savevr", "savevr")
+
+    def is_save_helper(ea: int) -> bool:
+        return ida_name.get_name(ea).startswith(g_vector_save_helper_prefixes)
+
+    class AltivecFunctionStartStats:
+        def __init__(self):
+            self.asked = 0
+            self.likely = 0
+            self.signals = {name: 0 for _, name in g_prologue_signal_names}
+
+        def record(self, score: int, signals: int):
+            self.asked += 1
+            self.likely += score >= PROLOGUE_THRESHOLD
+            for signal, name in g_prologue_signal_names:
+                self.signals[name] += bool(signals & signal)
+
+        def report(self) -> str:
+            seen = ", ".join(f"{name} {count}" for name, count in self.signals.items())
+            return f"{self.asked} function start queries, {self.likely} likely (all {self.asked} before scoring); signals: {seen}"
+
+    g_function_start_stats = AltivecFunctionStartStats()
+
+
+    kDefault, kEnabled, kDisabled = 0, 1, 2
+    g_HookState = kEnabled
+    g_BackgroundState = kDisabled
+    g_AltivecNodeName = "$ AltivecPlugin"
+    g_AltivecNode = idaapi.netnode()
+
+
+    # CLASS 		PluginExtensionCallback
+
+    # DESCRIPTION	These hooks are responsible for the work associated with each intercepted
+    #					event that we deal with. Each event has its own override, so IDA only
+    #					calls into Python for the events below and every handler gets its
+    #					arguments directly instead of going through a generic dispatcher.
+    #
+    #					ev_ana_insn		:	Analyses an instruction (in 'insn') to see if it is an Altivec
+    #										instruction. If so, then it extracts information from the
+    #										opcode in order to determine which opcode it is, along with
+    #										data relating to any used operands.
+    #
+    #					ev_out_insn		:	Generates the mnemonic and operand list for our Altivec
+    #										instructions, by looking into our array of opcode information
+    #										structures.
+    #
+    #					ev_out_operand	:	Outputs operands for Altivec instructions. In our case, we
+    #										have an alternate register set (vr0 to vr31), so our operands
+    #										may be marked as being Altivec registers.
+    #
+    #					ev_may_be_func	:	Scores how likely an Altivec instruction starts a function
+    #										with function_start_score, from the VRSAVE and vector
+    #										register saves, calls to save helpers and the word before
+    #										it. The return value is a percentage probability..
+    #
+    #					ev_is_sane_insn	:	All our Altivec instructions (well, the ones we've identified
+    #										inside ev_ana_insn processing), are ok.
+
+    # Set to True (or PPC_ALTIVEC_PROFILE=1 in the environment) to time every handled event, the
+    # totals are printed when the plugin terminates
+    PROFILE_EVENTS = os.environ.get("PPC_ALTIVEC_PROFILE") == "1"
+
+    g_event_profile = {}
+
+    def profiled_event(handler):
+        if not PROFILE_EVENTS:
+            return handler
+
+        stats = g_event_profile.setdefault(handler.__name__, [0, 0])
+
+        def wrapper(*args):
+            start = time.perf_counter_ns()
+            try:
+                return handler(*args)
+            finally:
+                stats[0] += 1
+                stats[1] += time.perf_counter_ns() - start
+
+        wrapper.__name__ = handler.__name__
+        return wrapper
+
+    def event_profile_report() -> str:
+        lines = []
+        for name, (count, total_ns) in sorted(g_event_profile.items()):
+            average = total_ns / count if count else 0
+            lines.append(f"{name}: {count} calls, {total_ns / 1e6:.1f} ms total, {average:.0f} ns/call")
+        return "\n".join(lines)
+
+
+    #	FUNCTION		set_trace_events
+
+    #	DESCRIPTION		Event tracing into g_trace. The events start from the PPC_ALTIVEC_TRACE
+    #					environment variable ("analyse,function_start", "all") and can be changed
+    #					from the menu; the ring is written to a file with the dump action and
+    #					read back with 'python ppc_altivec.py trace DUMP'.
+
+    def describe_trace_events(events: int) -> str:
+        return ",".join(name for event, name in g_trace_event_names.items() if events & event)
+
+    try:
+        g_trace = TraceRing(events=parse_trace_events(os.environ.get("PPC_ALTIVEC_TRACE", "")))
+    except ValueError as error:
+        print(f"{PLUGIN_NAME}: PPC_ALTIVEC_TRACE: {error}")
+        g_trace = TraceRing()
+
+    def set_trace_events():
+        text = ida_kernwin.ask_str(describe_trace_events(g_trace.events), 0, f"Trace events (all, {', '.join(g_trace_event_names.values())}; empty for none)")
+        if text is None:
+            return
+        try:
+            g_trace.events = parse_trace_events(text)
+        except ValueError as error:
+            ida_kernwin.warning(str(error))
+            return
+        select_event_hooks()
+        ida_kernwin.msg(f"{PLUGIN_NAME}: tracing {describe_trace_events(g_trace.events) or 'off'}\n")
+
+    def dump_trace():
+        path = ida_kernwin.ask_file(True, "*.bin", "Altivec trace dump")
+        if not path:
+            return
+        written = g_trace.dump(path)
+        ida_kernwin.msg(f"{PLUGIN_NAME}: {written} trace records written to {path}\n")
+
+    g_actions.append(("ppc_altivec:trace_events", "Altivec trace events...", set_trace_events))
+    g_actions.append(("ppc_altivec:trace_dump", "Dump Altivec trace...", dump_trace))
+
+
+    def is_altivec_itype(itype: int) -> bool:
+        return altivec_insn_type_t.altivec_insn_start <= itype < altivec_insn_type_t.altivec_insn_start + len(g_altivec_opcodes)
+
+
+    class PluginExtensionCallback(ida_idp.IDP_Hooks):
+        def __init__(self):
+            ida_idp.IDP_Hooks.__init__(self)
+
+        # Analyze an instruction to see if it's an Altivec instruction
+        @profiled_event
+        def ev_ana_insn(self, insn):
+            length = plugin_analyse(insn)
+            if length:
+                insn.size = length
+                g_usage_index.record(insn.ea, insn.itype - altivec_insn_type_t.altivec_insn_start)
+            else:
+                g_usage_index.forget(insn.ea)
+            return length # event processed
 
-def PluginShutdown():
-    # Non eliminare il callback, solo fermarlo se necessario
-    print("Plugin shutdown complete.")
+        # Display operands that differ from PPC ones.. like our altivec registers
+        @profiled_event
+        def ev_out_operand(self, ctx, operand):
+            index = ctx.insn.itype - altivec_insn_type_t.altivec_insn_start
+            if not 0 <= index < len(g_output_plans):
+                return 0
+
+            if operand.type == o_imm:
+                symbols = g_output_plans[index].symbol_names[operand.n]
+                if symbols is None or g_immediate_display == IMMEDIATE_RAW:
+                    return 0
+                ctx.out_line(format_symbolic_immediate(symbols, operand.value), ida_lines.COLOR_NUMBER)
+                return 1
 
+            if operand.type != o_reg:
+                return 0
 
-def PluginMain(param):
-    global g_HookState
+            names = g_output_plans[index].register_names[operand.n]
+            if names is None:
+                return 0
 
-    if g_HookState == kEnabled:
-        g_HookState = kDisabled
-    elif g_HookState == kDisabled:
-        g_HookState = kEnabled
+            ctx.out_register(names[operand.reg])
+            return 1
 
-    g_AltivecNode.create(g_AltivecNodeName)
-    g_AltivecNode.altset(0, g_HookState)
+        @profiled_event
+        def ev_out_insn(self, ctx):
+            index = ctx.insn.itype - altivec_insn_type_t.altivec_insn_start
+            if not 0 <= index < len(g_output_plans):
+                return 0
 
-    hook_state_description = ["default", "enabled", "disabled"]
-    ida_kernwin.info(f"AUTOHIDE NONE\n{PLUGIN_NAME} is now {hook_state_description[g_HookState]}")
+            plan = g_output_plans[index]
+            ops = ctx.insn.ops
 
-    return True
+            # Output mnemonic
+            ctx.out_custom_mnem(plan.mnemonic, 10)
 
-class AltivecPlugin(idaapi.plugin_t):
-    flags = idaapi.PLUGIN_PROC
-    comment = PLUGIN_COMMENT
-    help = PLUGIN_HELP
-    wanted_name = PLUGIN_NAME
-    wanted_hotkey = PLUGIN_HOTKEY
+            # Output operands, separated by a comma once something has been printed
+            separate = False
+            for n in range(plan.operand_count):
+                if not ops[n].shown():
+                    continue
 
-    def init(self):
-        return PluginStartup()
+                if separate:
+                    ctx.out_symbol(',')
+                    ctx.out_char(' ')
+
+                ctx.out_one_operand(n)
+                separate = True
+
+            if ida_ida.inf_show_all_comments() and ida_bytes.get_cmt(ctx.insn.ea, True) is None:
+                indent = ida_lines.tag_strlen(ctx.outbuf)
+                comment_column = ida_ida.inf_get_comment() - ida_ida.inf_get_indent()
+                if indent < comment_column:
+                    ctx.out_line(" " * (comment_column - indent))
 
-    def term(self):
-        PluginShutdown()
+                ctx.out_line("# ", ida_lines.COLOR_AUTOCMT)
+                ctx.out_line(plan.description, ida_lines.COLOR_AUTOCMT)
+
+                # Print out description of SPRG
+                if plan.has_spr:
+                    for n in range(plan.operand_count):
+                        if plan.register_names[n] in (g_spr_names, g_mtspr_names) and g_spr_comments[ops[n].reg] is not None:
+                            ctx.out_line(g_spr_comments[ops[n].reg], ida_lines.COLOR_AUTOCMT)
+
+            ctx.flush_outbuf()
+            return 1
 
-    def run(self, arg):
-        PluginMain(arg)
+        # Can this be the start of a function?
+        @profiled_event
+        def ev_may_be_func(self, insn, state):
+            if not is_altivec_itype(insn.itype):
+                return 0
+
+            ea = insn.ea
+            code_bytes = analysed_word(ea)
+
+            # The words around it normally sit in the read-ahead window already, take them from there in one go
+            offset = ea - 4 - g_read_ahead.start_ea
+            if offset >= 0 and not offset & 3 and ea + PROLOGUE_LOOKAHEAD * 4 < g_read_ahead.end_ea:
+                position = offset >> 2
+                previous = g_read_ahead.words[position]
+                following = g_read_ahead.words[position + 2:position + 2 + PROLOGUE_LOOKAHEAD]
+            else:
+                previous = g_read_ahead.get_dword(ea - 4) if ida_bytes.is_loaded(ea - 4) else None
+                following = []
+                for offset in range(1, PROLOGUE_LOOKAHEAD + 1):
+                    if not ida_bytes.is_loaded(ea + offset * 4):
+                        break
+                    following.append(g_read_ahead.get_dword(ea + offset * 4))
+            score, signals = function_start_score(code_bytes, insn.itype - altivec_insn_type_t.altivec_insn_start,
+                                                  previous, following, lambda offset: is_save_helper(ea + offset * 4))
+            if PROFILE_EVENTS:
+                g_function_start_stats.record(score, signals)
+            return score
+
+        # If we've identified the instruction as an Altivec instruction, it's good to go.
+        @profiled_event
+        def ev_is_sane_insn(self, insn, no_crefs):
+            if is_altivec_itype(insn.itype):
+                return 1
+            return 0
+
+    # The same handlers recording into g_trace. Only hooked while some event is traced, so without
+    # tracing no handler tests for it; the records go straight into the ring's deque.
+    class TracingPluginExtensionCallback(PluginExtensionCallback):
+        def ev_ana_insn(self, insn):
+            length = PluginExtensionCallback.ev_ana_insn(self, insn)
+            if g_trace.events & TRACE_ANALYSE:
+                g_trace.append((insn.ea, g_analysed_word, insn.itype - altivec_insn_type_t.altivec_insn_start if length else -1,
+                                TRACE_ANALYSE, time.perf_counter_ns()))
+            return length
+
+        def ev_out_insn(self, ctx):
+            handled = PluginExtensionCallback.ev_out_insn(self, ctx)
+            if handled and g_trace.events & TRACE_OUTPUT:
+                g_trace.append((ctx.insn.ea, analysed_word(ctx.insn.ea), ctx.insn.itype - altivec_insn_type_t.altivec_insn_start,
+                                TRACE_OUTPUT, time.perf_counter_ns()))
+            return handled
+
+        def ev_may_be_func(self, insn, state):
+            score = PluginExtensionCallback.ev_may_be_func(self, insn, state)
+            if g_trace.events & TRACE_FUNCTION_START and is_altivec_itype(insn.itype):
+                g_trace.append((insn.ea, analysed_word(insn.ea), insn.itype - altivec_insn_type_t.altivec_insn_start,
+                                TRACE_FUNCTION_START, time.perf_counter_ns()))
+            return score
+
+    g_plain_hooks = PluginExtensionCallback()
+    g_tracing_hooks = TracingPluginExtensionCallback()
+    hook = g_tracing_hooks if g_trace.events else g_plain_hooks
+
+    # Swaps the installed handlers when tracing is turned on or off
+    def select_event_hooks():
+        global hook
+        wanted = g_tracing_hooks if g_trace.events else g_plain_hooks
+        if wanted is hook:
+            return
+        if g_HookState == kEnabled:
+            hook.unhook()
+            wanted.hook()
+        hook = wanted
+
+    g_idb_hooks = AltivecIDBHooks()
+    g_ui_hooks = AltivecUIHooks()
+
+    def PluginStartup():
+        global g_HookState, g_BackgroundState, g_immediate_display
+    
+        # Check if platform is PowerPC
+        if idaapi.ph.id != idaapi.PLFM_PPC:
+            return idaapi.PLUGIN_SKIP
+
+        g_AltivecNode.create(g_AltivecNodeName)
+        databaseHookState = g_AltivecNode.altval(0)
+
+        if databaseHookState != kDefault:
+            g_HookState = databaseHookState
+
+        databaseBackgroundState = g_AltivecNode.altval(1)
+        if databaseBackgroundState != kDefault:
+            g_BackgroundState = databaseBackgroundState
+
+        databaseImmediateDisplay = g_AltivecNode.altval(2)
+        if databaseImmediateDisplay != kDefault:
+            g_immediate_display = databaseImmediateDisplay
+
+        g_usage_index.load(g_AltivecNode)
+        g_idb_hooks.hook()
+
+        if g_HookState == kEnabled:
+            hook.hook()
+            g_ui_hooks.hook()
+            register_actions()
+            ida_kernwin.msg(f"{PLUGIN_NAME} is enabled\n")
+
+            # An existing database is already loaded, a new one starts from database_inited
+            if g_BackgroundState == kEnabled and ida_segment.get_segm_qty() > 0:
+                g_background.start()
+
+            return idaapi.PLUGIN_KEEP
+
+        return idaapi.PLUGIN_OK
+
+
+    def PluginShutdown():
+        # Non eliminare il callback, solo fermarlo se necessario
+        g_background.cancel()
+        g_decode_client.close()
+        g_microcode_filter.install(False)
+        unregister_actions()
+
+        hook.unhook()
+        g_ui_hooks.unhook()
+        g_idb_hooks.unhook()
+        g_read_ahead.invalidate()
+
+        if PROFILE_EVENTS:
+            print(f"{PLUGIN_NAME}: {g_read_ahead.stats()}")
+            print(f"{PLUGIN_NAME}: {g_function_start_stats.report()}")
+            print(event_profile_report())
+        print("Plugin shutdown complete.")
+
+
+    def PluginMain(param):
+        global g_HookState
+
+        if g_HookState == kEnabled:
+            g_HookState = kDisabled
+        elif g_HookState == kDisabled:
+            g_HookState = kEnabled
+
+        # The same hooks and actions PluginStartup installs when the plugin starts enabled
+        if g_HookState == kEnabled:
+            hook.hook()
+            g_ui_hooks.hook()
+            register_actions()
+            if g_AltivecNode.altval(3) != kDisabled:
+                g_microcode_filter.install(True)
+            if g_BackgroundState == kEnabled and ida_segment.get_segm_qty() > 0:
+                g_background.start()
+        else:
+            g_background.cancel()
+            g_microcode_filter.install(False)
+            unregister_actions()
+            g_ui_hooks.unhook()
+            hook.unhook()
+
+        g_AltivecNode.create(g_AltivecNodeName)
+        g_AltivecNode.altset(0, g_HookState)
+
+        hook_state_description = ["default", "enabled", "disabled"]
+        ida_kernwin.info(f"AUTOHIDE NONE\n{PLUGIN_NAME} is now {hook_state_description[g_HookState]}")
+
+        return True
+
+    class AltivecPlugin(idaapi.plugin_t):
+        flags = idaapi.PLUGIN_PROC
+        comment = PLUGIN_COMMENT
+        help = PLUGIN_HELP
+        wanted_name = PLUGIN_NAME
+        wanted_hotkey = PLUGIN_HOTKEY
+
+        def init(self):
+            return PluginStartup()
+
+        def term(self):
+            PluginShutdown()
+
+        def run(self, arg):
+            PluginMain(arg)
 
-def PLUGIN_ENTRY():
-    return AltivecPlugin()
+    def PLUGIN_ENTRY():
+        return AltivecPlugin()
@@ -0,0 +1,51 @@
+import itertools
+
+import pytest
+
+import ppc_altivec as ppc
+
+
+def operand_samples(index):
+    # The ends of each operand's range and a value in between
+    return [sorted({low, (low + high) // 2 + 1, high}) for _, _, low, high in ppc.g_operand_encoders[index]]
+
+
+def render(index, code_bytes):
+    operands = ppc.render_operands(index, code_bytes)
+    return f"{ppc.g_altivec_opcodes[index].name} {operands}" if operands else ppc.g_altivec_opcodes[index].name
+
+
+@pytest.mark.parametrize("index", range(len(ppc.g_altivec_opcodes)), ids=[opcode.name for opcode in ppc.g_altivec_opcodes])
+def test_rendered_instruction_assembles_back(index):
+    # Unchecked, so the Gekko entries Altivec shadows in altivec_decode and repeated fields are covered too
+    for operands in itertools.product(*operand_samples(index)):
+        code_bytes = ppc.altivec_encode(index, operands, check=False)
+        assert ppc.altivec_assemble(render(index, code_bytes), check=False) == code_bytes, render(index, code_bytes)
+
+
+@pytest.mark.parametrize("mnemonic", ["mfspr", "mtspr"])
+def test_every_spr_assembles_back(mnemonic):
+    index = ppc.g_altivec_mnemonics[mnemonic]
+    for spr in range(1024):
+        operands = [spr if operand_id == ppc.AltivecOperandID.SPR else 3 for operand_id, *_ in ppc.g_operand_encoders[index]]
+        code_bytes = ppc.altivec_encode(index, operands)
+        assert ppc.altivec_assemble(render(index, code_bytes)) == code_bytes, render(index, code_bytes)
+
+
+def test_spr_names():
+    assert ppc.g_spr_names[16] == "16"
+    assert ppc.g_spr_names[912] == "GQR0" and ppc.g_spr_names[919] == "GQR7"
+    assert ppc.g_spr_names[920] == "HID2"
+    assert ppc.g_spr_names[921] == "TSCR" and ppc.g_spr_names[922] == "TTR"
+    assert ppc.g_spr_names[136] == "CTRL" and ppc.g_spr_names[152] == "152"
+    assert ppc.g_mtspr_names[152] == "CTRL" and ppc.g_mtspr_names[136] == "136"
+    assert ppc.parse_operand(ppc.AltivecOperandID.SPR, None, "0x1f") == 31
+    assert ppc.parse_operand(ppc.AltivecOperandID.SPR, None, "gqr3") == 915
+    assert ppc.altivec_assemble("mtspr WPAR, r3") == ppc.altivec_assemble("mtspr 921, r3")
+
+
+def test_crm_masks_assemble_back():
+    index = ppc.g_altivec_mnemonics["mtocrf"]
+    for mask in range(256):
+        code_bytes = ppc.altivec_encode(index, [mask, 0])
+        assert ppc.altivec_assemble(render(index, code_bytes)) == code_bytes, render(index, code_bytes)
@@ -0,0 +1,63 @@
+import json
+import os
+import struct
+
+import pytest
+
+import ppc_altivec as ppc
+
+
+def write_dol(path, words):
+    header = bytearray(0x100)
+    struct.pack_into(">I", header, 0x00, 0x100)
+    struct.pack_into(">I", header, 0x48, 0x80003100)
+    struct.pack_into(">I", header, 0x90, len(words) * 4)
+    with open(path, "wb") as dol:
+        dol.write(bytes(header) + struct.pack(f">{len(words)}I", *words))
+
+
+@pytest.mark.parametrize("command", ["timing", "streams", "prologues", "vmxhelpers"])
+def test_unreadable_binary_is_one_line(tmp_path, capsys, command):
+    truncated = tmp_path / "truncated.dol"
+    truncated.write_bytes(b"\0" * 0x20)
+    assert ppc.main([command, str(truncated)]) == 1
+    assert capsys.readouterr().err.splitlines() == [f"{truncated}: truncated or inconsistent DOL header"]
+
+
+def test_missing_binary_is_one_line(tmp_path, capsys):
+    missing = tmp_path / "missing.dol"
+    assert ppc.main(["export", str(missing), "--out", str(tmp_path / "out.jsonl")]) == 1
+    assert capsys.readouterr().err.splitlines() == [f"{missing}: No such file or directory"]
+
+
+@pytest.mark.skipif(ppc.np is None, reason="the batch driver needs NumPy")
+def test_batch_resumes_after_partial_manifest_line(tmp_path, capsys):
+    binaries, out = tmp_path / "binaries", tmp_path / "out"
+    binaries.mkdir()
+    write_dol(binaries / "good.dol", [0x10000004, 0x100004C4, 0x7C0802A6, 0x4E800020] * 16)
+    (binaries / "bad.dol").write_bytes(b"\0" * 0x20)
+    arguments = ["batch", str(binaries), "--out", str(out), "--jobs", "1"]
+
+    assert ppc.main(arguments) == 0
+    assert "2 binaries to analyse, 0 already done" in capsys.readouterr().out
+
+    # A run killed while writing its manifest entry
+    manifest = out / "manifest.jsonl"
+    with open(manifest, "a", encoding="utf-8") as file:
+        file.write('{"path": "new.dol", "si')
+    write_dol(binaries / "new.dol", [0x10000004, 0x4E800020] * 8)
+
+    assert ppc.main(arguments) == 0
+    assert "1 binaries to analyse, 2 already done" in capsys.readouterr().out
+
+    assert ppc.main(arguments + ["--retry-failed"]) == 0
+    assert "1 binaries to analyse, 2 already done" in capsys.readouterr().out
+
+    entries = []
+    for line in manifest.read_text(encoding="utf-8").splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            assert line == '{"path": "new.dol", "si'
+    assert sorted(entry["path"] for entry in entries) == ["bad.dol", "bad.dol", "good.dol", "new.dol"]
+    assert sum("error" in entry for entry in entries) == 2
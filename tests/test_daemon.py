@@ -0,0 +1,118 @@
+import os
+import socket
+import stat
+import tempfile
+import threading
+
+import pytest
+
+import ppc_altivec as ppc
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+
+WORDS = [0x10000004, 0x100004C4, 0x7C0042A6, 0x12345678, 0x10000004]
+
+
+def local_indices(words):
+    return [ppc.altivec_decode(code_bytes) for code_bytes in words]
+
+
+# Answers one request with whatever reply() builds from the words it was sent
+def fake_daemon(path, reply):
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+
+    def serve():
+        connection, _ = listener.accept()
+        with connection, listener:
+            try:
+                digest, count = ppc.g_daemon_header.unpack(ppc.recv_exact(connection, ppc.g_daemon_header.size))
+            except ConnectionError:
+                return
+            words = ppc.words_from_network(ppc.recv_exact(connection, count * 4))
+            connection.sendall(reply(digest, words))
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / "daemon.sock")
+
+
+def test_real_daemon_matches_local_decoding(socket_path):
+    server = ppc.AltivecDecodeServer(socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = ppc.AltivecDecodeClient(socket_path)
+        assert client.decode(WORDS) == local_indices(WORDS)
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("reply", [
+    # One index short
+    lambda digest, words: ppc.g_daemon_header.pack(digest, len(words) - 1) + ppc.indices_to_network(local_indices(words)[:-1]),
+    # Index past the end of the opcode table
+    lambda digest, words: ppc.g_daemon_header.pack(digest, len(words)) + ppc.indices_to_network([len(ppc.g_altivec_opcodes)] * len(words)),
+    # Negative index other than -1
+    lambda digest, words: ppc.g_daemon_header.pack(digest, len(words)) + ppc.indices_to_network([-2] * len(words)),
+    # Different opcode table
+    lambda digest, words: ppc.g_daemon_header.pack(b"\0\0\0\0", len(words)) + ppc.indices_to_network(local_indices(words)),
+    # Connection closed half way through the indices
+    lambda digest, words: ppc.g_daemon_header.pack(digest, len(words)) + ppc.indices_to_network(local_indices(words))[:3],
+], ids=["short", "index too large", "negative index", "other table", "truncated"])
+def test_malformed_reply_falls_back_to_local_decoding(socket_path, monkeypatch, reply):
+    thread = fake_daemon(socket_path, reply)
+    client = ppc.AltivecDecodeClient(socket_path)
+    monkeypatch.setattr(ppc, "g_decode_client", client)
+    monkeypatch.setattr(ppc, "g_decode_cache", {})
+
+    assert ppc.altivec_decode_many(WORDS) == local_indices(WORDS)
+    assert client.retry_time > 0
+    thread.join(5)
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid") or os.getuid() != 0, reason="needs root to hand the socket to another user")
+def test_socket_of_another_user_is_not_used(socket_path):
+    fake_daemon(socket_path, lambda digest, words: ppc.g_daemon_header.pack(digest, len(words)) + ppc.indices_to_network(local_indices(words)))
+    os.chown(socket_path, 12345, -1)
+    client = ppc.AltivecDecodeClient(socket_path)
+    assert client.decode(WORDS) is None
+
+    # Let the fake daemon finish
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+
+
+def test_default_socket_directory_is_private(tmp_path, monkeypatch):
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    path = ppc.default_daemon_socket()
+    assert os.path.dirname(path).startswith(str(tmp_path))
+
+    server = ppc.AltivecDecodeServer(path)
+    server.server_close()
+    assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    os.chmod(os.path.dirname(path), 0o777)
+    with pytest.raises(OSError):
+        ppc.AltivecDecodeServer(path)
+
+
+def test_disabled_client_never_connects(socket_path):
+    thread = fake_daemon(socket_path, lambda digest, words: ppc.g_daemon_header.pack(digest, len(words)) + ppc.indices_to_network(local_indices(words)))
+    client = ppc.AltivecDecodeClient(socket_path, enabled=False)
+    assert not client.available()
+    assert client.decode(WORDS) is None
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+    thread.join(5)
@@ -0,0 +1,53 @@
+import struct
+
+import pytest
+
+import ppc_altivec as ppc
+
+np = pytest.importorskip("numpy")
+
+
+def words(*values, kind=">4I"):
+    return struct.pack(kind, *values)
+
+
+def run(lines, **registers):
+    emulator = ppc.VectorEmulator(1)
+    for name, value in registers.items():
+        emulator[int(name[1:])] = value
+    return emulator.run([ppc.altivec_assemble(line) for line in lines])
+
+
+def lanes(emulator, register, kind=">4I"):
+    return struct.unpack(kind, emulator[register][0].tobytes())
+
+
+def test_vpermwi128():
+    emulator = run(["vpermwi128 v70, v9, .wzyx"], v9=words(0, 1, 2, 3))
+    assert lanes(emulator, 70) == (3, 2, 1, 0)
+    emulator = run(["vpermwi128 v1, v9, .xxyy"], v9=words(10, 11, 12, 13))
+    assert lanes(emulator, 1) == (10, 10, 11, 11)
+
+
+def test_vrlimi128_keeps_the_lanes_outside_the_mask():
+    emulator = run(["vrlimi128 v5, v6, .xz, 1"], v5=words(0, 1, 2, 3), v6=words(10, 11, 12, 13))
+    assert lanes(emulator, 5) == (11, 1, 13, 3)
+    emulator = run(["vrlimi128 v100, v6, .xyzw, 0"], v6=words(10, 11, 12, 13))
+    assert lanes(emulator, 100) == (10, 11, 12, 13)
+
+
+def test_vspltisw128_sign_extends():
+    assert lanes(run(["vspltisw128 v64, v0, -3"]), 64, ">4i") == (-3, -3, -3, -3)
+    assert lanes(run(["vspltisw128 v2, v0, 15"]), 2, ">4i") == (15, 15, 15, 15)
+
+
+def test_dot_products():
+    a, b = words(1.0, 2.0, 3.0, 4.0, kind=">4f"), words(5.0, 6.0, 7.0, 8.0, kind=">4f")
+    assert lanes(run(["vmsum4fp128 v3, v70, v90"], v70=a, v90=b), 3, ">4f") == (70.0,) * 4
+    assert lanes(run(["vmsum3fp128 v3, v70, v90"], v70=a, v90=b), 3, ">4f") == (38.0,) * 4
+
+
+def test_vmaddfp128_reads_its_destination():
+    emulator = run(["vmaddfp128 v3, v70, v2, v3"], v3=words(1.0, 1.0, 1.0, 1.0, kind=">4f"),
+                   v70=words(2.0, 3.0, 4.0, 5.0, kind=">4f"), v2=words(10.0, 10.0, 10.0, 10.0, kind=">4f"))
+    assert lanes(emulator, 3, ">4f") == (21.0, 31.0, 41.0, 51.0)
@@ -0,0 +1,19 @@
+import pytest
+
+import ppc_altivec as ppc
+
+
+@pytest.mark.parametrize("value, is_store, expected", [
+    (0x00000000, False, "float"),
+    (0x00000000, True, "float"),
+    (0x00040000, False, "u8"),
+    (0x00000004, True, "u8"),
+    (0x08070000, False, "s16 / 2^8"),
+    (0x00000807, True, "s16 * 2^8"),
+    (0x3F060000, False, "s8 / 2^-1"),
+    (0x00003D05, True, "u16 * 2^-3"),
+    (0x08000000, False, "float"),  # the scale doesn't apply to floats
+    (0x00070005, True, "u16"),  # a store only looks at the low half
+])
+def test_describe_gqr(value, is_store, expected):
+    assert ppc.describe_gqr(value, is_store) == expected
@@ -0,0 +1,15 @@
+import pytest
+
+import ppc_altivec as ppc
+
+
+@pytest.mark.parametrize("control, expected", [
+    (0x08040100, (8 * 16, 4, 256)),
+    (0x01010010, (16, 1, 16)),
+    (0x0000FFF0, (32 * 16, 256, -16)),
+    (0x00000000, (32 * 16, 256, 32768)),
+    (0x1FFF8000, (31 * 16, 255, -32768)),
+    (0xE0000020, (32 * 16, 256, 32)),  # bits 29-31 aren't part of the block size
+])
+def test_decode_stream_control(control, expected):
+    assert ppc.decode_stream_control(control) == expected
@@ -0,0 +1,11 @@
+import pytest
+
+import ppc_altivec as ppc
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("dcbz128", "stream"), ("dcbz_l", "stream"), ("dst", "stream"), ("dssall", "stream"),
+    ("lvx128", "load"), ("psq_st", "store"), ("vmsum4fp128", "dot"), ("vperm128", "permute"),
+])
+def test_pipeline_class(name, expected):
+    assert ppc.pipeline_class(name) == expected
@@ -0,0 +1,26 @@
+import ppc_altivec as ppc
+
+
+def test_ring_keeps_the_newest_records_in_order(tmp_path):
+    ring = ppc.TraceRing(capacity=3, events=ppc.TRACE_ANALYSE)
+    for n in range(5):
+        ring.record(ppc.TRACE_ANALYSE, 0x82000000 + n * 4, 0x10000000 + n, n)
+    ring.append((0x82000014, 0x10000005, -1, ppc.TRACE_OUTPUT, 123))
+    path = tmp_path / "trace.bin"
+    assert ring.dump(str(path)) == 3
+    records = ppc.TraceRing.read(str(path))
+    assert [record[:4] for record in records] == [
+        (0x8200000C, 0x10000003, 3, ppc.TRACE_ANALYSE),
+        (0x82000010, 0x10000004, 4, ppc.TRACE_ANALYSE),
+        (0x82000014, 0x10000005, -1, ppc.TRACE_OUTPUT),
+    ]
+    assert records[0][4] <= records[1][4]
+
+
+def test_cleared_ring_dumps_nothing(tmp_path):
+    ring = ppc.TraceRing()
+    ring.record(ppc.TRACE_FUNCTION_START, 0x80003100, 0x7C0802A6)
+    ring.clear()
+    path = tmp_path / "trace.bin"
+    assert ring.dump(str(path)) == 0
+    assert ppc.TraceRing.read(str(path)) == []